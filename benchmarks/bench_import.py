@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Measure the import time of the mozdownload CLI via python -X importtime.
+
+Exits with a non-zero status if the import takes longer than the budget, or
+if modules get imported which the CLI should only load on demand.
+"""
+
+import argparse
+import subprocess
+import sys
+
+# Modules which are only needed for revision lookups and progress bars
+LAZY_MODULES = ('mozdownload.treeherder', 'progressbar', 'thclient')
+
+
+def measure(module):
+    """Return the cumulative import times (in ms) per module of a fresh interpreter."""
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import %s' % module],
+                            stderr=subprocess.PIPE, check=True).stderr.decode('utf-8')
+
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative) / 1000.
+
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--module', default='mozdownload.cli',
+                        help='Module to import, default: %(default)s')
+    parser.add_argument('--budget', type=float, default=250.,
+                        help='Maximum import time in ms, default: %(default)s')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of imports, default: %(default)s')
+    parser.add_argument('--top', type=int, default=10,
+                        help='Number of slowest imports to show, default: %(default)s')
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.repeat)]
+    best = min(runs, key=lambda times: times[args.module])
+
+    for name, duration in sorted(best.items(), key=lambda item: -item[1])[:args.top]:
+        print('%8.1f ms  %s' % (duration, name))
+
+    failed = False
+    for name in LAZY_MODULES:
+        if name in best:
+            print('%s is imported eagerly' % name)
+            failed = True
+
+    duration = best[args.module]
+    print('Importing %s took %.1f ms (budget: %.1f ms)' % (args.module, duration, args.budget))
+    if duration > args.budget:
+        failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Compare the CPU time per GB of the receive engines against a local server.
+
+The server runs in a separate process, so that only the CPU time spent by the
+client gets measured.
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from mozdownload import DirectScraper
+from mozdownload.scraper import CHUNK_SIZE
+
+BLOCK = os.urandom(1024 * 1024)
+
+
+class PayloadHandler(BaseHTTPRequestHandler):
+    """Serve a payload of the size given as path, e.g. /1048576."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        size = int(self.path.strip('/'))
+        self.send_response(200)
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+
+        view = memoryview(BLOCK)
+        while size:
+            sent = min(size, len(view))
+            self.wfile.write(view[:sent])
+            size -= sent
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(queue):
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), PayloadHandler)
+    queue.put(httpd.server_address[1])
+    httpd.serve_forever()
+
+
+def receive_iter_content(scraper, r, f):
+    for chunk in r.iter_content(CHUNK_SIZE):
+        f.write(chunk)
+
+
+def receive_readinto(scraper, r, f):
+    for chunk in scraper._read_chunks(r):
+        f.write(chunk)
+
+
+ENGINES = {
+    'iter_content': receive_iter_content,
+    'readinto': receive_readinto,
+}
+
+
+def measure(url, engine, size):
+    scraper = DirectScraper(url=url, destination=tempfile.gettempdir())
+    with tempfile.TemporaryFile() as f:
+        start_cpu = time.process_time()
+        start_wall = time.monotonic()
+        r = scraper.session.get(url, stream=True)
+        try:
+            ENGINES[engine](scraper, r, f)
+        finally:
+            r.close()
+        cpu = time.process_time() - start_cpu
+        wall = time.monotonic() - start_wall
+
+        assert f.tell() == size, 'Received %s of %s bytes' % (f.tell(), size)
+
+    gigabytes = size / 1024 ** 3
+    return cpu / gigabytes, size / wall / 1024 ** 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=512,
+                        help='Size of the payload in MB, default: %(default)s')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of runs per engine, default: %(default)s')
+    args = parser.parse_args()
+
+    queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(queue,), daemon=True)
+    server.start()
+    size = args.size * 1024 ** 2
+    url = 'http://127.0.0.1:%s/%s' % (queue.get(), size)
+
+    try:
+        # Warm up the connection and the server
+        requests.get(url.rsplit('/', 1)[0] + '/1024').close()
+
+        results = {}
+        for engine in ENGINES:
+            runs = [measure(url, engine, size) for _ in range(args.repeat)]
+            results[engine] = min(runs)
+            print('%-12s %8.2f CPU s/GB %10.1f MB/s' % ((engine,) + results[engine]))
+
+        baseline = results['iter_content'][0]
+        print('readinto uses %.1f%% of the CPU time of iter_content' %
+              (results['readinto'][0] / baseline * 100))
+    finally:
+        server.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Measure resolution latency and download throughput against a synthetic archive.
+
+For each scraper type the wall time and the number of requests needed to
+resolve the build get measured, and for each payload size the throughput of
+download(). The results can be written as JSON, and compared against the
+results of an earlier run to detect regressions.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import requests
+
+from mozdownload import FactoryScraper, __version__
+from synthetic_archive import ArchiveServer
+
+SCENARIOS = {
+    'release': ('release', {'version': '30.0'}),
+    'release-latest': ('release', {'version': 'latest'}),
+    'candidate': ('candidate', {'version': '30.0'}),
+    'candidate-latest': ('candidate', {'version': 'latest'}),
+    'daily-latest': ('daily', {}),
+    'daily-date': ('daily', {'date': '2013-10-14'}),
+    'direct': ('direct', {'url': 'payload/1024'}),
+}
+
+
+class CountingSession(requests.Session):
+    """Session which counts the requests it sends."""
+
+    def __init__(self):
+        requests.Session.__init__(self)
+        self.count = 0
+
+    def send(self, request, **kwargs):
+        self.count += 1
+        return requests.Session.send(self, request, **kwargs)
+
+
+def measure_resolution(url, scenario, repeat):
+    """Return the best wall time and the request count of resolving a build."""
+    scraper_type, kwargs = SCENARIOS[scenario]
+    kwargs = dict(kwargs)
+    if scraper_type == 'direct':
+        kwargs['url'] = url + kwargs['url']
+
+    best = None
+    for _ in range(repeat):
+        session = CountingSession()
+        start_time = time.monotonic()
+        scraper = FactoryScraper(scraper_type, platform='win32', base_url=url,
+                                 destination=tempfile.gettempdir(), session=session,
+                                 **kwargs)
+        scraper.resolve()
+        duration = time.monotonic() - start_time
+        session.close()
+
+        # The scraper sends its requests via a copy of the given session
+        if best is None or duration < best['seconds']:
+            best = {'seconds': duration, 'requests': scraper.session.count}
+
+    return best
+
+
+def measure_download(url, size, connections, repeat):
+    """Return the best wall time and throughput of downloading a payload."""
+    best = None
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as destination:
+            scraper = FactoryScraper('direct', url='%spayload/%d' % (url, size),
+                                     destination=os.path.join(destination, 'payload.bin'),
+                                     connections=connections)
+            scraper.show_progress = False
+            start_time = time.monotonic()
+            scraper.download()
+            duration = time.monotonic() - start_time
+            scraper.session.close()
+
+        if best is None or duration < best['seconds']:
+            best = {'seconds': duration, 'mb_per_s': size / duration / 1024 ** 2}
+
+    return best
+
+
+def compare(results, baseline, tolerance):
+    """Print the differences to the baseline, and return the regressions."""
+    regressions = []
+
+    for scenario, result in sorted(results['resolution'].items()):
+        previous = baseline.get('resolution', {}).get(scenario)
+        if not previous:
+            continue
+        ratio = result['seconds'] / previous['seconds'] if previous['seconds'] else 1.
+        print('%-18s %+7.1f%% time, %+d requests' % (
+            scenario, (ratio - 1) * 100, result['requests'] - previous['requests']))
+        if ratio > 1 + tolerance or result['requests'] > previous['requests']:
+            regressions.append(scenario)
+
+    for size, result in sorted(results['download'].items(), key=lambda item: int(item[0])):
+        previous = baseline.get('download', {}).get(size)
+        if not previous:
+            continue
+        ratio = result['mb_per_s'] / previous['mb_per_s']
+        print('%-18s %+7.1f%% throughput' % ('%s MB' % size, (ratio - 1) * 100))
+        if ratio < 1 - tolerance:
+            regressions.append('download of %s MB' % size)
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='Delay of each response in seconds, default: %(default)s')
+    parser.add_argument('--releases', type=int, default=20,
+                        help='Number of releases in the archive, default: %(default)s')
+    parser.add_argument('--locales', type=int, default=10,
+                        help='Number of locales per release, default: %(default)s')
+    parser.add_argument('--builds-per-day', type=int, default=2,
+                        help='Number of nightly builds per day and branch, '
+                             'default: %(default)s')
+    parser.add_argument('--extra-files', type=int, default=10,
+                        help='Number of unrelated files per build folder, '
+                             'default: %(default)s')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='Resolution scenario to run, default: all')
+    parser.add_argument('--sizes', default='1,16,128,1024',
+                        help='Comma separated payload sizes in MB to download, '
+                             'default: %(default)s')
+    parser.add_argument('--connections', type=int, default=1,
+                        help='Number of connections per download, default: %(default)s')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of runs per measurement, default: %(default)s')
+    parser.add_argument('--output', metavar='PATH',
+                        help='Write the results as JSON to the given file')
+    parser.add_argument('--baseline', metavar='PATH',
+                        help='Compare the results to those of an earlier run')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='Allowed relative slowdown compared to the baseline, '
+                             'default: %(default)s')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+
+    results = {
+        'environment': {
+            'mozdownload': __version__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'config': {
+            'latency': args.latency,
+            'releases': args.releases,
+            'locales': args.locales,
+            'builds_per_day': args.builds_per_day,
+            'extra_files': args.extra_files,
+            'connections': args.connections,
+        },
+        'resolution': {},
+        'download': {},
+    }
+
+    with ArchiveServer(latency=args.latency, releases=args.releases, locales=args.locales,
+                       builds_per_day=args.builds_per_day,
+                       extra_files=args.extra_files) as server:
+        for scenario in args.scenario or sorted(SCENARIOS):
+            result = measure_resolution(server.url, scenario, args.repeat)
+            results['resolution'][scenario] = result
+            print('%-18s %8.3f s %5d requests' % (scenario, result['seconds'],
+                                                  result['requests']))
+
+    # Downloads are measured without latency
+    with ArchiveServer() as server:
+        for size in sizes:
+            result = measure_download(server.url, size * 1024 ** 2, args.connections,
+                                      args.repeat)
+            results['download'][str(size)] = result
+            print('%-18s %8.3f s %8.1f MB/s' % ('%s MB' % size, result['seconds'],
+                                                result['mb_per_s']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print('Regressions: %s' % ', '.join(regressions))
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,216 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Synthetic archive of Firefox builds served by a local web server.
+
+The archive mimics the layout of archive.mozilla.org for Windows 32bit builds
+with a configurable amount of releases, candidates, locales, and nightly
+builds. Files are generated on the fly, so payloads up to several GB don't
+need any disk space. Each request can be delayed to simulate the latency of
+a remote server.
+"""
+
+import multiprocessing
+import os
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote
+
+BLOCK = os.urandom(1024 * 1024)
+
+NIGHTLY_VERSION = '27.0a1'
+
+
+class SyntheticArchive(object):
+    """Virtual folder structure of an archive of builds."""
+
+    def __init__(self, releases=20, build_numbers=3, locales=10, days=28,
+                 builds_per_day=2, branches=('mozilla-central', 'mozilla-aurora', 'ux'),
+                 extra_files=10, build_size=1024 * 1024):
+        """Create the folder structure of the archive.
+
+        :param releases: Number of released versions.
+        :param build_numbers: Number of candidate builds per version.
+        :param locales: Number of locales per release.
+        :param days: Number of days with nightly builds (up to 28).
+        :param builds_per_day: Number of nightly builds per day and branch.
+        :param branches: Branches with nightly builds.
+        :param extra_files: Number of unrelated files per build folder.
+        :param build_size: Size of each build in bytes.
+        """
+        self.build_size = build_size
+        self.folders = {}
+        self.status_files = {}
+
+        locale_names = ['en-US'] + ['l%02d' % index for index in range(locales - 1)]
+        versions = ['%d.0' % (20 + index) for index in range(releases)]
+        extra = ['extra-%03d.txt' % index for index in range(extra_files)]
+
+        self.add_folder('firefox/releases/', [version + '/' for version in versions])
+        self.add_folder('firefox/candidates/',
+                        ['%s-candidates/' % version for version in versions])
+        for version in versions:
+            installer = 'Firefox Setup %s.exe' % version
+            for locale in locale_names:
+                self.add_folder('firefox/releases/%s/win32/%s/' % (version, locale),
+                                [installer] + extra)
+
+            candidates = 'firefox/candidates/%s-candidates/' % version
+            self.add_folder(candidates, ['build%d/' % number
+                                         for number in range(1, build_numbers + 1)])
+            for number in range(1, build_numbers + 1):
+                for locale in locale_names:
+                    self.add_folder('%sbuild%d/win32/%s/' % (candidates, number, locale),
+                                    [installer] + extra)
+
+        # Nightly builds of the last month
+        month = 'firefox/nightly/2013/10/'
+        builds = []
+        for day in range(1, min(days, 28) + 1):
+            for index in range(builds_per_day):
+                for branch in branches:
+                    builds.append('2013-10-%02d-%02d-02-04-%s' % (day, 3 + index, branch))
+        self.add_folder('firefox/nightly/', ['2013/'])
+        self.add_folder('firefox/nightly/2013/', ['10/'])
+        self.add_folder(month, [build + '/' for build in builds])
+
+        prefix = 'firefox-%s.en-US.win32' % NIGHTLY_VERSION
+        for build in builds:
+            self.add_folder(month + build + '/',
+                            [prefix + '.installer.exe', prefix + '.txt'] + extra)
+        for branch in branches:
+            latest = max(build for build in builds if build.endswith('-' + branch))
+            self.add_folder('firefox/nightly/latest-%s/' % branch, [prefix + '.txt'])
+            self.status_files['firefox/nightly/latest-%s/%s.txt' % (branch, prefix)] = \
+                re.sub(r'\D', '', latest[:19]) + '\n'
+
+    def add_folder(self, path, entries):
+        self.folders[path] = entries
+
+    def listing(self, path):
+        """Return the HTML listing of the given folder, or None."""
+        entries = self.folders.get(path)
+        if entries is None:
+            return None
+
+        lines = ['<!DOCTYPE html>', '<html><body><table>']
+        for entry in entries:
+            lines.append('<tr><td><a href="/%s">%s</a></td></tr>' % (quote(path + entry), entry))
+        lines.append('</table></body></html>')
+
+        return '\n'.join(lines).encode('utf-8')
+
+    def file_size(self, path):
+        """Return the size of the given file, or None if it doesn't exist."""
+        if path.startswith('payload/'):
+            return int(path.split('/')[1])
+
+        folder, _, name = path.rpartition('/')
+        if name in self.folders.get(folder + '/', []):
+            return self.build_size
+
+        return None
+
+
+class ArchiveHandler(BaseHTTPRequestHandler):
+    """Serve the synthetic archive, and payloads of the size given as /payload/<size>."""
+
+    protocol_version = 'HTTP/1.1'
+    archive = None
+    latency = 0.
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+        path = unquote(self.path.lstrip('/'))
+        content = self.archive.status_files.get(path)
+        if content is not None:
+            return self.send_content(content.encode('utf-8'), 'text/plain')
+
+        if path.endswith('/') or not path:
+            content = self.archive.listing(path)
+            if content is not None:
+                return self.send_content(content, 'text/html; charset=utf-8')
+        else:
+            size = self.archive.file_size(path)
+            if size is not None:
+                return self.send_payload(size)
+
+        self.send_content(b'Not found', 'text/plain', status=404)
+
+    def send_content(self, content, content_type, status=200):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def send_payload(self, size):
+        first, last = 0, size - 1
+        match = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range', ''))
+        if match:
+            first = int(match.group(1))
+            last = min(int(match.group(2) or last), last)
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (first, last, size))
+        else:
+            self.send_response(200)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', '"payload-%d"' % size)
+        self.send_header('Content-Length', str(last - first + 1))
+        self.end_headers()
+
+        view = memoryview(BLOCK)
+        remaining = last - first + 1
+        while remaining:
+            sent = min(remaining, len(view))
+            self.wfile.write(view[:sent])
+            remaining -= sent
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _serve(queue, latency, archive_kwargs):
+    handler = type('Handler', (ArchiveHandler,), {
+        'archive': SyntheticArchive(**archive_kwargs),
+        'latency': latency,
+    })
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    httpd.daemon_threads = True
+    queue.put(httpd.server_address[1])
+    httpd.serve_forever()
+
+
+class ArchiveServer(object):
+    """Serve a synthetic archive from a separate process.
+
+    Running the server in its own process keeps its CPU time out of the
+    measurements of the client.
+    """
+
+    def __init__(self, latency=0., **archive_kwargs):
+        """Create an instance of the server.
+
+        :param latency: Delay of each response in seconds.
+        :param archive_kwargs: Arguments as accepted by SyntheticArchive.
+        """
+        self.latency = latency
+        self.archive_kwargs = archive_kwargs
+        self.process = None
+        self.url = None
+
+    def __enter__(self):
+        queue = multiprocessing.Queue()
+        self.process = multiprocessing.Process(
+            target=_serve, args=(queue, self.latency, self.archive_kwargs), daemon=True)
+        self.process.start()
+        self.url = 'http://127.0.0.1:%s/' % queue.get()
+        return self
+
+    def __exit__(self, *args):
+        self.process.terminate()
+        self.process.join()
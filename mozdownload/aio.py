@@ -0,0 +1,101 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Asyncio interface to the scrapers, which runs them in a thread pool."""
+
+from __future__ import absolute_import, unicode_literals
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from mozdownload import factory
+
+# Maximum number of scrapers which resolve or download builds at the same time
+DEFAULT_MAX_WORKERS = 32
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the executor shared by all asynchronous scrapers."""
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=DEFAULT_MAX_WORKERS,
+                                           thread_name_prefix='mozdownload')
+        return _executor
+
+
+class AsyncFactoryScraper(object):
+    """Asyncio interface to a scraper of a given type.
+
+    This is a wrapper around the blocking FactoryScraper, not an asynchronous
+    HTTP client. The resolution and the download of the build run in a thread
+    of a bounded pool, so that they don't block the event loop. At most as
+    many scrapers as the executor has workers make progress at the same time,
+    further ones wait for a free thread.
+    """
+
+    def __init__(self, scraper_type, executor=None, **kwargs):
+        """Create an instance of an asynchronous scraper.
+
+        The scraper is not created before the build gets resolved.
+
+        :param scraper_type: The type of scraper to use.
+        :param executor: Executor to run the scraper in, default: an executor
+            shared by all asynchronous scrapers.
+        :param kwargs: Arguments as accepted by FactoryScraper.
+        """
+        self.scraper_type = scraper_type
+        self.kwargs = kwargs
+        self.executor = executor
+
+        self.scraper = None
+        self._url = None
+        self._filename = None
+        self._lock = asyncio.Lock()
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor or get_executor(),
+                                          functools.partial(func, *args))
+
+    def _resolve(self):
+        scraper = factory.FactoryScraper(self.scraper_type, **self.kwargs)
+
+        # Retrieve the URL and the local filename while not on the event loop
+        self._url = scraper.url
+        self._filename = scraper.filename
+        return scraper
+
+    async def resolve(self):
+        """Resolve the build and return the underlying scraper."""
+        async with self._lock:
+            if self.scraper is None:
+                self.scraper = await self._run(self._resolve)
+
+        return self.scraper
+
+    @property
+    def url(self):
+        """Return the URL of the resolved build."""
+        if self.scraper is None:
+            raise RuntimeError('The build has not been resolved yet')
+        return self._url
+
+    @property
+    def filename(self):
+        """Return the local filename of the resolved build."""
+        if self.scraper is None:
+            raise RuntimeError('The build has not been resolved yet')
+        return self._filename
+
+    async def download(self):
+        """Resolve and download the build, and return the local filename."""
+        scraper = await self.resolve()
+        return await self._run(scraper.download)
@@ -0,0 +1,183 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Download a list of builds described by a manifest file."""
+
+from __future__ import absolute_import, unicode_literals
+
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mozdownload import factory
+from mozdownload.cache import BuildCache
+from mozdownload.errors import NotSupportedError
+from mozdownload.parser import ListingCache
+from mozdownload.session import DEFAULT_POOL_MAXSIZE, create_adapter
+
+# Number of builds which are downloaded at the same time
+DEFAULT_JOBS = 4
+
+
+def load_manifest(path):
+    """Read the builds to download from a JSON or TOML manifest file.
+
+    The manifest is either a list of builds, or a mapping with a list of
+    ``builds`` and optional ``defaults`` which apply to each of the builds.
+    Each build is a set of keyword arguments as accepted by FactoryScraper,
+    with its scraper type given as ``type``.
+
+    :param path: Path of the manifest file.
+    """
+    if os.path.splitext(path)[1].lower() == '.toml':
+        try:
+            import tomllib
+        except ImportError:
+            raise NotSupportedError('TOML manifests require Python 3.11 or later')
+
+        with open(path, 'rb') as f:
+            manifest = tomllib.load(f)
+    else:
+        with open(path) as f:
+            manifest = json.load(f)
+
+    if isinstance(manifest, list):
+        manifest = {'builds': manifest}
+
+    if not isinstance(manifest, dict) or not isinstance(manifest.get('builds'), list):
+        raise ValueError('The manifest has to contain a list of builds: %s' % path)
+
+    defaults = manifest.get('defaults', {})
+    builds = []
+    for build in manifest['builds']:
+        if not isinstance(build, dict):
+            raise ValueError('Invalid build in manifest %s: %r' % (path, build))
+
+        kwargs = dict(defaults)
+        kwargs.update(build)
+        builds.append(kwargs)
+
+    return builds
+
+
+class BatchDownloader(object):
+    """Class to resolve and download a list of builds concurrently.
+
+    All the scrapers share a connection pool, so that connections get reused
+    across builds, and the directory listings which have already been fetched
+    per cache folder. Unless the jobs need more connections, the connection
+    pool of the process is used.
+    """
+
+    def __init__(self, builds, jobs=DEFAULT_JOBS, logger=None):
+        """Create an instance of a batch downloader.
+
+        :param builds: List of keyword arguments as accepted by FactoryScraper,
+            with the scraper type given as ``type``.
+        :param jobs: Number of builds which are downloaded at the same time.
+        :param logger: Logger instance to use.
+        """
+        self.builds = builds
+        self.jobs = max(1, jobs or 1)
+        self.logger = logger or logging.getLogger(__name__)
+
+        # Each running job can use as many connections as its build asks for
+        connections = max([build.get('connections') or 1 for build in builds] or [1])
+        self.pool_size = max(DEFAULT_POOL_MAXSIZE, self.jobs * connections)
+        self._adapter = None
+        if self.pool_size > DEFAULT_POOL_MAXSIZE:
+            self._adapter = create_adapter(pool_maxsize=self.pool_size)
+
+        self._listing_caches = {}
+        self._lock = threading.Lock()
+
+    def _get_listing_cache(self, cache_dir):
+        """Return the listing cache shared by all builds with the given cache folder."""
+        with self._lock:
+            listing_cache = self._listing_caches.get(cache_dir)
+            if listing_cache is None:
+                path = BuildCache(cache_dir).listings_path if cache_dir else None
+                listing_cache = self._listing_caches[cache_dir] = ListingCache(path)
+
+            return listing_cache
+
+    def _download(self, build):
+        """Resolve and download a single build, and return its result."""
+        kwargs = dict(build)
+        scraper_type = kwargs.pop('type', 'release')
+
+        # If a URL has been specified use the direct scraper
+        if kwargs.get('url'):
+            scraper_type = 'direct'
+
+        kwargs['listing_cache'] = self._get_listing_cache(kwargs.get('cache_dir'))
+        kwargs['logger'] = self.logger
+        kwargs['adapter'] = self._adapter
+
+        result = {'build': build,
+                  'duration': 0.,
+                  'error': None,
+                  'filename': None,
+                  'size': 0}
+        start_time = time.time()
+        try:
+            scraper = factory.FactoryScraper(scraper_type, **kwargs)
+            # Progress bars of concurrent downloads would garble the output
+            scraper.show_progress = False
+            result['filename'] = scraper.download()
+            # The result might be the folder the build has been extracted to
+            result['size'] = scraper.bytes_received
+        except Exception as e:
+            result['error'] = e
+        finally:
+            result['duration'] = time.time() - start_time
+
+        return result
+
+    def run(self):
+        """Download all the builds, and return the result of each of them.
+
+        A failing build does not stop the download of the other builds.
+        """
+        with ThreadPoolExecutor(max_workers=self.jobs,
+                                thread_name_prefix='mozdownload-batch') as executor:
+            results = list(executor.map(self._download, self.builds))
+
+        # The connection pool of the process stays open for further requests
+        if self._adapter:
+            self._adapter.close()
+
+        return results
+
+
+def resolve_scrapers(scrapers, jobs=DEFAULT_JOBS):
+    """Resolve the builds of the given scrapers concurrently.
+
+    This is mainly useful for scrapers created with ``lazy=True``. A failing
+    scraper does not stop the resolution of the others.
+
+    :param scrapers: List of scrapers to resolve.
+    :param jobs: Number of builds which are resolved at the same time.
+    :returns: List with the ResolvedBuild of each scraper, or the exception
+        its resolution failed with.
+    """
+    def _resolve(scraper):
+        try:
+            return scraper.resolve()
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs or 1),
+                            thread_name_prefix='mozdownload-resolve') as executor:
+        return list(executor.map(_resolve, scrapers))
+
+
+def format_throughput(size, duration):
+    """Return a human readable summary of the given amount of bytes and time."""
+    size_mb = size / 1024 ** 2
+    rate = size_mb / duration if duration > 0 else 0.
+    return '%.1f MB in %.1fs (%.1f MB/s)' % (size_mb, duration, rate)
@@ -0,0 +1,253 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Module for the content addressed cache of downloaded builds."""
+
+from __future__ import absolute_import, unicode_literals
+
+import hashlib
+import json
+import os
+import shutil
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Environment variable to enable the cache by default
+CACHE_DIR_ENV = 'MOZDOWNLOAD_CACHE_DIR'
+
+# Default location of the cache
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')),
+    'mozdownload')
+
+# ioctl request to clone a file on copy-on-write file systems (Linux only)
+FICLONE = 0x40049409
+
+
+def clone_file(source, destination):
+    """Create the destination file with the content of the source file.
+
+    The cheapest available method is used: a hardlink, a reflink on
+    copy-on-write file systems, an in-kernel copy, or a regular copy.
+
+    :param source: Path of the existing file.
+    :param destination: Path of the file to create.
+    :returns: Name of the used method.
+    """
+    try:
+        os.link(source, destination)
+        return 'hardlink'
+    except OSError:
+        pass
+
+    with open(source, 'rb') as fsrc, open(destination, 'wb') as fdst:
+        if fcntl:
+            try:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                return 'reflink'
+            except OSError:
+                pass
+
+        if hasattr(os, 'copy_file_range'):
+            try:
+                while os.copy_file_range(fsrc.fileno(), fdst.fileno(), 1024 ** 3):
+                    pass
+                return 'copy_file_range'
+            except OSError:
+                fsrc.seek(0)
+                fdst.seek(0)
+                fdst.truncate()
+
+        shutil.copyfileobj(fsrc, fdst)
+        return 'copy'
+
+
+class BuildCache(object):
+    """Cache of downloaded builds shared by all destinations.
+
+    Builds are stored by a key which is computed from the URL and the
+    validators of the remote file. Each entry consists of the build and a
+    metadata file, whose modification time marks the last usage of the entry
+    for the least recently used eviction.
+    """
+
+    def __init__(self, path=None, max_size=None):
+        """Create an instance of the build cache.
+
+        :param path: Folder of the cache, default: DEFAULT_CACHE_DIR.
+        :param max_size: Maximum size of the cache in bytes, default: unlimited.
+        """
+        self.path = os.path.abspath(path or DEFAULT_CACHE_DIR)
+        self.max_size = max_size
+
+    @property
+    def listings_path(self):
+        """Folder of the cached directory listings."""
+        return os.path.join(self.path, 'listings')
+
+    @property
+    def revisions_path(self):
+        """Folder of the cached build folders of revisions."""
+        return os.path.join(self.path, 'revisions')
+
+    @property
+    def proxy_path(self):
+        """Folder of the objects cached by the archive proxy of the serve command."""
+        return os.path.join(self.path, 'proxy')
+
+    @staticmethod
+    def key(url, etag=None, last_modified=None, size=None):
+        """Return the cache key of a remote file, or None if it cannot be cached.
+
+        :param url: URL of the remote file.
+        :param etag: Value of the ETag header.
+        :param last_modified: Value of the Last-Modified header.
+        :param size: Size of the remote file.
+        """
+        if etag:
+            validator = etag
+        elif size:
+            validator = '%s:%s' % (last_modified or '', size)
+        else:
+            return None
+
+        return hashlib.sha256('\n'.join([url, validator]).encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, 'builds', key[:2], key)
+
+    def lookup(self, key):
+        """Return the path of the cached build and mark it as used, or None."""
+        path = self._entry_path(key)
+        if not os.path.isfile(path):
+            return None
+
+        try:
+            os.utime(path + '.json')
+        except OSError:
+            return None
+
+        return path
+
+    def materialize(self, key, destination):
+        """Create the destination file from the cached build.
+
+        :returns: Name of the used method, or None if the build is not cached.
+        """
+        path = self.lookup(key)
+        if not path:
+            return None
+
+        try:
+            return clone_file(path, destination)
+        except OSError:
+            # The entry has been evicted in the meantime
+            if os.path.isfile(destination):
+                os.remove(destination)
+            return None
+
+    def discard(self, key):
+        """Remove the entry of the given key from the cache."""
+        path = self._entry_path(key)
+        for entry_path in (path, path + '.json'):
+            try:
+                os.remove(entry_path)
+            except OSError:
+                pass
+
+    def store(self, key, source, url=None):
+        """Add the given file to the cache, and evict old entries if necessary.
+
+        :param key: Cache key of the build.
+        :param source: Path of the downloaded build.
+        :param url: URL of the build, used for informational purposes.
+        """
+        path = self._entry_path(key)
+        if os.path.isfile(path):
+            self.lookup(key)
+            return path
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Concurrent processes might store the same build, so only publish
+        # completely written files.
+        tmp_path = '%s.%s.tmp' % (path, os.getpid())
+        clone_file(source, tmp_path)
+        with open(tmp_path + '.json', 'w') as f:
+            json.dump({'url': url, 'size': os.path.getsize(tmp_path)}, f)
+        os.replace(tmp_path + '.json', path + '.json')
+        os.replace(tmp_path, path)
+
+        if self.max_size is not None:
+            self.prune()
+
+        return path
+
+    def entries(self):
+        """Return the cache entries as list of (key, size, last used) tuples."""
+        entries = []
+        for root, _, files in os.walk(os.path.join(self.path, 'builds')):
+            for name in files:
+                if name.endswith(('.json', '.tmp')):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    entries.append((name, os.path.getsize(path),
+                                    os.path.getmtime(path + '.json')))
+                except OSError:
+                    continue
+
+        return entries
+
+    def stats(self):
+        """Return statistics about the content of the cache."""
+        entries = self.entries()
+        return {'path': self.path,
+                'entries': len(entries),
+                'size': sum(size for _, size, _ in entries),
+                'max_size': self.max_size,
+                'last_used': max([used for _, _, used in entries] or [None])}
+
+    def prune(self, max_size=None, max_age=None):
+        """Remove the least recently used entries.
+
+        :param max_size: Size in bytes to shrink the cache to, default: max_size
+            of the cache.
+        :param max_age: Remove all entries not used for this amount of seconds.
+        :returns: Tuple of the number of removed entries and the freed bytes.
+        """
+        if max_size is None:
+            max_size = self.max_size
+
+        entries = sorted(self.entries(), key=lambda entry: entry[2])
+        total_size = sum(size for _, size, _ in entries)
+        now = time.time()
+
+        removed = freed = 0
+        for key, size, used in entries:
+            if (max_size is None or total_size <= max_size) and \
+                    (max_age is None or now - used <= max_age):
+                continue
+
+            self.discard(key)
+
+            total_size -= size
+            removed += 1
+            freed += size
+
+        return removed, freed
+
+    def clear(self):
+        """Remove all entries, directory listings, revisions, and proxied objects."""
+        removed, freed = self.prune(max_size=0)
+        shutil.rmtree(os.path.join(self.path, 'builds'), ignore_errors=True)
+        shutil.rmtree(self.listings_path, ignore_errors=True)
+        shutil.rmtree(self.revisions_path, ignore_errors=True)
+        shutil.rmtree(self.proxy_path, ignore_errors=True)
+
+        return removed, freed
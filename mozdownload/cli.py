@@ -12,15 +12,27 @@ import argparse
 import logging
 import os
 import sys
+import time
 
 from mozdownload import factory, scraper
+from mozdownload.batch import DEFAULT_JOBS, BatchDownloader, format_throughput, load_manifest
+from mozdownload.cache import CACHE_DIR_ENV, DEFAULT_CACHE_DIR, BuildCache
+from mozdownload.metrics import Metrics
+from mozdownload.retry import DEFAULT_MAX_DELAY, RetryPolicy
+from mozdownload.utils import parse_size
 
 __version__ = '1.30.0'
 
 
 def parse_arguments(argv):
     """Setup argument parser for command line arguments."""
-    parser = argparse.ArgumentParser(description=__doc__.format(__version__))
+    parser = argparse.ArgumentParser(description=__doc__.format(__version__),
+                                     epilog='Run "mozdownload batch --help" for the '
+                                            'command to download a list of builds, '
+                                            '"mozdownload cache --help" for the command '
+                                            'to manage the build cache, and '
+                                            '"mozdownload serve --help" for the command '
+                                            'to run a local caching mirror of the archive.')
     parser.add_argument('--application', '-a',
                         dest='application',
                         choices=scraper.APPLICATIONS,
@@ -29,14 +41,42 @@ def parse_arguments(argv):
                         help='The name of the application to download, default: "%(default)s"')
     parser.add_argument('--base_url',
                         dest='base_url',
-                        default=scraper.BASE_URL,
+                        action='append',
                         metavar='BASE_URL',
-                        help='The base url to be used, default: "%(default)s"')
+                        help='The base url to be used. If specified multiple times, the '
+                             'urls are used as mirrors, whereby the fastest healthy one is '
+                             'preferred, default: "%s"' % scraper.BASE_URL)
     parser.add_argument('--build-number',
                         dest='build_number',
                         type=int,
                         metavar='BUILD_NUMBER',
                         help='Number of the build (for candidate, and daily builds)')
+    parser.add_argument('--cache-dir',
+                        dest='cache_dir',
+                        default=os.environ.get(CACHE_DIR_ENV),
+                        metavar='CACHE_DIR',
+                        help='Folder of the build cache which is shared across '
+                             'destinations, default: $%s or no cache' % CACHE_DIR_ENV)
+    parser.add_argument('--cache-size',
+                        dest='cache_size',
+                        type=parse_size,
+                        metavar='CACHE_SIZE',
+                        help='Maximum size of the build cache (e.g. "10G"), '
+                             'default: unlimited')
+    parser.add_argument('--connect-timeout',
+                        dest='connect_timeout',
+                        default=scraper.DEFAULT_CONNECT_TIMEOUT,
+                        type=float,
+                        metavar='CONNECT_TIMEOUT',
+                        help='Amount of time (in seconds) to wait for a connection to '
+                             'the server, default: %(default)s')
+    parser.add_argument('--connections',
+                        dest='connections',
+                        default=1,
+                        type=int,
+                        metavar='CONNECTIONS',
+                        help='Number of parallel connections used to download the build '
+                             'if the server supports byte ranges, default: %(default)s')
     parser.add_argument('--debug-build',
                         dest='debug_build',
                         action='store_true',
@@ -52,16 +92,58 @@ def parse_arguments(argv):
                         metavar='EXTENSION',
                         help='File extension of the build (e.g. "zip"), default: '
                              'the standard build extension on the platform.')
+    parser.add_argument('--extract',
+                        dest='extract_dir',
+                        metavar='DIR',
+                        help='Extract the build (tar.xz, tar.bz2, or zip) to the given '
+                             'folder. Tar archives get extracted while downloading.')
+    parser.add_argument('--keep-archive',
+                        dest='keep_archive',
+                        action='store_true',
+                        help='Keep the downloaded archive when extracting the build.')
+    parser.add_argument('--limit-burst',
+                        dest='limit_burst',
+                        type=parse_size,
+                        metavar='LIMIT_BURST',
+                        help='Amount of bytes (e.g. "50M") downloads may receive at full '
+                             'speed after being idle, default: the amount of one second')
+    parser.add_argument('--limit-rate',
+                        dest='limit_rate',
+                        type=parse_size,
+                        metavar='LIMIT_RATE',
+                        help='Maximum amount of bytes per second (e.g. "20M") received '
+                             'by all downloads, default: unlimited')
+    parser.add_argument('--limit-rate-file',
+                        dest='limit_rate_file',
+                        metavar='PATH',
+                        help='Share the rate limit with all processes using the same file.')
     parser.add_argument('--locale', '-l',
                         dest='locale',
                         metavar='LOCALE',
                         help='Locale of the application, default: "en-US" or "multi"')
+    parser.add_argument('--lock-timeout',
+                        dest='lock_timeout',
+                        default=scraper.DEFAULT_LOCK_TIMEOUT,
+                        type=float,
+                        metavar='LOCK_TIMEOUT',
+                        help='Amount of time (in seconds) to wait for another process '
+                             'downloading the same file, default: %(default)s')
     parser.add_argument('--log-level',
                         action='store',
                         dest='log_level',
                         default=logging.INFO,
                         metavar='LOG_LEVEL',
                         help='Threshold for log output (default: INFO')
+    parser.add_argument('--metrics-json',
+                        dest='metrics_json',
+                        metavar='PATH',
+                        help='Write the timings of all phases and HTTP requests '
+                             'as JSON to the given file.')
+    parser.add_argument('--no-circuit-breaker',
+                        dest='circuit_breaker',
+                        action='store_false',
+                        help='Keep retrying requests to a host even if most of its '
+                             'recent requests have failed.')
     parser.add_argument('--password',
                         dest='password',
                         metavar='PASSWORD',
@@ -75,6 +157,13 @@ def parse_arguments(argv):
                         dest='print_url',
                         action='store_true',
                         help='Print final URL instead of downloading the file.')
+    parser.add_argument('--read-timeout',
+                        dest='read_timeout',
+                        default=scraper.DEFAULT_READ_TIMEOUT,
+                        type=float,
+                        metavar='READ_TIMEOUT',
+                        help='Amount of time (in seconds) to wait for the server to send '
+                             'any data, default: %(default)s')
     parser.add_argument('--retry-attempts',
                         dest='retry_attempts',
                         default=0,
@@ -87,11 +176,38 @@ def parse_arguments(argv):
                         default=10.,
                         type=float,
                         metavar='RETRY_DELAY',
-                        help='Amount of time (in seconds) to wait between retry '
+                        help='Amount of time (in seconds) to wait before the first retry. '
+                             'The delay doubles with each further attempt, and is '
+                             'randomized to spread retries, default: %(default)s')
+    parser.add_argument('--retry-max-delay',
+                        dest='retry_max_delay',
+                        default=DEFAULT_MAX_DELAY,
+                        type=float,
+                        metavar='RETRY_MAX_DELAY',
+                        help='Maximum amount of time (in seconds) to wait between retry '
                              'attempts, default: %(default)s')
     parser.add_argument('--revision',
                         dest='revision',
                         help='Revision of the build (for daily, and try builds)')
+    parser.add_argument('--stall-speed',
+                        dest='stall_speed',
+                        default=scraper.DEFAULT_STALL_SPEED,
+                        type=parse_size,
+                        metavar='STALL_SPEED',
+                        help='Abort and retry a download receiving less bytes per second '
+                             '(e.g. "10K") for the stall time, 0 to disable, '
+                             'default: %(default)s')
+    parser.add_argument('--stall-time',
+                        dest='stall_time',
+                        default=scraper.DEFAULT_STALL_TIME,
+                        type=float,
+                        metavar='STALL_TIME',
+                        help='Amount of time (in seconds) the throughput of a download is '
+                             'measured over to detect stalls, default: %(default)s')
+    parser.add_argument('--stats',
+                        dest='stats',
+                        action='store_true',
+                        help='Log a summary of the timings of all phases and HTTP requests.')
     parser.add_argument('--stub',
                         dest='is_stub_installer',
                         action='store_true',
@@ -100,7 +216,8 @@ def parse_arguments(argv):
                         dest='timeout',
                         type=float,
                         metavar='TIMEOUT',
-                        help='Amount of time (in seconds) until a download times out.')
+                        help='Amount of time (in seconds) until the resolution and download '
+                             'of the build times out.')
     parser.add_argument('--type', '-t',
                         dest='scraper_type',
                         choices=factory.scraper_types.keys(),
@@ -117,6 +234,11 @@ def parse_arguments(argv):
                         dest='username',
                         metavar='USERNAME',
                         help='Username for basic HTTP authentication.')
+    parser.add_argument('--verify-checksums',
+                        dest='verify_checksums',
+                        action='store_true',
+                        help='Verify the build against the published SHA512 checksum '
+                             '(for release, candidate, and daily builds).')
     parser.add_argument('--version', '-v',
                         dest='version',
                         metavar='VERSION',
@@ -139,12 +261,260 @@ def parse_arguments(argv):
                        metavar='DATE',
                        help='Date of the build, default: latest build')
 
+    kwargs = vars(parser.parse_args(argv))
+
+    base_urls = kwargs['base_url'] or [scraper.BASE_URL]
+    kwargs['base_url'] = base_urls[0] if len(base_urls) == 1 else base_urls
+
+    return kwargs
+
+
+def parse_batch_arguments(argv):
+    """Setup argument parser for the batch command."""
+    parser = argparse.ArgumentParser(prog='mozdownload batch',
+                                     description='Download a list of builds described by '
+                                                 'a JSON or TOML manifest file.')
+    parser.add_argument('manifest',
+                        metavar='MANIFEST',
+                        help='Manifest file with the list of builds. Each build is a set '
+                             'of options as accepted by mozdownload, with the type of '
+                             'build given as "type".')
+    parser.add_argument('--destination', '-d',
+                        dest='destination',
+                        default=os.getcwd(),
+                        metavar='DESTINATION',
+                        help='Directory to download the builds to if not specified in '
+                             'the manifest, default: current working directory')
+    parser.add_argument('--jobs', '-j',
+                        dest='jobs',
+                        default=DEFAULT_JOBS,
+                        type=int,
+                        metavar='JOBS',
+                        help='Number of builds downloaded at the same time, '
+                             'default: %(default)s')
+    parser.add_argument('--limit-burst',
+                        dest='limit_burst',
+                        type=parse_size,
+                        metavar='LIMIT_BURST',
+                        help='Amount of bytes (e.g. "50M") downloads may receive at full '
+                             'speed after being idle, default: the amount of one second')
+    parser.add_argument('--limit-rate',
+                        dest='limit_rate',
+                        type=parse_size,
+                        metavar='LIMIT_RATE',
+                        help='Maximum amount of bytes per second (e.g. "20M") received '
+                             'by all builds, unless limited in the manifest, '
+                             'default: unlimited')
+    parser.add_argument('--limit-rate-file',
+                        dest='limit_rate_file',
+                        metavar='PATH',
+                        help='Share the rate limit with all processes using the same file.')
+    parser.add_argument('--log-level',
+                        action='store',
+                        dest='log_level',
+                        default=logging.INFO,
+                        metavar='LOG_LEVEL',
+                        help='Threshold for log output (default: INFO')
+
+    return vars(parser.parse_args(argv))
+
+
+def batch_cli(argv):
+    """CLI entry point for the batch command."""
+    kwargs = parse_batch_arguments(argv)
+
+    logging.basicConfig(format='%(levelname)s | %(message)s', level=kwargs['log_level'])
+    logger = logging.getLogger(__name__)
+
+    builds = load_manifest(kwargs['manifest'])
+    for build in builds:
+        build.setdefault('destination', kwargs['destination'])
+        for key in ('limit_burst', 'limit_rate', 'limit_rate_file'):
+            if kwargs[key] is not None:
+                build.setdefault(key, kwargs[key])
+
+    start_time = time.time()
+    try:
+        results = BatchDownloader(builds, jobs=kwargs['jobs'], logger=logger).run()
+    except KeyboardInterrupt:
+        logger.error('Download interrupted by the user')
+        return 1
+    total_duration = time.time() - start_time
+
+    failed = 0
+    total_size = 0
+    for result in results:
+        if result['error']:
+            failed += 1
+            logger.error('Failed: %s' % result['error'])
+            continue
+
+        total_size += result['size']
+        logger.info('%s: %s' % (os.path.basename(result['filename']),
+                                format_throughput(result['size'], result['duration'])))
+
+    logger.info('Downloaded %s of %s builds: %s' % (
+        len(results) - failed, len(results), format_throughput(total_size, total_duration)))
+
+    if failed:
+        return 1
+
+
+def parse_cache_arguments(argv):
+    """Setup argument parser for the cache command."""
+    parser = argparse.ArgumentParser(prog='mozdownload cache',
+                                     description='Manage the cache of downloaded builds.')
+    parser.add_argument('action',
+                        choices=('stats', 'prune', 'clear'),
+                        help='Show statistics, remove the least recently used builds, '
+                             'or remove all builds')
+    parser.add_argument('--cache-dir',
+                        dest='cache_dir',
+                        default=os.environ.get(CACHE_DIR_ENV, DEFAULT_CACHE_DIR),
+                        metavar='CACHE_DIR',
+                        help='Folder of the build cache, default: "%(default)s"')
+    parser.add_argument('--cache-size',
+                        dest='cache_size',
+                        type=parse_size,
+                        metavar='CACHE_SIZE',
+                        help='Size (e.g. "10G") to shrink the cache to when pruning.')
+    parser.add_argument('--max-age',
+                        dest='max_age',
+                        type=float,
+                        metavar='DAYS',
+                        help='Remove builds not used for the given amount of days '
+                             'when pruning.')
+
+    return vars(parser.parse_args(argv))
+
+
+def cache_cli(argv):
+    """CLI entry point for the cache command."""
+    kwargs = parse_cache_arguments(argv)
+
+    logging.basicConfig(format='%(message)s', level=logging.INFO)
+    logger = logging.getLogger(__name__)
+
+    cache = BuildCache(kwargs['cache_dir'], max_size=kwargs['cache_size'])
+    if kwargs['action'] == 'stats':
+        stats = cache.stats()
+        logger.info('Cache folder: %s' % stats['path'])
+        logger.info('Builds: %s' % stats['entries'])
+        logger.info('Size: %.1f MB' % (stats['size'] / 1024 ** 2))
+        return
+
+    if kwargs['action'] == 'clear':
+        removed, freed = cache.clear()
+    else:
+        if kwargs['cache_size'] is None and kwargs['max_age'] is None:
+            logger.error('Pruning requires --cache-size or --max-age')
+            return 1
+        max_age = kwargs['max_age'] * 24 * 3600 if kwargs['max_age'] is not None else None
+        removed, freed = cache.prune(max_age=max_age)
+
+    logger.info('Removed %s builds (%.1f MB)' % (removed, freed / 1024 ** 2))
+
+
+def parse_serve_arguments(argv):
+    """Setup argument parser for the serve command."""
+    parser = argparse.ArgumentParser(prog='mozdownload serve',
+                                     description='Run a local HTTP server which mirrors the '
+                                                 'archive, and caches directory listings and '
+                                                 'builds on demand. Use its URL as --base_url.')
+    parser.add_argument('--cache-dir',
+                        dest='cache_dir',
+                        default=os.environ.get(CACHE_DIR_ENV, DEFAULT_CACHE_DIR),
+                        metavar='CACHE_DIR',
+                        help='Folder of the build cache, default: "%(default)s"')
+    parser.add_argument('--cache-size',
+                        dest='cache_size',
+                        type=parse_size,
+                        metavar='CACHE_SIZE',
+                        help='Maximum size of the cached objects (e.g. "50G"), '
+                             'default: unlimited')
+    parser.add_argument('--host',
+                        dest='host',
+                        default='127.0.0.1',
+                        metavar='HOST',
+                        help='Address to listen on, default: %(default)s')
+    parser.add_argument('--limit-burst',
+                        dest='limit_burst',
+                        type=parse_size,
+                        metavar='LIMIT_BURST',
+                        help='Amount of bytes (e.g. "50M") upstream requests may receive '
+                             'at full speed after being idle, default: the amount of one '
+                             'second')
+    parser.add_argument('--limit-rate',
+                        dest='limit_rate',
+                        type=parse_size,
+                        metavar='LIMIT_RATE',
+                        help='Maximum amount of bytes per second (e.g. "20M") received '
+                             'from the upstream server, default: unlimited')
+    parser.add_argument('--limit-rate-file',
+                        dest='limit_rate_file',
+                        metavar='PATH',
+                        help='Share the rate limit with all processes using the same file.')
+    parser.add_argument('--log-level',
+                        action='store',
+                        dest='log_level',
+                        default=logging.INFO,
+                        metavar='LOG_LEVEL',
+                        help='Threshold for log output (default: INFO')
+    parser.add_argument('--port',
+                        dest='port',
+                        default=8080,
+                        type=int,
+                        metavar='PORT',
+                        help='Port to listen on, default: %(default)s')
+    parser.add_argument('--upstream',
+                        dest='upstream',
+                        default=scraper.BASE_URL,
+                        metavar='URL',
+                        help='Base URL of the archive to mirror, default: "%(default)s"')
+
     return vars(parser.parse_args(argv))
 
 
+def serve_cli(argv):
+    """CLI entry point for the serve command."""
+    from mozdownload.ratelimit import get_rate_limiter
+    from mozdownload.server import ArchiveProxy, create_server
+
+    kwargs = parse_serve_arguments(argv)
+
+    logging.basicConfig(format='%(levelname)s | %(message)s', level=kwargs['log_level'])
+    logger = logging.getLogger(__name__)
+
+    rate_limiter = None
+    if kwargs['limit_rate']:
+        rate_limiter = get_rate_limiter(kwargs['limit_rate'], burst=kwargs['limit_burst'],
+                                        path=kwargs['limit_rate_file'])
+
+    proxy = ArchiveProxy(BuildCache(kwargs['cache_dir']).proxy_path,
+                         upstream=kwargs['upstream'], max_size=kwargs['cache_size'],
+                         rate_limiter=rate_limiter, logger=logger)
+    server = create_server(proxy, host=kwargs['host'], port=kwargs['port'])
+    logger.info('Serving %s at http://%s:%s/' % (proxy.upstream, kwargs['host'],
+                                                 server.server_address[1]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info('Server stopped by the user')
+    finally:
+        server.server_close()
+
+
 def cli(argv=None):
     """CLI entry point for mozdownload."""
-    kwargs = parse_arguments(argv or sys.argv[1:])
+    argv = argv or sys.argv[1:]
+    if argv and argv[0] == 'batch':
+        return batch_cli(argv[1:])
+    if argv and argv[0] == 'cache':
+        return cache_cli(argv[1:])
+    if argv and argv[0] == 'serve':
+        return serve_cli(argv[1:])
+
+    kwargs = parse_arguments(argv)
 
     log_level = kwargs.pop('log_level')
     logging.basicConfig(format='%(levelname)s | %(message)s', level=log_level)
@@ -154,10 +524,20 @@ def cli(argv=None):
     sub_log_level = logging.ERROR
     if log_level == logging.getLevelName(logging.DEBUG):
         sub_log_level = logging.DEBUG
-    logging.getLogger('redo').setLevel(sub_log_level)
     logging.getLogger('requests').setLevel(sub_log_level)
     logging.getLogger('thclient').setLevel(sub_log_level)
 
+    kwargs['retry_policy'] = RetryPolicy(attempts=kwargs['retry_attempts'] + 1,
+                                         delay=kwargs['retry_delay'],
+                                         max_delay=kwargs.pop('retry_max_delay'),
+                                         circuit_breaker=kwargs.pop('circuit_breaker'),
+                                         logger=logger)
+
+    metrics_json = kwargs.pop('metrics_json')
+    stats = kwargs.pop('stats')
+    if metrics_json or stats:
+        kwargs['metrics'] = Metrics()
+
     try:
         scraper_type = kwargs.pop('scraper_type')
 
@@ -172,6 +552,13 @@ def cli(argv=None):
             build.download()
     except KeyboardInterrupt:
         logger.error('Download interrupted by the user')
+    finally:
+        # Also report the metrics of failed runs
+        if stats:
+            for line in kwargs['metrics'].summary():
+                logger.info(line)
+        if metrics_json:
+            kwargs['metrics'].write_json(metrics_json)
 
 
 if __name__ == '__main__':
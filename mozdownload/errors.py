@@ -24,6 +24,51 @@ class NotFoundError(Exception):
         Exception.__init__(self, ': '.join([message, location]))
 
 
+class CircuitOpenError(Exception):
+    """Exception for a host which is not contacted due to too many failed requests."""
+
+    def __init__(self, message, location):
+        """Create an instance of an exception."""
+        self.location = location
+        Exception.__init__(self, ': '.join([message, location]))
+
+
+class ChecksumError(Exception):
+    """Exception for a download not matching its published checksum."""
+
+    def __init__(self, message, location):
+        """Create an instance of an exception."""
+        self.location = location
+        Exception.__init__(self, ': '.join([message, location]))
+
+
+class IncompleteDownloadError(Exception):
+    """Exception for a download which did not receive the expected content."""
+
+    def __init__(self, message, location):
+        """Create an instance of an exception."""
+        self.location = location
+        Exception.__init__(self, ': '.join([message, location]))
+
+
+class LockTimeoutError(Exception):
+    """Exception for a lock not being released in time by another process."""
+
+    def __init__(self, message, location):
+        """Create an instance of an exception."""
+        self.location = location
+        Exception.__init__(self, ': '.join([message, location]))
+
+
+class StallError(Exception):
+    """Exception for a download which receives data too slowly."""
+
+    def __init__(self, message, location):
+        """Create an instance of an exception."""
+        self.location = location
+        Exception.__init__(self, ': '.join([message, location]))
+
+
 class NotImplementedError(Exception):
     """Exception for a feature which is not implemented yet."""
 
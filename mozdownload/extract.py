@@ -0,0 +1,121 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Module to extract builds, also while they are still being downloaded."""
+
+from __future__ import absolute_import, unicode_literals
+
+import os
+import tarfile
+import threading
+import zipfile
+
+# Archive formats as (file extension, compression) tuples. Tar archives can be
+# extracted while they are received, zip archives only once complete.
+ARCHIVE_FORMATS = (('.tar.xz', 'xz'),
+                   ('.tar.bz2', 'bz2'),
+                   ('.tar.gz', 'gz'),
+                   ('.zip', 'zip'))
+
+# Size of the chunks in which the remainder of a stream gets discarded
+CHUNK_SIZE = 64 * 1024
+
+
+def archive_format(filename):
+    """Return the compression of a tar archive, 'zip', or None if not supported."""
+    for extension, compression in ARCHIVE_FORMATS:
+        if filename.lower().endswith(extension):
+            return compression
+
+    return None
+
+
+def _extract_tar(tar, destination):
+    # Refuse members which would end up outside of the destination
+    if hasattr(tarfile, 'data_filter'):
+        tar.extractall(destination, filter='data')
+    else:
+        tar.extractall(destination)
+
+
+def extract_file(filename, destination, compression):
+    """Extract the archive of the given compression into the destination folder.
+
+    :param filename: Path of the archive.
+    :param destination: Folder to extract the archive to.
+    :param compression: Compression as returned by archive_format().
+    """
+    os.makedirs(destination, exist_ok=True)
+    if compression == 'zip':
+        with zipfile.ZipFile(filename) as archive:
+            archive.extractall(destination)
+    else:
+        with tarfile.open(filename, 'r:%s' % compression) as tar:
+            _extract_tar(tar, destination)
+
+
+class StreamExtractor(object):
+    """Extract a tar archive in a separate thread while its data gets received.
+
+    The data is passed via update() through a pipe, so that decompression and
+    extraction overlap with the download. A full pipe blocks further updates
+    until the extraction caught up.
+    """
+
+    def __init__(self, destination, compression):
+        """Create an instance of the extractor, and start the extraction.
+
+        :param destination: Folder to extract the archive to.
+        :param compression: Compression of the tar archive (e.g. "xz").
+        """
+        os.makedirs(destination, exist_ok=True)
+
+        read_fd, write_fd = os.pipe()
+        self._reader = os.fdopen(read_fd, 'rb')
+        self._writer = os.fdopen(write_fd, 'wb')
+        self._error = None
+
+        self._thread = threading.Thread(target=self._extract,
+                                        args=(destination, compression), daemon=True)
+        self._thread.start()
+
+    def _extract(self, destination, compression):
+        try:
+            with tarfile.open(fileobj=self._reader, mode='r|%s' % compression) as tar:
+                _extract_tar(tar, destination)
+
+            # Consume padding after the end of the archive
+            while self._reader.read(CHUNK_SIZE):
+                pass
+        except Exception as exc:
+            self._error = exc
+        finally:
+            # Let pending updates fail instead of blocking forever
+            self._reader.close()
+
+    def update(self, data):
+        """Pass the next chunk of the archive to the extraction."""
+        try:
+            self._writer.write(data)
+        except (BrokenPipeError, ValueError):
+            self.close()
+            raise BrokenPipeError('Extraction stopped before the end of the archive')
+
+    def abort(self):
+        """Stop the extraction, and ignore its failure due to the incomplete archive."""
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def close(self):
+        """Wait until all data has been extracted, and raise a failure of the extraction."""
+        try:
+            self._writer.close()
+        except (BrokenPipeError, ValueError):
+            pass
+        self._thread.join()
+
+        if self._error:
+            raise self._error
@@ -28,25 +28,56 @@ class FactoryScraper(scraper.Scraper):
         :param scraper_type: The type of scraper to use.
 
         Scraper:
+        :param adapter: requests transport adapter to share connections with other
+            scrapers, default: the connection pool shared by the process.
         :param application: The name of the application to download.
-        :param base_url: The base url to be used
+        :param base_url: The base url to be used, or a list of mirrors to choose from.
         :param branch: Name of the branch.
+        :param connect_timeout: Amount of time (in seconds) to wait for a connection.
+        :param connections: Number of parallel connections used to download the build.
         :param build_number: Number of the build (for candidate, and daily builds).
+        :param cache_dir: Folder of the build cache shared across destinations.
+        :param cache_size: Maximum size of the build cache in bytes.
         :param date: Date of the build.
         :param debug_build: Download a debug build.
         :param destination: Directory or file name to download the file to.
         :param extension: File extension of the build (e.g. ".zip").
+        :param extract_dir: Folder to extract the build to while it gets downloaded.
         :param is_stub_installer: Stub installer (Only applicable to Windows builds).
+        :param keep_archive: Keep the downloaded archive next to the extracted build.
+        :param lazy: Don't access the server before the build gets resolved.
+        :param limit_burst: Maximum amount of bytes downloaded at once after being idle.
+        :param limit_rate: Maximum amount of bytes per second downloaded by all builds of
+            the process.
+        :param limit_rate_file: File to share the rate limit with other processes.
+        :param listing_cache: ListingCache instance to share directory listings with
+            other scrapers.
         :param locale: Locale of the application.
+        :param lock_timeout: Amount of time (in seconds) to wait for another process
+            downloading the same file.
         :param logger: Logger instance to use.
+        :param metrics: Metrics instance to record phases and requests in.
         :param password: Password for basic HTTP authentication.
         :param platform: Platform of the application
+        :param rate_limiter: TokenBucket instance to use instead of the one created
+            from limit_rate.
+        :param read_timeout: Amount of time (in seconds) to wait for the server to
+            send any data.
         :param retry_attempts: Number of times the download will be attempted
             in the event of a failure
-        :param retry_delay: Amount of time (in seconds) to wait between retry attempts.
+        :param retry_delay: Amount of time (in seconds) to wait before the first retry.
+        :param retry_policy: RetryPolicy instance to use instead of the one created
+            from retry_attempts and retry_delay.
         :param revision: Revision of the build to download.
-        :param timeout: Amount of time (in seconds) until a download times out.
+        :param session: requests Session instance to take the settings and
+            connections from, which doesn't get modified.
+        :param stall_speed: Minimum throughput (in bytes per second) of a download,
+            0 to disable the stall detection.
+        :param stall_time: Amount of time (in seconds) the throughput is measured over.
+        :param timeout: Amount of time (in seconds) until the resolution and download
+            of the build times out.
         :param username: Username for basic HTTP authentication.
+        :param verify_checksums: Verify the build against its published checksum.
         :param version: Version of the application to be downloaded.
 
         Daily builds:
@@ -72,19 +103,43 @@ class FactoryScraper(scraper.Scraper):
             raise NotSupportedError(error_msg)
 
         # Instantiate scraper and download the build
-        scraper_keywords = {'application': kwargs.get('application', 'firefox'),
+        scraper_keywords = {'adapter': kwargs.get('adapter'),
+                            'application': kwargs.get('application', 'firefox'),
                             'base_url': kwargs.get('base_url', scraper.BASE_URL),
+                            'cache_dir': kwargs.get('cache_dir'),
+                            'cache_size': kwargs.get('cache_size'),
+                            'connect_timeout': kwargs.get('connect_timeout',
+                                                          scraper.DEFAULT_CONNECT_TIMEOUT),
+                            'connections': kwargs.get('connections', 1),
                             'destination': kwargs.get('destination'),
                             'extension': kwargs.get('extension'),
+                            'extract_dir': kwargs.get('extract_dir'),
                             'is_stub_installer': kwargs.get('is_stub_installer'),
+                            'keep_archive': kwargs.get('keep_archive', False),
+                            'lazy': kwargs.get('lazy', False),
+                            'limit_burst': kwargs.get('limit_burst'),
+                            'limit_rate': kwargs.get('limit_rate'),
+                            'limit_rate_file': kwargs.get('limit_rate_file'),
+                            'listing_cache': kwargs.get('listing_cache'),
                             'locale': kwargs.get('locale'),
+                            'lock_timeout': kwargs.get('lock_timeout',
+                                                       scraper.DEFAULT_LOCK_TIMEOUT),
                             'logger': kwargs.get('logger', None),
+                            'metrics': kwargs.get('metrics'),
                             'password': kwargs.get('password'),
                             'platform': kwargs.get('platform'),
+                            'rate_limiter': kwargs.get('rate_limiter'),
+                            'read_timeout': kwargs.get('read_timeout',
+                                                       scraper.DEFAULT_READ_TIMEOUT),
                             'retry_attempts': kwargs.get('retry_attempts', 0),
                             'retry_delay': kwargs.get('retry_delay', 10),
+                            'retry_policy': kwargs.get('retry_policy'),
+                            'session': kwargs.get('session'),
+                            'stall_speed': kwargs.get('stall_speed', scraper.DEFAULT_STALL_SPEED),
+                            'stall_time': kwargs.get('stall_time', scraper.DEFAULT_STALL_TIME),
                             'timeout': kwargs.get('timeout'),
                             'username': kwargs.get('username'),
+                            'verify_checksums': kwargs.get('verify_checksums', False),
                             }
 
         scraper_type_keywords = {
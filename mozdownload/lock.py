@@ -0,0 +1,121 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Module for advisory file locks shared between processes."""
+
+from __future__ import absolute_import, unicode_literals
+
+import logging
+import os
+import time
+
+from mozdownload import errors
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+class FileLock(object):
+    """Advisory lock on a file, which is shared between processes.
+
+    The lock is held by the operating system, so it is released automatically
+    when the owning process gets killed. A left-over lock file is therefore
+    never stale, and gets locked by the next process.
+    """
+
+    def __init__(self, path, timeout=None, poll_interval=0.1, logger=None):
+        """Create an instance of a file lock.
+
+        :param path: Path of the lock file.
+        :param timeout: Amount of time (in seconds) to wait for the lock,
+            default: wait forever.
+        :param poll_interval: Amount of time (in seconds) between attempts.
+        :param logger: Logger instance to use.
+        """
+        self.path = path
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.fd = None
+
+    def __enter__(self):
+        """Acquire the lock."""
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        """Release the lock."""
+        self.release()
+
+    @property
+    def locked(self):
+        """Return whether the lock is held by this instance."""
+        return self.fd is not None
+
+    def _try_lock(self, fd):
+        try:
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def _unlock(self, fd):
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+    def acquire(self):
+        """Acquire the lock, waiting for other processes if necessary."""
+        start_time = time.monotonic()
+        waiting = False
+
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            if self._try_lock(fd):
+                # The previous owner removes the file when releasing the lock,
+                # so make sure the locked file is still the current one.
+                try:
+                    if os.path.samestat(os.fstat(fd), os.stat(self.path)):
+                        os.ftruncate(fd, 0)
+                        os.write(fd, str(os.getpid()).encode('ascii'))
+                        self.fd = fd
+                        return
+                except OSError:
+                    pass
+                self._unlock(fd)
+            os.close(fd)
+
+            if not waiting:
+                waiting = True
+                self.logger.info('Waiting for another process to release the lock: %s' %
+                                 self.path)
+
+            if self.timeout is not None and time.monotonic() - start_time >= self.timeout:
+                raise errors.LockTimeoutError('Timed out waiting for lock', self.path)
+
+            time.sleep(self.poll_interval)
+
+    def release(self):
+        """Release the lock and remove the lock file."""
+        if self.fd is None:
+            return
+
+        try:
+            os.remove(self.path)
+        except OSError:
+            # Open files cannot be removed on Windows
+            pass
+
+        self._unlock(self.fd)
+        os.close(self.fd)
+        self.fd = None
@@ -0,0 +1,121 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Module to record timings of the phases and HTTP requests of a run."""
+
+from __future__ import absolute_import, unicode_literals
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+
+class Metrics(object):
+    """Recorder of the phases and the HTTP requests of scrapers.
+
+    Phases are named sections of the work of a scraper, e.g. the retrieval
+    of the build information or the download. Requests get recorded for each
+    session the metrics have been attached to.
+    """
+
+    def __init__(self):
+        """Create an instance of the metrics recorder."""
+        self.started = datetime.now(timezone.utc)
+        self._start_time = time.monotonic()
+        self._phases = []
+        self._requests = []
+        self._received = {}
+        self._lock = threading.Lock()
+
+    def _offset(self, timestamp):
+        return round(timestamp - self._start_time, 6)
+
+    @contextmanager
+    def phase(self, name):
+        """Context manager to record the duration of a phase."""
+        start_time = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._phases.append({'name': name,
+                                     'start': self._offset(start_time),
+                                     'duration': round(time.monotonic() - start_time, 6)})
+
+    def attach(self, session):
+        """Record all requests of the given requests session."""
+        if self._record_response not in session.hooks['response']:
+            session.hooks['response'].append(self._record_response)
+
+    def _record_response(self, response, *args, **kwargs):
+        latency = response.elapsed.total_seconds()
+        request = {'method': response.request.method,
+                   'url': response.url,
+                   'status': response.status_code,
+                   'start': self._offset(time.monotonic() - latency),
+                   'latency': round(latency, 6)}
+        with self._lock:
+            self._requests.append((request, response.raw, response.headers))
+
+    def count_bytes(self, response, size):
+        """Add the given amount of bytes to those received for a response.
+
+        Bodies which are read directly from the socket are not counted by
+        urllib3, so readers of those have to report the received bytes.
+        """
+        with self._lock:
+            key = id(response.raw)
+            self._received[key] = self._received.get(key, 0) + size
+
+    def _response_bytes(self, raw, headers):
+        """Return the amount of bytes received for the body of a response."""
+        received = self._received.get(id(raw)) or getattr(raw, 'tell', lambda: 0)()
+        if received:
+            return received
+
+        try:
+            return int(headers.get('Content-Length'))
+        except (TypeError, ValueError):
+            return None
+
+    def report(self):
+        """Return the recorded metrics as dict."""
+        with self._lock:
+            phases = list(self._phases)
+            requests = [dict(request, bytes=self._response_bytes(raw, headers))
+                        for request, raw, headers in self._requests]
+
+        phase_totals = {}
+        for phase in phases:
+            phase_totals[phase['name']] = round(
+                phase_totals.get(phase['name'], 0) + phase['duration'], 6)
+
+        return {'started': self.started.isoformat(),
+                'duration': self._offset(time.monotonic()),
+                'phases': phases,
+                'requests': requests,
+                'totals': {'phases': phase_totals,
+                           'requests': len(requests),
+                           'bytes': sum(request['bytes'] or 0 for request in requests),
+                           'latency': round(sum(request['latency']
+                                                for request in requests), 6)}}
+
+    def summary(self):
+        """Return a human readable summary of the recorded metrics as list of lines."""
+        report = self.report()
+        totals = report['totals']
+        lines = ['Total time: %.2fs' % report['duration'],
+                 'Requests: %s (%.1f MB, %.2fs until response headers)' % (
+                     totals['requests'], totals['bytes'] / 1024 ** 2, totals['latency'])]
+        for name, duration in totals['phases'].items():
+            lines.append('Phase %s: %.2fs' % (name, duration))
+
+        return lines
+
+    def write_json(self, path):
+        """Write the recorded metrics as JSON to the given file."""
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
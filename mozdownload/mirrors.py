@@ -0,0 +1,122 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Module to route requests to the fastest healthy mirror of the archive."""
+
+from __future__ import absolute_import, unicode_literals
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from mozdownload.retry import FAILURE_STATUS_CODES, get_circuit_breaker
+from mozdownload.session import create_session
+
+# Amount of time (in seconds) to wait for the response of a probe
+PROBE_TIMEOUT = 5.
+
+
+class MirrorSet(object):
+    """Ordered list of base URLs which serve the same content.
+
+    All URLs below one of the mirrors can be translated to the currently
+    preferred mirror. Mirrors get ranked by the latency of a probe request,
+    and a mirror which failed gets moved to the end of the ranking.
+    """
+
+    def __init__(self, urls, session=None, logger=None):
+        """Create an instance of a mirror set.
+
+        :param urls: Base URLs of the mirrors, in the order of preference.
+        :param session: requests Session instance to use for probes.
+        :param logger: Logger instance to use.
+        """
+        self.mirrors = [url if url.endswith('/') else url + '/' for url in urls]
+        self.session = session or create_session()
+        self.logger = logger or logging.getLogger(self.__module__)
+
+        self._ranking = list(self.mirrors)
+        self._lock = threading.Lock()
+
+    @property
+    def ranking(self):
+        """Return the mirrors ordered by preference."""
+        with self._lock:
+            return list(self._ranking)
+
+    @property
+    def best(self):
+        """Return the preferred mirror whose host is not failing fast."""
+        ranking = self.ranking
+        for mirror in ranking:
+            if not get_circuit_breaker(mirror).is_open:
+                return mirror
+
+        return ranking[0]
+
+    def probe(self, timeout=PROBE_TIMEOUT):
+        """Probe all mirrors concurrently, and rank them by health and latency.
+
+        Healthy mirrors come first, ordered by latency. Unhealthy mirrors
+        keep their relative order behind them.
+        """
+        def _probe(mirror):
+            start_time = time.monotonic()
+            try:
+                r = self.session.get(mirror, stream=True, timeout=timeout)
+                r.close()
+            except requests.exceptions.RequestException as exc:
+                self.logger.warning('Mirror %s is not available: %s' % (mirror, exc))
+                return None
+            if r.status_code in FAILURE_STATUS_CODES:
+                self.logger.warning('Mirror %s is not available: status %s' %
+                                    (mirror, r.status_code))
+                return None
+
+            return time.monotonic() - start_time
+
+        with ThreadPoolExecutor(max_workers=len(self.mirrors)) as executor:
+            latencies = dict(zip(self.mirrors, executor.map(_probe, self.mirrors)))
+
+        healthy = sorted((mirror for mirror in self.mirrors if latencies[mirror] is not None),
+                         key=lambda mirror: latencies[mirror])
+        unhealthy = [mirror for mirror in self.mirrors if latencies[mirror] is None]
+        with self._lock:
+            self._ranking = healthy + unhealthy
+
+        for mirror in healthy:
+            self.logger.debug('Mirror %s responded in %.3fs' % (mirror, latencies[mirror]))
+
+        return self.ranking
+
+    def mirror_of(self, url):
+        """Return the mirror the URL belongs to, or None."""
+        for mirror in self.mirrors:
+            if url.startswith(mirror):
+                return mirror
+
+        return None
+
+    def translate(self, url):
+        """Return the URL on the preferred mirror, or the URL itself if not mirrored."""
+        mirror = self.mirror_of(url)
+        if mirror is None:
+            return url
+
+        return self.best + url[len(mirror):]
+
+    def mark_failed(self, url):
+        """Move the mirror of the URL to the end of the ranking."""
+        mirror = self.mirror_of(url)
+        with self._lock:
+            if mirror is None or len(self._ranking) < 2 or self._ranking[-1] == mirror:
+                return
+            self._ranking.remove(mirror)
+            self._ranking.append(mirror)
+            fallback = self._ranking[0]
+
+        self.logger.warning('Mirror %s failed, switching to %s' % (mirror, fallback))
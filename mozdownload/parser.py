@@ -6,57 +6,440 @@
 
 from __future__ import absolute_import, unicode_literals
 
+import codecs
+import hashlib
+import itertools
+import json
+import os
 import re
+import shutil
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from datetime import datetime, timezone
 
-import requests
 from html.parser import HTMLParser
 from urllib.parse import unquote
 
+from mozdownload.session import create_session
+
+
+# Size of the chunks in which the content of a directory gets parsed
+CHUNK_SIZE = 64 * 1024
+
+# Amount of time (in seconds) parsed entries are used without revalidation
+DEFAULT_MAX_AGE = 60.
+
+# Amount of time (in seconds) after the end of a month until no more builds
+# get added to its folder of nightly builds
+MONTH_GRACE_PERIOD = 24 * 3600.
+
+
+def _past_month_max_age(match):
+    """Return the max age of the folder of nightly builds of a given month."""
+    year, month = int(match.group(1)), int(match.group(2))
+    now = datetime.fromtimestamp(time.time() - MONTH_GRACE_PERIOD, timezone.utc)
+    if (year, month) < (now.year, now.month):
+        return float('inf')
+
+    return DEFAULT_MAX_AGE
+
+
+# Policies as list of (regex, max age) tuples, where the max age can also be a
+# callable which gets the match of the regex. The first matching URL wins.
+DEFAULT_POLICIES = [
+    (r'/nightly/(\d{4})/(\d{2})/$', _past_month_max_age),
+]
+
+
+class ListingCache(object):
+    """Cache of parsed directory listings, shared between threads.
+
+    Entries are kept in memory, and also on disk if a folder has been given.
+    Along with the entries the validators of the listing are stored, so that
+    outdated entries can be revalidated with a conditional request.
+    """
+
+    def __init__(self, path=None, policies=None, max_age=DEFAULT_MAX_AGE):
+        """Create an instance of a listing cache.
+
+        :param path: Folder to persist the listings in, default: memory only.
+        :param policies: List of (regex, max age) tuples for the amount of time
+            (in seconds) the entries of matching URLs are used without
+            revalidation, default: DEFAULT_POLICIES.
+        :param max_age: Max age of entries not matching any of the policies.
+        """
+        self.path = os.path.abspath(path) if path else None
+        self.policies = [(re.compile(pattern), value) for pattern, value in
+                         (DEFAULT_POLICIES if policies is None else policies)]
+        self.max_age = max_age
+
+        self._records = {}
+        self._lock = threading.Lock()
+
+    def _record_path(self, url):
+        return os.path.join(self.path, hashlib.sha256(url.encode('utf-8')).hexdigest() + '.json')
+
+    def _save(self, url, record):
+        with self._lock:
+            self._records[url] = record
+
+        if not self.path:
+            return
+
+        path = self._record_path(url)
+        tmp_path = '%s.%s.%s.tmp' % (path, os.getpid(), threading.get_ident())
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump(dict(record, url=url), f)
+            os.replace(tmp_path, path)
+        except OSError:
+            # The cache is an optimization only
+            pass
+
+    def max_age_for(self, url):
+        """Return the amount of time the entries of the URL are used as is."""
+        for pattern, value in self.policies:
+            match = pattern.search(url)
+            if match:
+                return value(match) if callable(value) else value
+
+        return self.max_age
+
+    def lookup(self, url):
+        """Return the cached record of the given URL even if outdated, or None.
+
+        A record is a dict of the ``entries``, the ``etag`` and ``last_modified``
+        validators, and the time it has been ``checked`` against the server.
+        """
+        with self._lock:
+            record = self._records.get(url)
+        if record is None and self.path:
+            try:
+                with open(self._record_path(url)) as f:
+                    record = json.load(f)
+            except (OSError, ValueError):
+                return None
+
+            if record.pop('url', None) != url:
+                return None
+            with self._lock:
+                self._records[url] = record
+
+        return dict(record, entries=list(record['entries'])) if record else None
+
+    def is_fresh(self, url, record):
+        """Check if the record can be used without revalidation."""
+        return time.time() - record['checked'] <= self.max_age_for(url)
+
+    def get(self, url):
+        """Return a copy of the cached entries if they are fresh, or None."""
+        record = self.lookup(url)
+        if record is None or not self.is_fresh(url, record):
+            return None
+
+        return record['entries']
+
+    def set(self, url, entries, etag=None, last_modified=None):
+        """Store the entries of the given URL along with its validators."""
+        self._save(url, {'entries': list(entries),
+                         'etag': etag,
+                         'last_modified': last_modified,
+                         'checked': time.time()})
+
+    def refresh(self, url, record=None):
+        """Mark the record of the given URL as revalidated, and return its entries.
+
+        :param url: URL of the directory listing.
+        :param record: Record which has been revalidated, to store again if it
+            has been removed from the cache meanwhile.
+        """
+        record = self.lookup(url) or record
+        if record is None:
+            return None
+
+        record['checked'] = time.time()
+        self._save(url, record)
+
+        return record['entries']
+
+    def clear(self):
+        """Remove all records from the cache."""
+        with self._lock:
+            self._records.clear()
+
+        if self.path:
+            shutil.rmtree(self.path, ignore_errors=True)
+
+
+class RequestCoalescer(object):
+    """Single-flight for concurrent requests of the same directory listing.
+
+    The first parser which needs a listing fetches it, while all others which
+    need the same listing meanwhile wait for it and share its entries. The
+    numbers of fetched, coalesced, and cached listings are counted.
+    """
+
+    def __init__(self):
+        """Create an instance of a request coalescer."""
+        self._inflight = {}
+        self._counts = {'fetches': 0, 'coalesced': 0, 'hits': 0}
+        self._lock = threading.Lock()
+
+    def join(self, key):
+        """Join the fetch of the given listing, and return (future, leader).
+
+        If leader is True the caller has to fetch the listing, and to pass its
+        entries to finish(). Otherwise it waits for the result of the future.
+        """
+        with self._lock:
+            flight = self._inflight.get(key)
+            if flight is None:
+                flight = self._inflight[key] = {'future': Future(), 'waiters': 0}
+                self._counts['fetches'] += 1
+                return flight['future'], True
+
+            flight['waiters'] += 1
+            self._counts['coalesced'] += 1
+            return flight['future'], False
+
+    def leave(self, key, future):
+        """Stop waiting for the fetch of the given listing."""
+        with self._lock:
+            flight = self._inflight.get(key)
+            if flight is not None and flight['future'] is future:
+                flight['waiters'] -= 1
+
+    def abandon(self, key, future):
+        """Cancel the fetch unless others are waiting for it, and return if cancelled."""
+        with self._lock:
+            flight = self._inflight.get(key)
+            if flight is None or flight['future'] is not future:
+                return True
+            if flight['waiters']:
+                return False
+
+            del self._inflight[key]
+            return True
+
+    def finish(self, key, future, entries=None, exception=None):
+        """Pass the entries or the failure of the fetch to all waiting parsers."""
+        with self._lock:
+            flight = self._inflight.get(key)
+            if flight is not None and flight['future'] is future:
+                del self._inflight[key]
+
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(list(entries))
+
+    def record_hit(self):
+        """Count a listing which has been taken from the cache."""
+        with self._lock:
+            self._counts['hits'] += 1
+
+    def stats(self):
+        """Return the numbers of fetched, coalesced, and cached listings as dict."""
+        with self._lock:
+            return dict(self._counts)
+
+    def reset_stats(self):
+        """Reset all counts to zero."""
+        with self._lock:
+            self._counts = dict.fromkeys(self._counts, 0)
+
+
+_request_coalescer = RequestCoalescer()
+
+
+def get_request_coalescer():
+    """Return the request coalescer shared by all scrapers of the process."""
+    return _request_coalescer
+
 
 class DirectoryParser(HTMLParser):
     """Class to parse directory listings."""
 
-    def __init__(self, url, session=None, authentication=None, timeout=None):
+    def __init__(self, url, session=None, authentication=None, timeout=None, cache=None,
+                 lazy=False, coalescer=None):
         """Create instance of a directory parser.
 
         :param url: url of the directory on the web server.
         :param session: a requests Session instance used to fetch the directory
-                        content. If None, a new session will be created.
+                        content. If None, a new session will be created, which
+                        shares the connections of the process.
         :param authentication: a tuple (username, password) to authenticate against
                                the web server, or None for no authentication. Note
                                that it will only be used if the given *session* is
                                None.
         :param timeout: timeout in seconds used when fetching the directory
                         content.
+        :param cache: a ListingCache instance to reuse the entries of directories
+                      which have already been fetched.
+        :param lazy: if True the directory content is not fetched before the
+                     entries get iterated via iter_entries().
+        :param coalescer: a RequestCoalescer instance to share the fetch of the
+                          directory with concurrent parsers.
         """
         if not session:
-            session = requests.Session()
+            session = create_session()
             session.auth = authentication
         self.session = session
         self.timeout = timeout
+        self.cache = cache
+        self.coalescer = coalescer
+        self.url = url
 
         self.active_url = None
+        self.active_data = ''
         self.entries = []
 
         HTMLParser.__init__(self)
 
-        # Force the server to not send cached content
-        headers = {'Cache-Control': 'max-age=0'}
-        r = self.session.get(url, headers=headers, timeout=self.timeout)
+        if not lazy:
+            self.entries = list(self.iter_entries())
 
-        try:
-            r.raise_for_status()
-            self.feed(r.text)
-        finally:
-            r.close()
+    def _wait_timeout(self):
+        """Return how long to wait for a listing fetched by another parser.
+
+        That is at most as long as fetching it directly may take until the
+        server responds, or None to wait without a limit.
+        """
+        if isinstance(self.timeout, tuple):
+            return None if None in self.timeout else sum(self.timeout)
+
+        return self.timeout
+
+    @staticmethod
+    def _matcher(filter):
+        """Return a function which checks if an entry matches the filter."""
+        if filter is None:
+            return lambda entry: True
+        elif hasattr(filter, '__call__'):
+            return filter
+        else:
+            return re.compile(filter, re.IGNORECASE).match
 
     def filter(self, filter):
         """Filter entries by calling function or applying regex."""
-        if hasattr(filter, '__call__'):
-            return [entry for entry in self.entries if filter(entry)]
-        else:
-            pattern = re.compile(filter, re.IGNORECASE)
-            return [entry for entry in self.entries if pattern.match(entry)]
+        matches = self._matcher(filter)
+        return [entry for entry in self.entries if matches(entry)]
+
+    def iter_entries(self, filter=None):
+        """Yield the entries of the directory while its content gets parsed.
+
+        The directory content is fetched and parsed in chunks, so the caller
+        can stop as soon as it found the entry it is looking for. All parsed
+        entries are collected in *entries*. If a cache is used, the remaining
+        content still gets parsed once the caller stopped, so that only
+        complete directories are stored in the cache. The same applies if
+        other parsers wait for the content via the coalescer. Those fetch the
+        content themselves if it takes longer than the timeout.
+
+        :param filter: function or regex which entries have to match.
+        """
+        matches = self._matcher(filter)
+
+        record = self.cache.lookup(self.url) if self.cache else None
+        if record and self.cache.is_fresh(self.url, record):
+            if self.coalescer:
+                self.coalescer.record_hit()
+            self.entries = record['entries']
+            yield from [entry for entry in self.entries if matches(entry)]
+            return
+
+        key = future = None
+        if self.coalescer:
+            # Listings are only shared between parsers with the same credentials
+            key = (self.url, self.session.auth)
+            future, leader = self.coalescer.join(key)
+            if not leader:
+                try:
+                    self.entries = list(future.result(self._wait_timeout()))
+                except FutureTimeoutError:
+                    # The other parser stalled, so fetch the listing directly
+                    self.coalescer.leave(key, future)
+                    key = future = None
+                else:
+                    yield from [entry for entry in self.entries if matches(entry)]
+                    return
+
+        yield from self._fetch_entries(record, matches, key, future)
+
+    def _fetch_entries(self, record, matches, key=None, future=None):
+        """Fetch and parse the directory content, and yield the matching entries.
+
+        If a future of the coalescer is given, the entries or the failure get
+        passed to the parsers waiting for it, as soon as they are known.
+        """
+        try:
+            # Force the server to not send cached content, but let it confirm
+            # that a cached listing is still valid.
+            headers = {'Cache-Control': 'max-age=0'}
+            if record and record['etag']:
+                headers['If-None-Match'] = record['etag']
+            if record and record['last_modified']:
+                headers['If-Modified-Since'] = record['last_modified']
+            r = self.session.get(self.url, headers=headers, stream=True, timeout=self.timeout)
+
+            try:
+                if record and r.status_code == 304:
+                    self.entries = self.cache.refresh(self.url, record)
+                    if future:
+                        self.coalescer.finish(key, future, entries=self.entries)
+                    yield from [entry for entry in self.entries if matches(entry)]
+                else:
+                    yield from self._parse_content(r, matches, key, future)
+            finally:
+                r.close()
+        except BaseException as exc:
+            # Closing the generator after all entries have been passed on is no failure
+            if future and not future.done():
+                self.coalescer.finish(key, future, exception=exc)
+            raise
+
+    def _parse_content(self, r, matches, key, future):
+        """Parse the content of the response, and yield the matching entries."""
+        r.raise_for_status()
+
+        self.reset()
+        self.active_url = None
+        self.active_data = ''
+        self.entries = []
+        decoder = codecs.getincrementaldecoder(r.encoding or 'utf-8')(errors='replace')
+
+        parsed = 0
+        stopped = False
+        for chunk in itertools.chain(r.iter_content(CHUNK_SIZE), [None]):
+            if chunk is None:
+                self.feed(decoder.decode(b'', final=True))
+                self.close()
+            else:
+                self.feed(decoder.decode(chunk))
+
+            while parsed < len(self.entries) and not stopped:
+                entry = self.entries[parsed]
+                parsed += 1
+                if matches(entry):
+                    try:
+                        yield entry
+                    except GeneratorExit:
+                        # The rest of the content is only needed to store a
+                        # complete directory in the cache, or for other
+                        # parsers waiting for it
+                        if not self.cache and (future is None or
+                                               self.coalescer.abandon(key, future)):
+                            raise
+                        stopped = True
+
+        if self.cache:
+            self.cache.set(self.url, self.entries,
+                           etag=r.headers.get('ETag'),
+                           last_modified=r.headers.get('Last-Modified'))
+        if future:
+            self.coalescer.finish(key, future, entries=self.entries)
 
     def handle_starttag(self, tag, attrs):
         """Callback for when a tag gets opened."""
@@ -70,20 +453,25 @@ class DirectoryParser(HTMLParser):
                 # always get it, we remove a possible final slash first
                 url = unquote(attr[1])
                 self.active_url = url.rstrip('/').split('/')[-1]
+                self.active_data = ''
 
                 return
 
     def handle_endtag(self, tag):
         """Callback for when a tag gets closed."""
         if tag == 'a':
+            # The visible text can have a final slash so strip it off
+            if self.active_url and self.active_data.strip('/') == self.active_url:
+                self.entries.append(self.active_url)
+
             self.active_url = None
+            self.active_data = ''
 
     def handle_data(self, data):
         """Callback when the data of a tag has been collected."""
         # Only process the data when we are in an active a tag and have an URL.
+        # When parsing in chunks the data can be split across multiple calls.
         if not self.active_url:
             return
 
-        # The visible text can have a final slash so strip it off
-        if data.strip('/') == self.active_url:
-            self.entries.append(self.active_url)
+        self.active_data += data
@@ -0,0 +1,139 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Module to limit the bandwidth of downloads, also across processes."""
+
+from __future__ import absolute_import, unicode_literals
+
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# Minimum amount of time (in seconds) to sleep for. Shorter delays are carried
+# over to the next chunk, so that the throughput is shaped without a sleep
+# call per chunk.
+MIN_SLEEP = 0.05
+
+# Amount of traffic (in seconds at the given rate) which is reserved at once
+# from the budget shared between processes
+SHARED_INTERVAL = 0.1
+
+# Rate limiters are shared by all downloads of the process
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+class TokenBucket(object):
+    """Token bucket which limits the amount of bytes transferred per second.
+
+    Tokens are refilled at the given rate, up to the burst size. Transfers
+    take as many tokens as bytes they received, and wait if the bucket ran
+    empty. The bucket is tracked as the theoretical arrival time of the
+    next byte, so that concurrent transfers queue up behind each other.
+
+    If a path is given, the bucket is stored in that file and shared with all
+    other processes which use the same file.
+    """
+
+    def __init__(self, rate, burst=None, path=None):
+        """Create an instance of a token bucket.
+
+        :param rate: Amount of bytes per second.
+        :param burst: Maximum amount of bytes which can be transferred at once
+            after being idle, default: the amount of one second.
+        :param path: File to share the bucket with other processes.
+        """
+        if rate <= 0:
+            raise ValueError('The rate has to be greater than 0')
+
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self.path = os.path.abspath(path) if path else None
+
+        self._tat = 0.
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _advance(self, tat, now, amount):
+        # An idle bucket holds at most the burst size
+        tat = max(tat, now - self.burst / self.rate) + amount / self.rate
+
+        return tat, max(0., tat - now)
+
+    def reserve(self, amount):
+        """Take the given amount of tokens, and return the time to wait for them."""
+        with self._lock:
+            if self.path is None:
+                self._tat, wait = self._advance(self._tat, time.monotonic(), amount)
+                return wait
+
+            # Only update the shared file once per interval
+            self._pending += amount
+            if self._pending < self.rate * SHARED_INTERVAL:
+                return 0.
+            amount, self._pending = self._pending, 0
+
+            return self._reserve_shared(amount)
+
+    def _reserve_shared(self, amount):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+
+            try:
+                tat = float(os.read(fd, 64).decode('ascii'))
+            except ValueError:
+                tat = 0.
+
+            # The wall clock is the only clock shared between processes
+            tat, wait = self._advance(tat, time.time(), amount)
+
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            os.write(fd, repr(tat).encode('ascii'))
+
+            if not fcntl:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            # Closing the file releases the lock
+            os.close(fd)
+
+        return wait
+
+    def consume(self, amount):
+        """Take the given amount of tokens, and wait until they are available.
+
+        Returns the amount of time (in seconds) slept.
+        """
+        wait = self.reserve(amount)
+        if wait < MIN_SLEEP:
+            return 0.
+
+        time.sleep(wait)
+        return wait
+
+
+def get_rate_limiter(rate, burst=None, path=None):
+    """Return the token bucket shared in the process for the given limits."""
+    key = (rate, burst, os.path.abspath(path) if path else None)
+    with _rate_limiters_lock:
+        if key not in _rate_limiters:
+            _rate_limiters[key] = TokenBucket(rate, burst=burst, path=path)
+        return _rate_limiters[key]
+
+
+def reset_rate_limiters():
+    """Forget all rate limiters of the process."""
+    with _rate_limiters_lock:
+        _rate_limiters.clear()
@@ -0,0 +1,280 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Module to retry failed requests with backoff, and to fail fast for unhealthy hosts."""
+
+from __future__ import absolute_import, unicode_literals
+
+import logging
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+
+from mozdownload import errors
+
+# Maximum amount of time (in seconds) to wait between two attempts
+DEFAULT_MAX_DELAY = 300.
+
+# Factor the delay grows with for each further attempt
+DEFAULT_BACKOFF = 2.
+
+# Status codes which ask the client to try again later
+RETRY_AFTER_STATUS_CODES = (429, 503)
+
+# Status codes which count as failures of the host for the circuit breaker
+FAILURE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Exceptions which count as failures of the host for the circuit breaker
+FAILURE_EXCEPTIONS = (requests.exceptions.ConnectionError,
+                      requests.exceptions.ChunkedEncodingError,
+                      requests.exceptions.Timeout)
+
+# Error rate at which the circuit breaker of a host opens
+DEFAULT_FAILURE_THRESHOLD = 0.5
+
+# Number of most recent requests the error rate is computed for
+DEFAULT_WINDOW = 20
+
+# Minimum number of requests before the circuit breaker may open
+DEFAULT_MIN_REQUESTS = 10
+
+# Amount of time (in seconds) the circuit breaker stays open before probing the host
+DEFAULT_COOLDOWN = 30.
+
+# Circuit breakers are shared by all scrapers of the process
+_circuit_breakers = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+class CircuitBreaker(object):
+    """Track the error rate of a host, and reject requests while it is too high.
+
+    Once the error rate of the most recent requests reaches the threshold, the
+    breaker opens and rejects all requests. After the cooldown a single request
+    is let through as probe, which either closes the breaker again or keeps it
+    open for another cooldown.
+    """
+
+    def __init__(self, threshold=DEFAULT_FAILURE_THRESHOLD, window=DEFAULT_WINDOW,
+                 min_requests=DEFAULT_MIN_REQUESTS, cooldown=DEFAULT_COOLDOWN):
+        """Create an instance of a circuit breaker.
+
+        :param threshold: Error rate (between 0 and 1) at which the breaker opens.
+        :param window: Number of most recent requests the error rate is computed for.
+        :param min_requests: Minimum number of requests before the breaker may open.
+        :param cooldown: Amount of time (in seconds) to reject requests when open.
+        """
+        self.threshold = threshold
+        self.min_requests = min_requests
+        self.cooldown = cooldown
+
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = None
+        self._probe_started = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        """Return whether requests are currently rejected."""
+        with self._lock:
+            return self._opened_at is not None
+
+    def allow(self):
+        """Return whether a request may be sent."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+
+            now = time.monotonic()
+            if now - self._opened_at < self.cooldown:
+                return False
+
+            # Only a single probe at a time, unless it never reported back
+            if self._probe_started is not None and now - self._probe_started < self.cooldown:
+                return False
+
+            self._probe_started = now
+            return True
+
+    def record(self, success):
+        """Record the outcome of a request."""
+        with self._lock:
+            if self._opened_at is not None:
+                if self._probe_started is None:
+                    # Response of a request sent before the breaker opened
+                    return
+
+                # Outcome of the probe decides if the host is healthy again
+                self._probe_started = None
+                if success:
+                    self._opened_at = None
+                    self._outcomes.clear()
+                else:
+                    self._opened_at = time.monotonic()
+                return
+
+            self._outcomes.append(success)
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_requests and \
+                    failures >= self.threshold * len(self._outcomes):
+                self._opened_at = time.monotonic()
+
+
+def get_circuit_breaker(url):
+    """Return the circuit breaker shared for the host of the given URL."""
+    host = urlparse(url).netloc
+    with _circuit_breakers_lock:
+        if host not in _circuit_breakers:
+            _circuit_breakers[host] = CircuitBreaker()
+        return _circuit_breakers[host]
+
+
+def reset_circuit_breakers():
+    """Forget the state of all hosts."""
+    with _circuit_breakers_lock:
+        _circuit_breakers.clear()
+
+
+def record_response(response, *args, **kwargs):
+    """Record the outcome of a response in the circuit breaker of its host.
+
+    It can be registered as response hook of requests sessions.
+    """
+    get_circuit_breaker(response.url).record(
+        response.status_code not in FAILURE_STATUS_CODES)
+
+
+def failed_url(exc):
+    """Return the URL of the request which caused the exception, if known."""
+    request = getattr(exc, 'request', None)
+    if request is not None and getattr(request, 'url', None):
+        return request.url
+
+    return getattr(exc, 'location', None)
+
+
+def parse_retry_after(value):
+    """Return the amount of seconds of a Retry-After header, or None if invalid."""
+    if not value:
+        return None
+
+    try:
+        return max(0., float(value))
+    except ValueError:
+        pass
+
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+
+    return max(0., (date - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryPolicy(object):
+    """Policy to retry failed operations with exponential backoff and full jitter.
+
+    The delay before the n-th retry is chosen randomly between 0 and
+    delay * backoff ** (n - 1), limited by max_delay, so that many clients
+    failing at the same time don't retry in lockstep. If the server asked to
+    retry later via the Retry-After header of a 429 or 503 response, at least
+    that amount of time is waited.
+    """
+
+    def __init__(self, attempts=1, delay=10., backoff=DEFAULT_BACKOFF,
+                 max_delay=DEFAULT_MAX_DELAY, jitter=True, circuit_breaker=True,
+                 logger=None):
+        """Create an instance of a retry policy.
+
+        :param attempts: Total number of attempts, including the first one.
+        :param delay: Amount of time (in seconds) to wait before the first retry.
+        :param backoff: Factor the delay grows with for each further retry.
+        :param max_delay: Maximum amount of time (in seconds) to wait before a retry.
+        :param jitter: Randomize the delays to spread the retries of many clients.
+        :param circuit_breaker: Fail fast if the circuit breaker of the host is open.
+        :param logger: Logger instance to use.
+        """
+        self.attempts = max(1, attempts)
+        self.delay = delay
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.circuit_breaker = circuit_breaker
+        self.logger = logger or logging.getLogger(self.__module__)
+
+    def sleep_time(self, retry, retry_after=None):
+        """Return the amount of time (in seconds) to wait before the given retry.
+
+        :param retry: Number of the retry, starting at 1.
+        :param retry_after: Amount of time (in seconds) the server asked to wait.
+        """
+        delay = min(self.max_delay, self.delay * self.backoff ** (retry - 1))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+
+        if retry_after is not None:
+            # Still spread the retries, as all clients got the same answer
+            jitter = random.uniform(0, self.delay) if self.jitter else 0
+            delay = max(delay, min(self.max_delay, retry_after + jitter))
+
+        return delay
+
+    def retry(self, func, retry_exceptions=(Exception,), url=None, deadline=None):
+        """Call the function until it succeeds or all attempts have failed.
+
+        Responses with status 429 or 503 are always retried.
+
+        :param func: Function to call.
+        :param retry_exceptions: Exceptions which cause a further attempt.
+        :param url: URL of the host to check the circuit breaker of before each attempt,
+            or a function which returns it.
+        :param deadline: Value of time.monotonic() after which no further attempt
+            gets started.
+        """
+        for attempt in range(1, self.attempts + 1):
+            self._check_circuit_breaker(url() if callable(url) else url)
+
+            try:
+                return func()
+            except Exception as exc:
+                failed = failed_url(exc)
+                if failed and isinstance(exc, FAILURE_EXCEPTIONS):
+                    get_circuit_breaker(failed).record(False)
+
+                retry_after = None
+                response = getattr(exc, 'response', None)
+                if isinstance(exc, requests.exceptions.HTTPError) and response is not None and \
+                        response.status_code in RETRY_AFTER_STATUS_CODES:
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                elif not isinstance(exc, retry_exceptions):
+                    raise
+
+                if attempt == self.attempts:
+                    raise
+
+                # Don't wait for a further attempt if its host is failing already
+                target = (url() if callable(url) else url) or failed
+                if self.circuit_breaker and target and get_circuit_breaker(target).is_open:
+                    raise errors.CircuitOpenError('Too many requests to the host failed',
+                                                  target) from exc
+
+                sleep_time = self.sleep_time(attempt, retry_after)
+                if deadline is not None and time.monotonic() + sleep_time >= deadline:
+                    raise errors.TimeoutError() from exc
+
+                self.logger.info('Attempt %s of %s failed (%s), retrying in %.1fs' %
+                                 (attempt, self.attempts, exc, sleep_time))
+                time.sleep(sleep_time)
+
+    def _check_circuit_breaker(self, url):
+        if self.circuit_breaker and url and not get_circuit_breaker(url).allow():
+            raise errors.CircuitOpenError('Too many requests to the host failed', url)
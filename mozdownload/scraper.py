@@ -6,22 +6,36 @@
 
 from __future__ import absolute_import, unicode_literals
 
+import hashlib
+import http.client
+import json
 import logging
 import os
 import re
+import socket
 import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from datetime import datetime
 
-import mozinfo
-import progressbar as pb
-import redo
 import requests
 from urllib.parse import quote, urlparse
 
 from mozdownload import errors
-from mozdownload import treeherder
-from mozdownload.parser import DirectoryParser
-from mozdownload.utils import urljoin
+from mozdownload.parser import DirectoryParser, ListingCache, get_request_coalescer
+from mozdownload.retry import (
+    FAILURE_EXCEPTIONS,
+    FAILURE_STATUS_CODES,
+    RetryPolicy,
+    failed_url,
+    record_response,
+)
+from mozdownload.session import (DEFAULT_POOL_MAXSIZE, create_adapter, create_session,
+                                 derive_session)
+from mozdownload.utils import hash_file, parse_checksums, urljoin
 
 APPLICATIONS = ('devedition', 'firefox', 'fenix', 'thunderbird')
 
@@ -61,8 +75,31 @@ BASE_URL = 'https://archive.mozilla.org/pub/'
 # Chunk size when downloading a file
 CHUNK_SIZE = 16 * 1024
 
+# Upper limit for the chunk size, which grows with the measured throughput
+MAX_CHUNK_SIZE = 1024 * 1024
+
+# Targeted time (in seconds) to receive a single chunk
+CHUNK_INTERVAL = 0.1
+
 DEFAULT_BRANCH = 'mozilla-central'
 
+# Amount of time (in seconds) to wait for another process downloading the same file
+DEFAULT_LOCK_TIMEOUT = 1800.
+
+# Amount of time (in seconds) to wait for a connection to the server
+DEFAULT_CONNECT_TIMEOUT = 10.
+
+# Amount of time (in seconds) to wait for the server to send any data
+DEFAULT_READ_TIMEOUT = 60.
+
+# A connection counts as stalled if it receives less than DEFAULT_STALL_SPEED
+# bytes per second for DEFAULT_STALL_TIME seconds
+DEFAULT_STALL_SPEED = 1024
+DEFAULT_STALL_TIME = 60.
+
+# Maximum number of build folders which are probed at the same time
+MAX_PROBE_WORKERS = 8
+
 DEFAULT_FILE_EXTENSIONS = {'android-arm64-v8a': 'apk',
                            'android-armeabi-v7a': 'apk',
                            'android-x86': 'apk',
@@ -89,6 +126,10 @@ PLATFORM_FRAGMENTS = {'android-arm64-v8a': r'android-arm64-v8a',
                       'win32': r'win32',
                       'win64': r'win64(-x86_64)?'}
 
+# Checksums of published builds never change, so they are shared by all scrapers
+_checksums_cache = {}
+_checksums_lock = threading.Lock()
+
 # Special versions for release and candidate builds
 RELEASE_AND_CANDIDATE_LATEST_VERSIONS = {
     'latest': r'^\d+(\.\d+)+(-candidates)?$',
@@ -113,20 +154,71 @@ def latest_version_filter(version, application):
     return RELEASE_AND_CANDIDATE_LATEST_VERSIONS[version]
 
 
+class ResolvedBuild(namedtuple('ResolvedBuild', ['url', 'binary', 'path', 'filename'])):
+    """Immutable record of a build located on the server.
+
+    :param url: URL of the build.
+    :param binary: File name of the build on the server (None for direct URLs).
+    :param path: URL of the folder which contains the build (None for direct URLs).
+    :param filename: Absolute path of the local file to download the build to.
+    """
+
+    __slots__ = ()
+
+
 class Scraper(object):
     """Generic class to download a Gecko based application."""
 
+    # Whether to show a progress bar while downloading with log level INFO
+    show_progress = True
+
+    # Attributes which get_build_info() replaces with the values of the found
+    # build, and which are restored before the build info is retrieved again
+    build_info_attributes = ()
+
     def __init__(self, destination=None, platform=None,
                  application='firefox', locale=None, extension=None,
                  username=None, password=None,
                  retry_attempts=0, retry_delay=10.,
                  is_stub_installer=False, timeout=None,
                  logger=None,
-                 base_url=BASE_URL):
-        """Create an instance of the generic scraper."""
+                 base_url=BASE_URL,
+                 connections=1,
+                 verify_checksums=False,
+                 cache_dir=None,
+                 cache_size=None,
+                 lock_timeout=DEFAULT_LOCK_TIMEOUT,
+                 session=None,
+                 adapter=None,
+                 listing_cache=None,
+                 metrics=None,
+                 retry_policy=None,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT,
+                 stall_speed=DEFAULT_STALL_SPEED,
+                 stall_time=DEFAULT_STALL_TIME,
+                 extract_dir=None,
+                 keep_archive=False,
+                 limit_rate=None,
+                 limit_burst=None,
+                 limit_rate_file=None,
+                 rate_limiter=None,
+                 lazy=False):
+        """Create an instance of the generic scraper.
+
+        Unless lazy is set, the build information gets retrieved from the
+        server right away. Otherwise only the arguments are validated, and the
+        server is not accessed before the build gets resolved.
+        """
         # Private properties for caching
-        self._filename = None
-        self._binary = None
+        self._prepared = False
+        self._resolved = None
+        self._build_info_args = None
+        self._resolve_lock = threading.RLock()
+
+        # The timeout covers the resolution of the build as well as the download
+        self.timeout_download = timeout
+        self._deadline = None
 
         self.logger = logger or logging.getLogger(self.__module__)
 
@@ -142,18 +234,79 @@ class Scraper(object):
 
         self.platform = platform or self.detect_platform()
 
-        self.session = requests.Session()
+        # Make sure each connection of a segmented download gets its own
+        # pooled connection instead of waiting for a free one. Otherwise the
+        # connections are shared with all other scrapers of the process, or
+        # with the given session or adapter.
+        self.connections = max(1, connections or 1)
+        self._adapter = None
+        if session is None and adapter is None and self.connections > DEFAULT_POOL_MAXSIZE:
+            adapter = self._adapter = create_adapter(pool_maxsize=self.connections)
+
+        # Credentials and hooks are set on a session of the scraper, which
+        # shares the connections of a given session without modifying it
+        self.session = derive_session(session) if session else create_session(adapter)
         if (username, password) != (None, None):
             self.session.auth = (username, password)
 
+        self.listing_cache = listing_cache
+
+        self.metrics = metrics
+        if self.metrics:
+            self.metrics.attach(self.session)
+
         self.retry_attempts = retry_attempts
         self.retry_delay = retry_delay
+        self.retry_policy = retry_policy or RetryPolicy(attempts=retry_attempts + 1,
+                                                        delay=retry_delay,
+                                                        logger=self.logger)
+        if self.retry_policy.circuit_breaker and \
+                record_response not in self.session.hooks['response']:
+            self.session.hooks['response'].append(record_response)
+
+        self.verify_checksums = verify_checksums
+        self.lock_timeout = lock_timeout
+
+        self.cache = None
+        if cache_dir:
+            from mozdownload.cache import BuildCache
+            self.cache = BuildCache(cache_dir, max_size=cache_size)
+
+            # Persist directory listings next to the builds
+            if self.listing_cache is None:
+                self.listing_cache = ListingCache(self.cache.listings_path)
+
         self.is_stub_installer = is_stub_installer
-        self.timeout_download = timeout
         # this is the timeout used in requests.get. Unlike "auth",
         # it does not work if we attach it on the session, so we handle
         # it independently.
-        self.timeout_network = 60.
+        self.timeout_network = (connect_timeout, read_timeout)
+        self.stall_speed = stall_speed
+        self.stall_time = stall_time
+
+        # Amount of bytes received from the server by the last download
+        self.bytes_received = 0
+
+        # Extract the build into the folder, and only keep the archive if asked for
+        self.extract_dir = os.path.abspath(extract_dir) if extract_dir else None
+        self.keep_archive = keep_archive or not extract_dir
+
+        # All downloads of the process with the same limits share the bandwidth
+        self.rate_limiter = rate_limiter
+        if self.rate_limiter is None and limit_rate:
+            from mozdownload.ratelimit import get_rate_limiter
+            self.rate_limiter = get_rate_limiter(limit_rate, burst=limit_burst,
+                                                 path=limit_rate_file)
+
+        # Multiple base URLs are mirrors of the same archive, whereby requests
+        # get routed to the fastest healthy one
+        self.mirrors = None
+        if not isinstance(base_url, str):
+            base_urls = list(base_url)
+            if len(base_urls) > 1:
+                from mozdownload.mirrors import MirrorSet
+                self.mirrors = MirrorSet(base_urls, session=self.session, logger=self.logger)
+            base_url = base_urls[0]
 
         # build the base URL
         self.application = application
@@ -169,13 +322,90 @@ class Scraper(object):
             else:
                 self.extension = DEFAULT_FILE_EXTENSIONS[self.platform]
 
-        self._retry_check_404(self.get_build_info)
+        if not lazy:
+            self.prepare()
+
+    def prepare(self):
+        """Probe the mirrors and retrieve the build information once.
+
+        It is called by the constructor, or on the first resolution of a
+        lazy scraper.
+        """
+        with self._resolve_lock:
+            if self._prepared:
+                return
 
-    def _retry(self, func, **retry_kwargs):
-        retry_kwargs.setdefault('jitter', 0)
-        retry_kwargs.setdefault('sleeptime', self.retry_delay)
-        retry_kwargs.setdefault('attempts', self.retry_attempts + 1)
-        return redo.retry(func, **retry_kwargs)
+            if self._deadline is None and self.timeout_download:
+                self._deadline = time.monotonic() + self.timeout_download
+
+            if self.mirrors:
+                with self._phase('probe_mirrors'):
+                    self.mirrors.probe()
+                self.base_url = '%s/' % urljoin(self.mirrors.best, self.application)
+
+            if self._build_info_args is None:
+                self._build_info_args = {name: getattr(self, name)
+                                         for name in self.build_info_attributes}
+            else:
+                for name, value in self._build_info_args.items():
+                    setattr(self, name, value)
+
+            with self._phase('get_build_info'):
+                self._retry_check_404(self.get_build_info)
+            self._prepared = True
+
+    def _retry(self, func, retry_exceptions=(Exception,), url=None):
+        def _attempt():
+            # Failures of a mirror are retried on the others right away
+            failovers = len(self.mirrors.mirrors) - 1 if self.mirrors else 0
+            while True:
+                self._check_deadline()
+                try:
+                    return func()
+                except Exception as exc:
+                    if not (self.mirrors and self._is_mirror_failure(exc)):
+                        raise
+                    self.mirrors.mark_failed(failed_url(exc) or '')
+                    if not failovers:
+                        raise
+                    failovers -= 1
+
+        target = url or self.base_url
+        return self.retry_policy.retry(_attempt, retry_exceptions=retry_exceptions,
+                                       url=lambda: self._mirror_url(target),
+                                       deadline=self._deadline)
+
+    def _is_mirror_failure(self, exc):
+        """Return whether the exception indicates a failure of the server."""
+        if isinstance(exc, requests.exceptions.HTTPError):
+            return exc.response is not None and \
+                exc.response.status_code in FAILURE_STATUS_CODES
+
+        return isinstance(exc, FAILURE_EXCEPTIONS + (errors.ChecksumError,
+                                                     errors.IncompleteDownloadError,
+                                                     errors.StallError))
+
+    def _mirror_url(self, url):
+        """Return the URL on the preferred mirror, if mirrors are in use."""
+        return self.mirrors.translate(url) if self.mirrors else url
+
+    def _check_deadline(self):
+        """Raise a TimeoutError if the allocated time has been exceeded."""
+        if self._deadline is not None and time.monotonic() >= self._deadline:
+            raise errors.TimeoutError
+
+    def _network_timeout(self):
+        """Return the connect and read timeouts for a request.
+
+        Both are limited by the remaining time until the deadline.
+        """
+        if self._deadline is None:
+            return self.timeout_network
+
+        self._check_deadline()
+        remaining = self._deadline - time.monotonic()
+        return tuple(min(timeout, remaining) if timeout else remaining
+                     for timeout in self.timeout_network)
 
     def _retry_check_404(self, func,
                          err_message="Specified build has not been found",
@@ -191,37 +421,82 @@ class Scraper(object):
             else:
                 raise
 
-    def _create_directory_parser(self, url):
-        return DirectoryParser(url,
-                               session=self.session,
-                               timeout=self.timeout_network)
+    def _phase(self, name):
+        """Return a context manager which records the named phase in the metrics."""
+        return self.metrics.phase(name) if self.metrics else nullcontext()
 
-    @property
-    def binary(self):
-        """Return the name of the build."""
+    def _create_directory_parser(self, url, lazy=False):
+        return DirectoryParser(self._mirror_url(url),
+                               session=self.session,
+                               timeout=self._network_timeout(),
+                               cache=self.listing_cache,
+                               lazy=lazy,
+                               coalescer=get_request_coalescer())
+
+    def resolve(self):
+        """Resolve the build once, and return it as ResolvedBuild.
+
+        Further calls return the same result until invalidate() gets called.
+        """
+        with self._resolve_lock:
+            self.prepare()
+            if self._resolved is None:
+                with self._phase('resolve'):
+                    self._resolved = self._resolve()
+
+            return self._resolved
+
+    def invalidate(self):
+        """Forget the build information and the resolved build.
+
+        Both get retrieved again on the next resolution, so that a newer
+        build is picked up before retrying.
+        """
+        with self._resolve_lock:
+            self._prepared = False
+            self._resolved = None
+
+    def _resolve(self):
+        """Return the ResolvedBuild of the build located on the server."""
+        path = self.path
+        binary = [None]
 
         def _get_binary():
-            # Retrieve all entries from the remote virtual folder
-            parser = self._create_directory_parser(self.path)
-            if not parser.entries:
-                raise errors.NotFoundError('No entries found', self.path)
-
-            # Download the first matched directory entry
+            # Parse the entries of the remote virtual folder until the first
+            # matching directory entry has been found
+            parser = self._create_directory_parser(path, lazy=True)
             pattern = re.compile(self.binary_regex, re.IGNORECASE)
-            for entry in parser.entries:
-                try:
-                    self._binary = pattern.match(entry).group()
-                    break
-                except Exception:
-                    # No match, continue with next entry
-                    continue
+            for entry in parser.iter_entries(pattern.match):
+                binary[0] = pattern.match(entry).group()
+                break
             else:
-                raise errors.NotFoundError("Binary not found in folder",
-                                           self.path)
+                if not parser.entries:
+                    raise errors.NotFoundError('No entries found', path)
+                raise errors.NotFoundError("Binary not found in folder", path)
 
         self._retry_check_404(_get_binary)
 
-        return self._binary
+        return ResolvedBuild(url=quote(urljoin(path, binary[0]),
+                                       safe='%/:=&?~#+!$,;\'@()*[]|'),
+                             binary=binary[0],
+                             path=path,
+                             filename=self._target_file(self.build_filename(binary[0])))
+
+    def _target_file(self, build_filename):
+        """Return the absolute path of the local file for the given name."""
+        if os.path.splitext(self.destination)[1]:
+            # If the filename has been given make use of it
+            target_file = self.destination
+        else:
+            # Otherwise create it from the build details
+            target_file = os.path.join(self.destination, build_filename)
+
+        return os.path.abspath(target_file)
+
+    @property
+    def binary(self):
+        """Return the name of the build."""
+        return self.resolve().binary
 
     @property
     def binary_regex(self):
@@ -231,14 +506,18 @@ class Scraper(object):
     @property
     def url(self):
         """Return the URL of the build."""
-        return quote(urljoin(self.path, self.binary),
-                     safe='%/:=&?~#+!$,;\'@()*[]|')
+        return self.resolve().url
 
     @property
     def path(self):
         """Return the path to the build folder."""
         return urljoin(self.base_url, self.path_regex)
 
+    @property
+    def checksums_url(self):
+        """Return the URL of the file with the checksums of the build, if any."""
+        return None
+
     @property
     def extension_regex(self):
         extension = self.extension
@@ -262,29 +541,53 @@ class Scraper(object):
     @property
     def filename(self):
         """Return the local filename of the build."""
-        if self._filename is None:
-            if os.path.splitext(self.destination)[1]:
-                # If the filename has been given make use of it
-                target_file = self.destination
-            else:
-                # Otherwise create it from the build details
-                target_file = os.path.join(self.destination,
-                                           self.build_filename(self.binary))
-
-            self._filename = os.path.abspath(target_file)
-
-        return self._filename
+        return self.resolve().filename
 
     def get_build_info(self):
         """Return additional build information in subclasses if necessary."""
         pass
 
+    def get_checksum(self):
+        """Return the published SHA512 checksum of the build, or None if unknown."""
+        checksums_url = self.checksums_url
+        if not checksums_url:
+            return None
+
+        with _checksums_lock:
+            checksums = _checksums_cache.get(checksums_url)
+
+        if checksums is None:
+            self.logger.info('Retrieving checksums from %s' % checksums_url)
+            r = self.session.get(self._mirror_url(checksums_url),
+                                 timeout=self._network_timeout())
+            try:
+                if r.status_code == 404:
+                    checksums = {}
+                else:
+                    r.raise_for_status()
+                    checksums = parse_checksums(r.text)
+            finally:
+                r.close()
+
+            with _checksums_lock:
+                _checksums_cache[checksums_url] = checksums
+
+        # Entries are relative to the folder of the checksums file
+        name = urljoin(self.path, self.binary)[len(checksums_url.rsplit('/', 1)[0]) + 1:]
+        checksum = checksums.get(name)
+        if not checksum:
+            self.logger.warning('No checksum has been published for %s' % name)
+
+        return checksum
+
     def build_filename(self, binary):
         """Return the proposed filename with extension for the binary."""
         raise errors.NotImplementedError(sys._getframe(0).f_code.co_name)
 
     def detect_platform(self):
         """Detect the current platform."""
+        import mozinfo
+
         # For Mac and Linux 32bit we do not need the bits appended
         if mozinfo.os == 'mac' or \
                 (mozinfo.os == 'linux' and mozinfo.bits == 32):
@@ -293,87 +596,504 @@ class Scraper(object):
             return "%s%d" % (mozinfo.os, mozinfo.bits)
 
     def download(self):
-        """Download the specified file."""
+        """Download the specified file.
 
-        def total_seconds(td):
-            # Keep backward compatibility with Python 2.6 which doesn't have
-            # this method
-            if hasattr(td, 'total_seconds'):
-                return td.total_seconds()
-            else:
-                return (td.microseconds +
-                        (td.seconds + td.days * 24 * 3600) * 10 ** 6) / 10 ** 6
+        :returns: Path of the downloaded file, or of the folder it has been
+            extracted to.
+        """
+        try:
+            # Don't re-download the file
+            if os.path.isfile(os.path.abspath(self.filename)):
+                self.logger.info("File has already been downloaded: %s" %
+                                 (self.filename))
+                return self._extract_downloaded_file()
+
+            directory = os.path.dirname(self.filename)
+            os.makedirs(directory, exist_ok=True)
+
+            # Only a single process at a time downloads the file, while all the
+            # others wait for it to finish.
+            from mozdownload.lock import FileLock
+            with FileLock(self.filename + '.lock', timeout=self.lock_timeout, logger=self.logger):
+                if os.path.isfile(self.filename):
+                    self.logger.info("File has been downloaded by another process: %s" %
+                                     (self.filename))
+                    return self._extract_downloaded_file()
+
+                try:
+                    return self._download_file()
+                except errors.NotFoundError:
+                    # The build might have been replaced on the server, so let a
+                    # further attempt locate it again.
+                    self.invalidate()
+                    raise
+        finally:
+            # The connections of a dedicated pool are not needed anymore
+            if self._adapter:
+                self._adapter.close()
+
+    def _archive_compression(self):
+        """Return the compression of the build to extract, as known by mozdownload.extract."""
+        from mozdownload.extract import archive_format
+
+        # The local file name might have been given without the extension
+        compression = archive_format(urlparse(self.url).path) or archive_format(self.filename)
+        if not compression:
+            raise errors.NotSupportedError('Only tar and zip archives can be extracted: %s' %
+                                           self.url)
 
-        # Don't re-download the file
-        if os.path.isfile(os.path.abspath(self.filename)):
-            self.logger.info("File has already been downloaded: %s" %
-                             (self.filename))
+        return compression
+
+    def _extract_downloaded_file(self):
+        """Extract the already downloaded file if requested, and return the resulting path."""
+        if not self.extract_dir:
             return self.filename
 
-        directory = os.path.dirname(self.filename)
-        if not os.path.isdir(directory):
-            os.makedirs(directory)
+        from mozdownload.extract import extract_file
+
+        self.logger.info('Extracting to: %s' % self.extract_dir)
+        with self._phase('extract'):
+            extract_file(self.filename, self.extract_dir, self._archive_compression())
 
+        return self.extract_dir
+
+    def _download_file(self):
+        """Download the file into a partial file, and rename it when complete.
+
+        If the build has to be extracted, tar archives get extracted while they
+        are received, and zip archives once the download has been completed.
+        """
         self.logger.info('Downloading from: %s' % self.url)
-        self.logger.info('Saving as: %s' % self.filename)
+        if self.keep_archive:
+            self.logger.info('Saving as: %s' % self.filename)
+        if self.extract_dir:
+            self.logger.info('Extracting to: %s' % self.extract_dir)
 
         tmp_file = self.filename + ".part"
+        state_file = tmp_file + ".json"
+        url = self.url
+        self.bytes_received = 0
+
+        cache_key = None
+        compression = self._archive_compression() if self.extract_dir else None
+        extracted = False
+        checksum = None
+        if self.verify_checksums:
+            with self._phase('checksums'):
+                checksum = self._retry(self.get_checksum,
+                                       retry_exceptions=(requests.exceptions.RequestException,),
+                                       url=url)
 
         def _download():
+            nonlocal cache_key, extracted
+
+            extracted = False
+            extractor = None
+            state = self._read_download_state(tmp_file, state_file, url)
+            request_url = self._mirror_url(url)
+            if request_url != url:
+                self.logger.info('Downloading from mirror: %s' % request_url)
+            segments = []
+            total_size = None
+            resumable = False
+
             try:
-                start_time = datetime.now()
+                headers = {}
+                if state:
+                    self.logger.info('Resuming download at byte %s' % state['segments'][0][0])
+                    headers['Range'] = 'bytes=%s-%s' % (state['segments'][0][0],
+                                                        state['segments'][0][1] or '')
+                    headers['If-Range'] = state['etag'] or state['last_modified']
+                elif self.connections > 1:
+                    # Ask for the whole file as byte range to detect if the server
+                    # supports segmented downloads.
+                    headers['Range'] = 'bytes=0-'
 
                 # Enable streaming mode so we can download content in chunks
-                r = self.session.get(self.url, stream=True)
+                r = self.session.get(request_url, headers=headers, stream=True,
+                                     timeout=self._network_timeout())
                 r.raise_for_status()
 
+                if state and not (r.status_code == 206 and
+                                  self._match_validators(state, r.headers)):
+                    self.logger.info('Remote file has been modified, restarting download')
+                    state = None
+                    os.remove(tmp_file)
+
+                    # A server which honors If-Range already sends the whole
+                    # file, otherwise it has to be requested again
+                    if r.status_code != 200:
+                        r.close()
+                        headers = {'Range': 'bytes=0-'} if self.connections > 1 else {}
+                        r = self.session.get(request_url, headers=headers, stream=True,
+                                             timeout=self._network_timeout())
+                        r.raise_for_status()
+
+                validators = state or {'etag': r.headers.get('ETag'),
+                                       'last_modified': r.headers.get('Last-Modified')}
+                accepts_ranges = r.status_code == 206 or \
+                    r.headers.get('Accept-Ranges', '').lower() == 'bytes'
+                resumable = accepts_ranges and \
+                    bool(validators['etag'] or validators['last_modified'])
+
+                total_size = None
                 content_length = r.headers.get('Content-length')
-                # ValueError: Value out of range if only total_size given
-                if content_length:
+                content_range = r.headers.get('Content-Range', '')
+                if state:
+                    total_size = state['total_size']
+                elif r.status_code == 206 and not content_range.endswith('/*'):
+                    total_size = int(content_range.rsplit('/', 1)[-1])
+                elif content_length:
                     total_size = int(content_length.strip())
+
+                if self.cache:
+                    cache_key = self.cache.key(url, validators['etag'],
+                                               validators['last_modified'], total_size)
+                    method = not state and cache_key and \
+                        self.cache.materialize(cache_key, tmp_file)
+                    if method:
+                        r.close()
+                        self.logger.info('Retrieved build from cache via %s' % method)
+
+                        if checksum and \
+                                hash_file(tmp_file, hashlib.sha512()).hexdigest() != checksum:
+                            self.cache.discard(cache_key)
+                            raise errors.ChecksumError('Checksum of the cached file does '
+                                                       'not match', url)
+                        return
+
+                if state:
+                    segments = state['segments']
+                elif self.connections > 1 and total_size and accepts_ranges:
+                    segment_size = -(-total_size // self.connections)
+                    segments = [[first, min(first + segment_size, total_size) - 1]
+                                for first in range(0, total_size, segment_size)]
+                else:
+                    if self.connections > 1:
+                        self.logger.info('Server does not support byte ranges, '
+                                         'falling back to a single connection')
+                    segments = [[0, total_size - 1 if total_size else None]]
+
+                # ValueError: Value out of range if only total_size given
+                if total_size:
                     max_value = ((total_size / CHUNK_SIZE) + 1) * CHUNK_SIZE
 
-                bytes_downloaded = 0
+                bytes_downloaded = (total_size or 0) - sum(last - first + 1
+                                                           for first, last in segments
+                                                           if last is not None)
 
-                log_level = self.logger.getEffectiveLevel()
-                if log_level <= logging.INFO and content_length:
+                show_progress = self.show_progress and total_size and \
+                    self.logger.getEffectiveLevel() <= logging.INFO
+                if show_progress:
+                    import progressbar as pb
                     widgets = [pb.Percentage(), ' ', pb.Bar(), ' ', pb.ETA(),
                                ' ', pb.FileTransferSpeed()]
                     pbar = pb.ProgressBar(widgets=widgets,
                                           maxval=max_value).start()
 
-                with open(tmp_file, 'wb') as f:
-                    for chunk in r.iter_content(CHUNK_SIZE):
-                        f.write(chunk)
-                        bytes_downloaded += CHUNK_SIZE
+                lock = threading.Lock()
 
-                        if log_level <= logging.INFO and content_length:
-                            pbar.update(bytes_downloaded)
+                def _update(chunk_size):
+                    nonlocal bytes_downloaded
+
+                    with lock:
+                        bytes_downloaded += chunk_size
+                        self.bytes_received += chunk_size
 
-                        t1 = total_seconds(datetime.now() - start_time)
-                        if self.timeout_download and \
-                                t1 >= self.timeout_download:
-                            raise errors.TimeoutError
+                        if show_progress:
+                            pbar.update(bytes_downloaded)
 
-                if log_level <= logging.INFO and content_length:
+                    self._check_deadline()
+
+                if not state:
+                    # Allocate the full file so each segment can be written at its offset
+                    with open(tmp_file, 'wb') as f:
+                        if len(segments) > 1:
+                            f.truncate(total_size)
+
+                # The checksum can only be computed while writing if the file
+                # is received in order. For a resumed download the bytes already
+                # on disk have to be hashed first.
+                hasher = None
+                if checksum and len(segments) == 1 and \
+                        segments[0][1] in (None, total_size - 1 if total_size else None):
+                    hasher = hashlib.sha512()
+                    if state:
+                        hash_file(tmp_file, hasher, size=segments[0][0])
+
+                # Tar archives can be extracted while they are received in order
+                if compression and compression != 'zip' and not state and len(segments) == 1:
+                    from mozdownload.extract import StreamExtractor
+                    extractor = StreamExtractor(self.extract_dir, compression)
+
+                if len(segments) == 1:
+                    # The response already streams the one and only segment
+                    self._write_segment(r, request_url, tmp_file, segments[0], _update, hasher,
+                                        extractor)
+                    if extractor:
+                        extractor.close()
+                        extractor = None
+                        extracted = True
+                else:
+                    # The initial stream is only used to detect range support
+                    r.close()
+                    self._download_segments(request_url, tmp_file, segments, validators, _update)
+
+                if checksum:
+                    if hasher is None:
+                        hasher = hash_file(tmp_file, hashlib.sha512())
+                    if hasher.hexdigest() != checksum:
+                        raise errors.ChecksumError('Checksum of the downloaded file does '
+                                                   'not match', request_url)
+
+                if show_progress:
                     pbar.finish()
 
             except Exception as ex:
-                if os.path.isfile(tmp_file):
-                    os.remove(tmp_file)
-                if type(ex) is requests.exceptions.HTTPError and \
-                        ex.response.status_code == 404:
-                    raise errors.NotFoundError("The requested url was not found", self.url)
+                extracted = False
+                if extractor:
+                    extractor.abort()
+
+                is_404 = type(ex) is requests.exceptions.HTTPError and \
+                    ex.response.status_code == 404
+
+                if resumable and not is_404 and os.path.isfile(tmp_file) and \
+                        not isinstance(ex, errors.ChecksumError):
+                    # Keep the partial file so a retry only fetches the missing bytes
+                    self._write_download_state(state_file, url, total_size, validators,
+                                               segments)
+                else:
+                    for path in (tmp_file, state_file):
+                        if os.path.isfile(path):
+                            os.remove(path)
+
+                if is_404:
+                    raise errors.NotFoundError("The requested url was not found", request_url)
                 else:
                     raise
 
-        self._retry(_download,
-                    retry_exceptions=(errors.NotFoundError,
-                                      errors.TimeoutError))
+        with self._phase('download'):
+            self._retry(_download,
+                        retry_exceptions=(errors.ChecksumError,
+                                          errors.IncompleteDownloadError,
+                                          errors.NotFoundError,
+                                          errors.StallError,
+                                          requests.exceptions.ChunkedEncodingError,
+                                          requests.exceptions.ConnectionError,
+                                          requests.exceptions.Timeout),
+                        url=url)
+
+        if compression and not extracted:
+            from mozdownload.extract import extract_file
+            with self._phase('extract'):
+                extract_file(tmp_file, self.extract_dir, compression)
+
+        with self._phase('rename'):
+            if os.path.isfile(state_file):
+                os.remove(state_file)
+
+            if not self.keep_archive:
+                if cache_key:
+                    self.cache.store(cache_key, tmp_file, url=url)
+                os.remove(tmp_file)
+                return self.extract_dir
+
+            os.rename(tmp_file, self.filename)
+
+        if cache_key:
+            self.cache.store(cache_key, self.filename, url=url)
+
+        return self.extract_dir or self.filename
+
+    def _download_segments(self, url, tmp_file, segments, validators, update):
+        """Download the given byte ranges concurrently into the partial file.
+
+        :param url: URL of the file to download.
+        :param tmp_file: Path of the file to write the ranges into.
+        :param segments: List of [first, last] byte ranges still to download.
+        :param validators: Dict with the ETag and Last-Modified values of the file.
+        :param update: Callback for the amount of bytes received per chunk.
+        """
+        self.logger.debug('Downloading %s segments with %s connections' %
+                          (len(segments), self.connections))
+
+        def _download_segment(segment):
+            headers = {'Range': 'bytes=%s-%s' % (segment[0], segment[1]),
+                       'If-Range': validators['etag'] or validators['last_modified']}
+            if not headers['If-Range']:
+                del headers['If-Range']
+
+            r = self.session.get(url, headers=headers, stream=True,
+                                 timeout=self._network_timeout())
+            try:
+                r.raise_for_status()
+                if r.status_code != 206 or not self._match_validators(validators, r.headers):
+                    raise errors.IncompleteDownloadError(
+                        'Server did not respond with the requested byte range', url)
 
-        os.rename(tmp_file, self.filename)
+                self._write_segment(r, url, tmp_file, segment, update)
+            finally:
+                r.close()
+
+        with ThreadPoolExecutor(max_workers=self.connections) as executor:
+            futures = [executor.submit(_download_segment, segment) for segment in segments]
+            try:
+                for future in futures:
+                    future.result()
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+
+    def _write_segment(self, r, url, tmp_file, segment, update, hasher=None, extractor=None):
+        """Write the response body into the partial file at the offset of the segment.
+
+        The first byte of the segment gets advanced while the data is written, so
+        that it always reflects the next byte to download. If less than
+        stall_speed bytes per second are received for stall_time seconds, the
+        download is aborted with a StallError. Time spent waiting for the rate
+        limiter does not count as stalled.
+
+        :param r: Response of the request for the segment.
+        :param url: URL of the file to download.
+        :param tmp_file: Path of the partial file.
+        :param segment: [first, last] byte range to write, last may be None if the
+            size of the file is unknown.
+        :param update: Callback for the amount of bytes received per chunk.
+        :param hasher: Optional hash object to update with the written data.
+        :param extractor: Optional StreamExtractor to pass the written data to.
+        """
+        first_byte = segment[0]
+        stall_start = time.monotonic()
+        stall_bytes = 0
+        max_chunk_size = MAX_CHUNK_SIZE
+        if self.rate_limiter:
+            # Keep the chunks small enough to shape the throughput smoothly
+            max_chunk_size = min(MAX_CHUNK_SIZE, max(CHUNK_SIZE, int(
+                self.rate_limiter.rate * CHUNK_INTERVAL)))
+        with open(tmp_file, 'r+b') as f:
+            f.seek(segment[0])
+            for chunk in self._read_chunks(r, max_chunk_size):
+                if segment[1] is not None and segment[0] + len(chunk) > segment[1] + 1:
+                    raise errors.IncompleteDownloadError(
+                        'Server sent more data than the requested byte range', url)
+                f.write(chunk)
+                if hasher:
+                    hasher.update(chunk)
+                if extractor:
+                    extractor.update(chunk)
+                segment[0] += len(chunk)
+                update(len(chunk))
+
+                if self.rate_limiter:
+                    stall_start += self.rate_limiter.consume(len(chunk))
+
+                if self.stall_speed:
+                    stall_bytes += len(chunk)
+                    elapsed = time.monotonic() - stall_start
+                    if elapsed >= self.stall_time:
+                        if stall_bytes < self.stall_speed * elapsed:
+                            raise errors.StallError(
+                                'Received less than %s bytes per second for %.0f seconds' %
+                                (self.stall_speed, elapsed), url)
+                        stall_start = time.monotonic()
+                        stall_bytes = 0
+
+        if self.metrics:
+            self.metrics.count_bytes(r, segment[0] - first_byte)
+
+        if segment[1] is None:
+            segment[1] = segment[0] - 1
+        elif segment[0] != segment[1] + 1:
+            raise errors.IncompleteDownloadError(
+                'Byte range ending at %s has not been fully received' % segment[1], url)
+
+    def _read_chunks(self, r, max_chunk_size=MAX_CHUNK_SIZE):
+        """Generate the chunks of the response body.
+
+        To avoid an allocation per chunk the body is read into a reusable buffer,
+        and each chunk is a view into it. So a chunk is only valid until the
+        next one has been requested. The chunk size adapts to the throughput, so
+        that receiving a chunk takes about CHUNK_INTERVAL seconds.
+
+        :param r: Response opened in streaming mode.
+        :param max_chunk_size: Maximum size of a chunk.
+        """
+        fp = getattr(r.raw, '_fp', None)
+        if r.headers.get('Content-Encoding', 'identity') != 'identity' or \
+                not hasattr(fp, 'readinto'):
+            # The content has to be decoded, which is done by urllib3
+            for chunk in r.iter_content(CHUNK_SIZE):
+                yield chunk
+            return
+
+        view = memoryview(bytearray(max_chunk_size))
+        chunk_size = min(CHUNK_SIZE, max_chunk_size)
+        while True:
+            start_time = time.monotonic()
+            try:
+                received = fp.readinto(view[:chunk_size])
+            except http.client.IncompleteRead as exc:
+                raise requests.exceptions.ChunkedEncodingError(exc)
+            except socket.timeout as exc:
+                raise requests.exceptions.ReadTimeout(exc, request=r.request)
+            if not received:
+                # urllib3 doesn't know that the body has been read completely,
+                # so hand the connection back to the pool for further requests
+                r.raw.release_conn()
+                break
+            elapsed = time.monotonic() - start_time
+
+            yield view[:received]
+
+            if received == chunk_size and elapsed < CHUNK_INTERVAL / 2:
+                chunk_size = min(chunk_size * 2, max_chunk_size)
+            elif elapsed > CHUNK_INTERVAL:
+                chunk_size = max(chunk_size // 2, CHUNK_SIZE)
+
+    def _match_validators(self, validators, headers):
+        """Return whether the response headers match the recorded validators."""
+        for key, header in (('etag', 'ETag'), ('last_modified', 'Last-Modified')):
+            if validators[key] and headers.get(header) not in (None, validators[key]):
+                return False
+        return True
+
+    def _read_download_state(self, tmp_file, state_file, url):
+        """Return the recorded state of a previously interrupted download.
+
+        If there is no partial file, or the state does not belong to the URL,
+        None is returned and any left-over files are removed.
+        """
+        state = None
+        try:
+            with open(state_file) as f:
+                state = json.load(f)
+            if state['url'] != url or not os.path.isfile(tmp_file) or \
+                    os.path.getsize(tmp_file) < max(first for first, last in state['segments']):
+                state = None
+        except Exception:
+            state = None
+
+        if state is None:
+            for path in (tmp_file, state_file):
+                if os.path.isfile(path):
+                    os.remove(path)
+
+        return state
+
+    def _write_download_state(self, state_file, url, total_size, validators, segments):
+        """Record the state of an interrupted download next to the partial file."""
+        state = {'url': url,
+                 'etag': validators['etag'],
+                 'last_modified': validators['last_modified'],
+                 'total_size': total_size,
+                 'segments': [segment for segment in segments
+                              if segment[1] is None or segment[0] <= segment[1]]}
+        if not state['segments']:
+            return
 
-        return self.filename
+        with open(state_file, 'w') as f:
+            json.dump(state, f)
 
     def get_file_extension(self, binary):
         extension = self.extension
@@ -395,6 +1115,8 @@ class Scraper(object):
 class DailyScraper(Scraper):
     """Class to download a daily build from the Mozilla server."""
 
+    build_info_attributes = ('branch', 'date')
+
     def __init__(self, branch=None, build_id=None, date=None,
                  build_number=None, revision=None, *args, **kwargs):
         """Create an instance of the daily scraper."""
@@ -404,6 +1126,18 @@ class DailyScraper(Scraper):
         self.build_number = build_number
         self.revision = revision
 
+        # Fail early for invalid dates, also if the build gets resolved lazily
+        if build_id:
+            datetime.strptime(build_id, '%Y%m%d%H%M%S')
+        elif date and not revision:
+            try:
+                datetime.strptime(date, '%Y-%m-%d')
+            except Exception:
+                raise ValueError('%s is not a valid date' % date)
+
+        # Results of probing folders for builds
+        self._build_dirs = {}
+
         Scraper.__init__(self, *args, **kwargs)
 
     def get_build_info(self):
@@ -413,10 +1147,16 @@ class DailyScraper(Scraper):
             self.branch = APPLICATIONS_TO_BRANCH.get(self.application, DEFAULT_BRANCH)
         # Retrieve build by revision
         if self.revision:
-            th = treeherder.Treeherder(self.application, self.branch, self.platform)
-            builds = th.query_builds_by_revision(
-                self.revision,
-                job_type_name='L10n Nightly' if self.locale_build else 'Nightly')
+            from mozdownload import treeherder
+            th = treeherder.Treeherder(self.application, self.branch, self.platform,
+                                       cache_dir=self.cache.revisions_path if self.cache else None,
+                                       adapter=self.session.get_adapter(treeherder.TREEHERDER_URL))
+            if self.metrics:
+                self.metrics.attach(th.client.session)
+            with self._phase('treeherder'):
+                builds = th.query_builds_by_revision(
+                    self.revision,
+                    job_type_name='L10n Nightly' if self.locale_build else 'Nightly')
 
             if not builds:
                 raise errors.NotFoundError('No builds have been found for revision', self.revision)
@@ -463,6 +1203,15 @@ class DailyScraper(Scraper):
         self.builds, self.build_index = self.get_build_info_for_date(
             self.date, self.build_index)
 
+    def invalidate(self):
+        """Forget the build information, the resolved build, and the probed folders.
+
+        Folders which didn't contain a build yet get probed again.
+        """
+        with self._resolve_lock:
+            Scraper.invalidate(self)
+            self._build_dirs = {}
+
     def get_latest_build_date(self):
         """Return date of latest available nightly build."""
         if self.application not in ('fenix'):
@@ -500,7 +1249,8 @@ class DailyScraper(Scraper):
         # and convert to a date
         headers = {'Cache-Control': 'max-age=0'}
 
-        r = self.session.get(url + parser.entries[-1], headers=headers)
+        r = self.session.get(self._mirror_url(url + parser.entries[-1]), headers=headers,
+                             timeout=self._network_timeout())
         try:
             r.raise_for_status()
 
@@ -513,22 +1263,37 @@ class DailyScraper(Scraper):
         # Cannot move up to base scraper due to parser.entries call in
         # get_build_info_for_date (see below)
 
+        if folder_name in self._build_dirs:
+            return self._build_dirs[folder_name]
+
         url = '%s/' % urljoin(self.base_url, self.monthly_build_list_regex, folder_name)
         if self.application in APPLICATIONS_MULTI_LOCALE \
                 and self.locale != 'multi':
             url = '%s/' % urljoin(url, self.locale)
 
-        parser = self._create_directory_parser(url)
+        parser = self._create_directory_parser(url, lazy=True)
 
         pattern = re.compile(self.binary_regex, re.IGNORECASE)
-        for entry in parser.entries:
-            try:
-                pattern.match(entry).group()
-                return True
-            except Exception:
-                # No match, continue with next entry
-                continue
-        return False
+        self._build_dirs[folder_name] = any(True for _ in parser.iter_entries(pattern.match))
+        return self._build_dirs[folder_name]
+
+    def probe_build_dirs(self, folder_names):
+        """Return the given folders which contain a build.
+
+        The folders are probed concurrently, and the results are remembered
+        for later calls of is_build_dir().
+        """
+        pending = [name for name in folder_names if name not in self._build_dirs]
+        if pending:
+            start_time = time.time()
+            with self._phase('probe_build_dirs'), \
+                    ThreadPoolExecutor(max_workers=min(len(pending), MAX_PROBE_WORKERS),
+                                       thread_name_prefix='mozdownload-probe') as executor:
+                list(executor.map(self.is_build_dir, pending))
+            self.logger.debug('Probed %s build folders in %.2fs' %
+                              (len(pending), time.time() - start_time))
+
+        return [name for name in folder_names if self._build_dirs[name]]
 
     def get_build_info_for_date(self, date, build_index=None):
         """Return the build information for a given date."""
@@ -536,7 +1301,7 @@ class DailyScraper(Scraper):
         has_time = date and date.time() and date.strftime('%H-%M-%S') != '00-00-00'
 
         self.logger.info('Retrieving list of builds from %s' % url)
-        parser = self._create_directory_parser(url)
+        parser = self._create_directory_parser(url, lazy=True)
         regex = APPLICATION_REGEX[self.application] % {
             'DATE': date.strftime('%Y-%m-%d'),
             'BRANCH': self.branch,
@@ -544,8 +1309,8 @@ class DailyScraper(Scraper):
             'L10N': '(-l10n)?' if self.locale_build else '',
             'PLATFORM': '' if self.application not in ('fenix') else '-' + self.platform
         }
-        parser.entries = parser.filter(regex)
-        parser.entries = parser.filter(self.is_build_dir)
+        parser.entries = list(parser.iter_entries(regex))
+        parser.entries = self.probe_build_dirs(parser.entries)
 
         if has_time:
             # If a time is included in the date, use it to determine the
@@ -559,16 +1324,11 @@ class DailyScraper(Scraper):
                       self.date.strftime(date_format)
             raise errors.NotFoundError(message, url)
 
-        # If no index has been given, set it to the last build of the day.
         self.show_matching_builds(parser.entries)
         # If no index has been given, set it to the last build of the day.
+        # Empty folders have already been skipped by probing the entries.
         if build_index is None:
-            # Find the most recent non-empty entry.
-            build_index = len(parser.entries)
-            for build in reversed(parser.entries):
-                build_index -= 1
-                if not build_index or self.is_build_dir(build):
-                    break
+            build_index = len(parser.entries) - 1
 
         if build_index >= len(parser.entries):
             raise errors.NotFoundError('Specified build number has not been found ', url)
@@ -618,6 +1378,14 @@ class DailyScraper(Scraper):
             'BRANCH': self.branch,
             'NAME': binary}
 
+    @property
+    def checksums_url(self):
+        """Return the URL of the file with the checksums of the build."""
+        # Checksum files are named like the binary up to the platform
+        match = re.match(r'^(.*\.%s)\.' % self.platform_regex, self.binary)
+        if match:
+            return urljoin(self.path, '%s.checksums' % match.group(1))
+
     @property
     def monthly_build_list_regex(self):
         """Return the regex for the folder containing builds of a month."""
@@ -651,30 +1419,34 @@ class DirectScraper(Scraper):
 
         Scraper.__init__(self, *args, **kwargs)
 
-    @property
-    def filename(self):
-        """File name of the downloaded file."""
-        if os.path.splitext(self.destination)[1]:
-            # If the filename has been given make use of it
-            target_file = self.destination
-        else:
-            # Otherwise determine it from the url.
-            parsed_url = urlparse(self.url)
-            source_filename = (parsed_url.path.rpartition('/')[-1] or
-                               parsed_url.hostname)
-            target_file = os.path.join(self.destination, source_filename)
+    def _retry(self, func, retry_exceptions=(Exception,), url=None):
+        # The file is not hosted on the server of the base URL
+        return Scraper._retry(self, func, retry_exceptions=retry_exceptions,
+                              url=url or self._url)
 
-        return os.path.abspath(target_file)
+    def _resolve(self):
+        """Return the ResolvedBuild of the given URL."""
+        # Determine the file name from the url
+        parsed_url = urlparse(self._url)
+        source_filename = (parsed_url.path.rpartition('/')[-1] or
+                           parsed_url.hostname)
+
+        return ResolvedBuild(url=self._url,
+                             binary=None,
+                             path=None,
+                             filename=self._target_file(source_filename))
 
     @property
-    def url(self):
-        """Location of the file to be downloaded."""
-        return self._url
+    def binary(self):
+        """The file is not located via a build folder."""
+        raise errors.NotImplementedError(sys._getframe(0).f_code.co_name)
 
 
 class ReleaseScraper(Scraper):
     """Class to download a release build of a Gecko based application."""
 
+    build_info_attributes = ('version',)
+
     def __init__(self, version, *args, **kwargs):
         """Create instance of a release scraper."""
         self.version = version
@@ -707,6 +1479,11 @@ class ReleaseScraper(Scraper):
             'VERSION': self.version,
         }
 
+    @property
+    def checksums_url(self):
+        """Return the URL of the file with the checksums of the build."""
+        return urljoin(self.base_url, 'releases', self.version, 'SHA512SUMS')
+
     @property
     def path_regex(self):
         """Return the regex for the path to the build folder."""
@@ -797,6 +1574,12 @@ class ReleaseCandidateScraper(ReleaseScraper):
         else:
             raise errors.NotFoundError('Specified build number has not been found ', url)
 
+    @property
+    def checksums_url(self):
+        """Return the URL of the file with the checksums of the build."""
+        return urljoin(self.base_url, self.candidate_build_list_regex,
+                       self.builds[self.build_index], 'SHA512SUMS')
+
     @property
     def candidate_build_list_regex(self):
         """Return the regex for the folder with the list of candidate builds."""
@@ -847,9 +1630,15 @@ class TryScraper(Scraper):
     def get_build_info(self):
         """Define additional build information."""
         # Retrieve build by revision
-        th = treeherder.Treeherder(self.application, 'try', self.platform)
-        builds = th.query_builds_by_revision(
-            self.revision, job_type_name='Build', debug_build=self.debug_build)
+        from mozdownload import treeherder
+        th = treeherder.Treeherder(self.application, 'try', self.platform,
+                                   cache_dir=self.cache.revisions_path if self.cache else None,
+                                   adapter=self.session.get_adapter(treeherder.TREEHERDER_URL))
+        if self.metrics:
+            self.metrics.attach(th.client.session)
+        with self._phase('treeherder'):
+            builds = th.query_builds_by_revision(
+                self.revision, job_type_name='Build', debug_build=self.debug_build)
 
         if not builds:
             raise errors.NotFoundError('No builds have been found for revision', self.revision)
@@ -897,6 +1686,7 @@ class TryScraper(Scraper):
 
     def detect_platform(self):
         """Detect the current platform."""
+        import mozinfo
         platform = Scraper.detect_platform(self)
 
         # On OS X we have to special case the platform detection code and
@@ -0,0 +1,509 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Module for a local HTTP server which mirrors and caches the archive on demand."""
+
+from __future__ import absolute_import, unicode_literals
+
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from mozdownload import errors
+from mozdownload.parser import DEFAULT_MAX_AGE, ListingCache
+from mozdownload.retry import FAILURE_EXCEPTIONS, RetryPolicy
+from mozdownload.scraper import BASE_URL, DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
+from mozdownload.session import create_session
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8080
+
+# Size of the chunks in which files are received from the upstream server
+CHUNK_SIZE = 1024 * 1024
+
+# Files in folders of the latest builds get replaced, all others never change
+MUTABLE_FILE_REGEX = re.compile(r'/latest[^/]*/')
+
+
+def iter_received(r):
+    """Generate the decoded content of a response as soon as parts are received.
+
+    Unlike ``iter_content()`` this doesn't wait until a whole chunk has been
+    received, so that slow transfers can be passed on to clients right away.
+    """
+    read1 = getattr(r.raw, 'read1', None)
+    if read1 is None:
+        # Older versions of urllib3 can only read complete chunks
+        for chunk in r.iter_content(CHUNK_SIZE):
+            yield chunk
+        return
+
+    while True:
+        chunk = read1(CHUNK_SIZE, decode_content=True)
+        if not chunk:
+            break
+        yield chunk
+
+
+class Transfer(object):
+    """Content of an object which is still being received from the upstream server.
+
+    The content is written to a temporary file, which readers follow while it
+    grows. Once complete, the file is moved to its final location.
+    """
+
+    def __init__(self, path):
+        """Create an instance of a transfer, and create its temporary file.
+
+        :param path: Path of the temporary file.
+        """
+        self.path = path
+        self.received = 0
+
+        self._record = None
+        self._error = None
+        self._condition = threading.Condition()
+
+        open(path, 'wb').close()
+
+    def open(self):
+        """Return the file of the content opened for reading."""
+        # The file must not be moved in between
+        with self._condition:
+            return open(self.path, 'rb')
+
+    def update(self, size):
+        """Add the given amount of bytes to the received content."""
+        with self._condition:
+            self.received += size
+            self._condition.notify_all()
+
+    def move(self, path):
+        """Move the complete content to its final location."""
+        with self._condition:
+            os.replace(self.path, path)
+            self.path = path
+
+    def finish(self, record):
+        """Mark the transfer as complete with the given record of the object."""
+        with self._condition:
+            self._record = record
+            self._condition.notify_all()
+
+    def fail(self, exc):
+        """Abort the transfer, and remove the temporary file."""
+        with self._condition:
+            self._error = exc
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self._condition.notify_all()
+
+    def wait(self, offset):
+        """Wait until more than offset bytes have been received, or the transfer ended.
+
+        Returns the amount of bytes received, and raises the failure of the transfer.
+        """
+        with self._condition:
+            while self.received <= offset and self._record is None and self._error is None:
+                self._condition.wait()
+            if self._error is not None:
+                raise self._error
+
+            return self.received
+
+    def result(self):
+        """Wait until the transfer is complete, and return the record of the object."""
+        with self._condition:
+            while self._record is None and self._error is None:
+                self._condition.wait()
+            if self._error is not None:
+                raise self._error
+
+            return self._record
+
+
+class ArchiveProxy(object):
+    """Cache of the files and directory listings of an upstream archive.
+
+    Each object gets fetched from the upstream server on first use, and is
+    served from disk afterwards. Directory listings and files of the latest
+    builds are revalidated once they are older than their max age. Concurrent
+    requests for the same object share a single upstream request. Once the
+    cache exceeds its maximum size, the least recently used objects get removed.
+    """
+
+    def __init__(self, cache_dir, upstream=BASE_URL, max_size=None, session=None,
+                 retry_policy=None, timeout=(DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT),
+                 rate_limiter=None, logger=None):
+        """Create an instance of the archive proxy.
+
+        :param cache_dir: Folder to store the cached objects in.
+        :param upstream: Base URL of the archive to mirror.
+        :param max_size: Maximum size of the cache in bytes, default: unlimited.
+        :param session: requests Session instance to use for upstream requests.
+        :param retry_policy: RetryPolicy instance for failed upstream requests.
+        :param timeout: Connect and read timeouts of upstream requests.
+        :param rate_limiter: TokenBucket instance to limit the bandwidth of upstream requests.
+        :param logger: Logger instance to use.
+        """
+        self.path = os.path.abspath(cache_dir)
+        self.upstream = upstream if upstream.endswith('/') else upstream + '/'
+        self.max_size = max_size
+        self.session = session or create_session()
+        self.retry_policy = retry_policy or RetryPolicy(attempts=3, delay=1.)
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.logger = logger or logging.getLogger(self.__module__)
+
+        # Only used for the max age of directory listings
+        self._listing_policies = ListingCache()
+
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._prune_lock = threading.Lock()
+
+    def _entry_path(self, path):
+        key = hashlib.sha256(path.encode('utf-8')).hexdigest()
+        return os.path.join(self.path, key[:2], key)
+
+    def max_age_for(self, path):
+        """Return the amount of time (in seconds) a cached object is used as is."""
+        if path.endswith('/'):
+            return self._listing_policies.max_age_for(self.upstream + path.lstrip('/'))
+        if MUTABLE_FILE_REGEX.search(path):
+            return DEFAULT_MAX_AGE
+
+        return float('inf')
+
+    def lookup(self, path):
+        """Return the record of the cached object even if outdated, or None.
+
+        A record is a dict with the ``file`` the content is stored in, the
+        ``content_type``, ``size``, the ``etag`` and ``last_modified``
+        validators, and the time it has been ``checked`` against the server.
+        """
+        entry_path = self._entry_path(path)
+        try:
+            with open(entry_path + '.json') as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if record.get('path') != path or not os.path.isfile(entry_path):
+            return None
+
+        return dict(record, file=entry_path)
+
+    def get(self, path):
+        """Return the record of the given object, and fetch it completely if necessary.
+
+        :param path: Path of the object relative to the upstream base URL.
+        """
+        record = self.request(path)
+        if 'transfer' in record:
+            record = record['transfer'].result()
+
+        return record
+
+    def request(self, path):
+        """Return the record of the given object as soon as its headers are known.
+
+        If the object is still being fetched from the upstream server, the
+        record contains the ``transfer`` to follow the content while it is
+        received. Concurrent requests for the same object share the transfer.
+
+        :param path: Path of the object relative to the upstream base URL.
+        """
+        record = self.lookup(path)
+        if record and time.time() - record['checked'] <= self.max_age_for(path):
+            self._touch(record)
+            return record
+
+        with self._lock:
+            future = self._inflight.get(path)
+            owner = future is None
+            if owner:
+                future = self._inflight[path] = Future()
+
+        if owner:
+            # The content gets received in the background, so that it is
+            # completely stored even if the client stops reading
+            threading.Thread(target=self._update, args=(path, record, future),
+                             daemon=True).start()
+
+        return future.result()
+
+    def _update(self, path, record, future):
+        """Fetch or revalidate the object, and pass the new record to the future."""
+        try:
+            try:
+                record = self.retry_policy.retry(
+                    lambda: self._fetch(path, record, future),
+                    retry_exceptions=FAILURE_EXCEPTIONS, url=self.upstream)
+            except Exception as exc:
+                if future.done() or record is None or \
+                        isinstance(exc, errors.NotFoundError):
+                    raise
+                self.logger.warning('Serving outdated %s: %s' % (path, exc))
+                self._touch(record)
+            if not future.done():
+                future.set_result(record)
+        except Exception as exc:
+            if future.done():
+                self.logger.error('Failed to fetch %s: %s' % (path, exc))
+            else:
+                future.set_exception(exc)
+        finally:
+            with self._lock:
+                del self._inflight[path]
+
+    def _fetch(self, path, record, future):
+        """Fetch the object from the upstream server, and return its new record.
+
+        Once the response headers have been received, the future gets a record
+        with the transfer of the content.
+        """
+        url = self.upstream + path.lstrip('/')
+        headers = {}
+        if record and record['etag']:
+            headers['If-None-Match'] = record['etag']
+        if record and record['last_modified']:
+            headers['If-Modified-Since'] = record['last_modified']
+
+        r = self.session.get(url, headers=headers, stream=True, timeout=self.timeout)
+        try:
+            if record and r.status_code == 304:
+                record['checked'] = time.time()
+                self._save(path, record)
+                return record
+
+            if r.status_code == 404:
+                raise errors.NotFoundError('The requested url was not found', url)
+            r.raise_for_status()
+
+            # The size is only known upfront if the content is not decoded
+            size = None
+            if r.headers.get('Content-Encoding', 'identity') == 'identity' and \
+                    r.headers.get('Content-Length', '').isdigit():
+                size = int(r.headers['Content-Length'])
+
+            record = {'file': self._entry_path(path),
+                      'content_type': r.headers.get('Content-Type') or
+                      mimetypes.guess_type(path)[0] or 'application/octet-stream',
+                      'size': size,
+                      'etag': r.headers.get('ETag'),
+                      'last_modified': r.headers.get('Last-Modified'),
+                      'checked': time.time()}
+
+            self.logger.info('Fetching %s' % url)
+            os.makedirs(os.path.dirname(record['file']), exist_ok=True)
+            tmp_path = '%s.%s.%s.content.tmp' % (record['file'], os.getpid(),
+                                                 threading.get_ident())
+            transfer = Transfer(tmp_path)
+            future.set_result(dict(record, transfer=transfer))
+
+            try:
+                # Unbuffered, so that the content is visible to readers right away
+                with open(tmp_path, 'wb', buffering=0) as f:
+                    for chunk in iter_received(r):
+                        f.write(chunk)
+                        transfer.update(len(chunk))
+                        if self.rate_limiter:
+                            self.rate_limiter.consume(len(chunk))
+
+                record['size'] = transfer.received
+                transfer.move(record['file'])
+            except Exception as exc:
+                transfer.fail(exc)
+                # The clients already received the headers, so don't retry
+                raise errors.IncompleteDownloadError(str(exc), url) from exc
+        finally:
+            r.close()
+
+        self._save(path, record)
+        if self.max_size is not None:
+            self.prune()
+        transfer.finish(record)
+
+        return record
+
+    def _save(self, path, record):
+        entry_path = self._entry_path(path)
+        tmp_path = '%s.%s.%s.tmp' % (entry_path, os.getpid(), threading.get_ident())
+        with open(tmp_path, 'w') as f:
+            json.dump(dict(record, path=path, file=None), f)
+        os.replace(tmp_path, entry_path + '.json')
+
+    def _touch(self, record):
+        # The modification time of the metadata marks the last usage
+        try:
+            os.utime(record['file'] + '.json')
+        except OSError:
+            pass
+
+    def entries(self):
+        """Return the cached objects as list of (file, size, last used) tuples."""
+        entries = []
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                if name.endswith(('.json', '.tmp')):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    entries.append((path, os.path.getsize(path),
+                                    os.path.getmtime(path + '.json')))
+                except OSError:
+                    continue
+
+        return entries
+
+    def prune(self):
+        """Remove the least recently used objects until the cache fits its maximum size."""
+        with self._prune_lock:
+            entries = sorted(self.entries(), key=lambda entry: entry[2])
+            total_size = sum(size for _, size, _ in entries)
+
+            for path, size, _ in entries:
+                if total_size <= self.max_size:
+                    break
+                # Files which are still being served stay readable until closed
+                for entry_path in (path + '.json', path):
+                    try:
+                        os.remove(entry_path)
+                    except OSError:
+                        pass
+                total_size -= size
+
+    def clear(self):
+        """Remove all cached objects."""
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class ArchiveRequestHandler(BaseHTTPRequestHandler):
+    """Serve the objects of the archive proxy, including byte ranges."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_object(head=False)
+
+    def do_HEAD(self):
+        self.send_object(head=True)
+
+    def send_object(self, head):
+        path = urlsplit(self.path).path
+        try:
+            record = self.server.proxy.request(path)
+            transfer = record.get('transfer')
+            if transfer and record['size'] is None:
+                # Without its size the content cannot be sent while received
+                record, transfer = transfer.result(), None
+            f = transfer.open() if transfer else open(record['file'], 'rb')
+        except errors.NotFoundError:
+            return self.send_error(404)
+        except Exception as exc:
+            self.server.proxy.logger.error('Failed to fetch %s: %s' % (path, exc))
+            return self.send_error(502)
+
+        with f:
+            first, last = 0, record['size'] - 1
+            byte_range = self._byte_range(record)
+            if byte_range == 'invalid':
+                self.send_response(416)
+                self.send_header('Content-Range', 'bytes */%s' % record['size'])
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            if byte_range:
+                first, last = byte_range
+                self.send_response(206)
+                self.send_header('Content-Range',
+                                 'bytes %s-%s/%s' % (first, last, record['size']))
+            else:
+                self.send_response(200)
+            self.send_header('Content-Type', record['content_type'])
+            self.send_header('Content-Length', str(last - first + 1))
+            self.send_header('Accept-Ranges', 'bytes')
+            if record['etag']:
+                self.send_header('ETag', record['etag'])
+            if record['last_modified']:
+                self.send_header('Last-Modified', record['last_modified'])
+            self.end_headers()
+
+            if head or last < first:
+                return
+            if not transfer:
+                self.connection.sendfile(f, first, last - first + 1)
+                return
+
+            try:
+                self._send_transfer(f, transfer, first, last)
+            except Exception as exc:
+                # The headers have been sent already, so the client can only
+                # detect the incomplete content
+                self.server.proxy.logger.error('Failed to send %s: %s' % (path, exc))
+                self.close_connection = True
+
+    def _send_transfer(self, f, transfer, first, last):
+        """Send the content of a transfer from first to last byte while it is received."""
+        offset = first
+        f.seek(first)
+        while offset <= last:
+            received = transfer.wait(offset)
+            if received <= offset:
+                raise IOError('Content of the transfer is shorter than announced')
+
+            end = min(received, last + 1)
+            while offset < end:
+                data = f.read(min(CHUNK_SIZE, end - offset))
+                if not data:
+                    raise IOError('Content of the transfer is missing')
+                self.wfile.write(data)
+                offset += len(data)
+
+    def _byte_range(self, record):
+        """Return the requested (first, last) byte range, None for all, or 'invalid'."""
+        match = re.match(r'bytes=(\d*)-(\d*)$', self.headers.get('Range', '').strip())
+        if not match or not any(match.groups()):
+            return None
+
+        # Only send a range of the same version of the file
+        if_range = self.headers.get('If-Range')
+        if if_range and if_range not in (record['etag'], record['last_modified']):
+            return None
+
+        size = record['size']
+        first, last = match.groups()
+        if not first:
+            first, last = max(0, size - int(last)), size - 1
+        else:
+            first, last = int(first), min(int(last) if last else size - 1, size - 1)
+        if first > last:
+            return 'invalid'
+
+        return first, last
+
+    def log_message(self, format, *args):
+        self.server.proxy.logger.debug('%s - %s' % (self.address_string(), format % args))
+
+
+def create_server(proxy, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """Return a threaded HTTP server which serves the given archive proxy."""
+    server = ThreadingHTTPServer((host, port), ArchiveRequestHandler)
+    server.daemon_threads = True
+    server.proxy = proxy
+
+    return server
@@ -0,0 +1,92 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Module for the HTTP connection pool shared by all sessions of the process."""
+
+from __future__ import absolute_import, unicode_literals
+
+import threading
+from collections import OrderedDict
+
+import requests
+
+# Number of hosts to keep a connection pool for, e.g. the archive, its
+# mirrors and Treeherder
+DEFAULT_POOL_CONNECTIONS = 16
+
+# Number of connections kept open per host, enough for the default number of
+# asynchronous scrapers
+DEFAULT_POOL_MAXSIZE = 32
+
+_default_adapter = None
+_default_adapter_lock = threading.Lock()
+
+
+def create_adapter(pool_connections=DEFAULT_POOL_CONNECTIONS,
+                   pool_maxsize=DEFAULT_POOL_MAXSIZE):
+    """Return a new transport adapter with a pool of connections per host.
+
+    The pools of an adapter can be used by multiple threads at the same time.
+    If more connections to a host are in use than the pool holds, further
+    connections get opened, and closed once they are returned.
+    """
+    return requests.adapters.HTTPAdapter(pool_connections=pool_connections,
+                                         pool_maxsize=pool_maxsize)
+
+
+def get_default_adapter():
+    """Return the transport adapter shared by all sessions of the process."""
+    global _default_adapter
+
+    with _default_adapter_lock:
+        if _default_adapter is None:
+            _default_adapter = create_adapter()
+        return _default_adapter
+
+
+def create_session(adapter=None):
+    """Return a new session which sends its requests via the given adapter.
+
+    Sessions hold per client state like credentials, cookies and hooks, and
+    are cheap to create. Connections, and thereby TLS handshakes, are reused
+    across all sessions which share an adapter.
+
+    :param adapter: Transport adapter to use, default: the adapter shared by
+        all sessions of the process.
+    """
+    adapter = adapter or get_default_adapter()
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    return session
+
+
+def derive_session(session):
+    """Return a copy of the given session which shares its transport adapters.
+
+    The copy is of the same class as the given session, so that overridden
+    methods like send() still apply. Changes to the copy, like its credentials
+    and hooks, don't affect the given session, while both share the
+    connections of its adapters.
+
+    :param session: Session to take the settings and adapters from.
+    """
+    # Keep the class and all attributes of the given session, also those of
+    # subclasses, which copy.copy() would drop for requests.Session
+    derived = session.__class__.__new__(session.__class__)
+    derived.__dict__.update(session.__dict__)
+
+    # Mutable settings must not be shared with the given session
+    derived.adapters = OrderedDict()
+    for prefix, adapter in session.adapters.items():
+        derived.mount(prefix, adapter)
+    derived.cookies = session.cookies.copy()
+    derived.headers = session.headers.copy()
+    derived.hooks = {event: list(hooks) for event, hooks in session.hooks.items()}
+    derived.params = dict(session.params)
+    derived.proxies = dict(session.proxies)
+
+    return derived
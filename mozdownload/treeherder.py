@@ -6,7 +6,12 @@
 
 from __future__ import absolute_import, unicode_literals
 
+import hashlib
+import json
 import logging
+import os
+import threading
+import time
 
 from thclient import TreeherderClient
 
@@ -23,24 +28,99 @@ PLATFORM_MAP = {
 
 TREEHERDER_URL = 'https://treeherder.mozilla.org'
 
+# Amount of time (in seconds) the option collection hash of a server is reused
+OPTION_COLLECTION_HASH_TTL = 24 * 3600.
+
+# Maximum number of jobs to retrieve the log URLs for with a single request
+JOB_LOG_URL_BATCH_SIZE = 100
+
+# Option collection hashes per server as (retrieval time, hash) tuples
+_option_collection_hashes = {}
+_option_collection_hashes_lock = threading.Lock()
+
 
 class Treeherder(object):
     """Wrapper class for TreeherderClient to ease the use of its API."""
 
-    def __init__(self, application, branch, platform, server_url=TREEHERDER_URL):
+    def __init__(self, application, branch, platform, server_url=TREEHERDER_URL,
+                 cache_dir=None, adapter=None):
         """Create a new instance of the Treeherder class.
 
         :param application: The name of the application to download.
         :param branch: Name of the branch.
         :param platform: Platform of the application.
         :param server_url: The URL of the Treeherder instance to access.
+        :param cache_dir: Folder to persist the build folders of revisions in,
+            which never change once published.
+        :param adapter: requests transport adapter to share connections with
+            other sessions.
         """
         self.logger = logging.getLogger(__name__)
 
         self.client = TreeherderClient(server_url=server_url)
+        if adapter:
+            # The client keeps its own session for the headers of the API
+            self.client.session.mount('http://', adapter)
+            self.client.session.mount('https://', adapter)
         self.application = application
         self.branch = branch
         self.platform = platform
+        self.cache_dir = cache_dir
+
+    def get_option_collection_hash(self):
+        """Return the option collection hash of the server, cached for a day."""
+        server_url = self.client.server_url
+        with _option_collection_hashes_lock:
+            retrieved, option_collection_hash = \
+                _option_collection_hashes.get(server_url, (None, None))
+        if retrieved is not None and time.time() - retrieved <= OPTION_COLLECTION_HASH_TTL:
+            return option_collection_hash
+
+        option_collection_hash = self.client.get_option_collection_hash()
+        with _option_collection_hashes_lock:
+            _option_collection_hashes[server_url] = (time.time(), option_collection_hash)
+
+        return option_collection_hash
+
+    def get_job_log_urls(self, job_ids):
+        """Return the log URLs of the given jobs, retrieved in batches."""
+        log_urls = []
+        for index in range(0, len(job_ids), JOB_LOG_URL_BATCH_SIZE):
+            log_urls.extend(self.client.get_job_log_url(
+                self.branch, job_id=job_ids[index:index + JOB_LOG_URL_BATCH_SIZE]))
+
+        return log_urls
+
+    def _cached_builds_path(self, revision, job_type_name, debug_build):
+        key = json.dumps([self.client.server_url, self.application, self.branch,
+                          self.platform, revision, job_type_name, debug_build])
+        name = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, name + '.json')
+
+    def _read_cached_builds(self, revision, job_type_name, debug_build):
+        if not self.cache_dir:
+            return None
+
+        try:
+            with open(self._cached_builds_path(revision, job_type_name, debug_build)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_cached_builds(self, revision, job_type_name, debug_build, builds):
+        if not self.cache_dir:
+            return
+
+        path = self._cached_builds_path(revision, job_type_name, debug_build)
+        tmp_path = '%s.%s.tmp' % (path, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump(builds, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            # The cache is an optimization only
+            pass
 
     def get_treeherder_platform(self, platform):
         """Return the internal Treeherder platform identifier.
@@ -60,7 +140,13 @@ class Treeherder(object):
             'Build', 'Nightly', and 'L10n Nightly'. Defaults to `Build`.
         :param debug_build: Download a debug build.
         """
+        builds = self._read_cached_builds(revision, job_type_name, debug_build)
+        if builds is not None:
+            self.logger.info('Using cached list of builds for revision: {}'.format(revision))
+            return builds
+
         builds = set()
+        complete = False
 
         try:
             self.logger.info('Querying {url} for list of builds for revision: {revision}'.format(
@@ -68,7 +154,7 @@ class Treeherder(object):
 
             # Retrieve the option hash to filter for type of build (opt, and debug for now)
             option_hash = None
-            for key, values in self.client.get_option_collection_hash().items():
+            for key, values in self.get_option_collection_hash().items():
                 for value in values:
                     if value['name'] == ('debug' if debug_build else 'opt'):
                         option_hash = key
@@ -86,17 +172,25 @@ class Treeherder(object):
             }
             kwargs.update(self.get_treeherder_platform(self.platform))
 
+            job_ids = []
             for resultset in resultsets:
                 kwargs.update({'result_set_id': resultset['id']})
                 jobs = self.client.get_jobs(self.branch, **kwargs)
-                for job in jobs:
-                    log_urls = self.client.get_job_log_url(self.branch, job_id=job['id'])
-                    for log_url in log_urls:
-                        if self.application in log_url['url']:
-                            self.logger.debug('Found build folder: {}'.format(log_url['url']))
-                            builds.update([log_url['url']])
+                job_ids.extend(job['id'] for job in jobs)
 
+            for log_url in self.get_job_log_urls(job_ids):
+                if self.application in log_url['url']:
+                    self.logger.debug('Found build folder: {}'.format(log_url['url']))
+                    builds.update([log_url['url']])
+
+            complete = True
         except Exception:
             self.logger.exception('Failure occurred when querying Treeherder for builds')
 
-        return list(builds)
+        builds = list(builds)
+
+        # Builds of a revision might not have been published yet
+        if complete and builds:
+            self._write_cached_builds(revision, job_type_name, debug_build, builds)
+
+        return builds
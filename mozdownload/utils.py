@@ -7,6 +7,7 @@
 from __future__ import absolute_import, unicode_literals
 
 import hashlib
+import re
 
 
 def urljoin(*fragments):
@@ -30,3 +31,53 @@ def create_md5(path):
             m.update(data)
 
     return m.hexdigest()
+
+
+def hash_file(path, hash_object, size=None):
+    """Update the hash object with the content of a file, or only its first bytes."""
+    with open(path, 'rb') as f:
+        while size is None or size > 0:
+            data = f.read(8192 if size is None else min(8192, size))
+            if not data:
+                break
+            hash_object.update(data)
+            if size is not None:
+                size -= len(data)
+
+    return hash_object
+
+
+def parse_checksums(content):
+    """Parse the content of a checksums file into a dict of file names to SHA512 hashes.
+
+    Both the format of SHA512SUMS files ("<hash>  <name>") and of the checksums
+    files of nightly builds ("<hash> <algorithm> <size> <name>") are supported.
+    """
+    checksums = {}
+    for line in content.splitlines():
+        fields = line.split(None, 1)
+        if len(fields) != 2:
+            continue
+
+        checksum, name = fields
+        details = name.split(' ', 2)
+        if len(details) == 3 and details[0] in hashlib.algorithms_available \
+                and details[1].isdigit():
+            if details[0] != 'sha512':
+                continue
+            name = details[2]
+
+        checksums[name.strip()] = checksum.lower()
+
+    return checksums
+
+
+def parse_size(size):
+    """Convert a size like "512K", "20M", or "1.5G" into bytes."""
+    units = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+    match = re.match(r'^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)(?:i?B)?\s*$', str(size), re.IGNORECASE)
+    if not match:
+        raise ValueError('%s is not a valid size' % size)
+
+    return int(float(match.group(1)) * units[match.group(2).upper()])
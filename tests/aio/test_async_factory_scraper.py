@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import asyncio
+import os
+
+import pytest
+
+import mozdownload.errors as errors
+from mozdownload.aio import AsyncFactoryScraper
+
+
+def test_concurrent_resolve(httpd, tmpdir):
+    """Resolve builds of different scraper types on a single event loop"""
+    scrapers = [
+        AsyncFactoryScraper('release', version='23.0.1', platform=platform,
+                            destination=str(tmpdir), base_url=httpd.get_url())
+        for platform in ('linux', 'linux64', 'mac', 'win32', 'win64')
+    ]
+    scrapers.append(AsyncFactoryScraper('candidate', version='23.0.1', platform='win32',
+                                        destination=str(tmpdir), base_url=httpd.get_url()))
+    scrapers.append(AsyncFactoryScraper('daily', platform='win32',
+                                        destination=str(tmpdir), base_url=httpd.get_url()))
+
+    async def resolve():
+        return await asyncio.gather(*[scraper.resolve() for scraper in scrapers])
+
+    resolved = asyncio.run(resolve())
+
+    assert [scraper.url for scraper in scrapers] == [build.url for build in resolved]
+    assert scrapers[0].url == httpd.get_url() + \
+        'firefox/releases/23.0.1/linux-i686/en-US/firefox-23.0.1.tar.xz'
+    assert os.path.basename(scrapers[-1].filename) == \
+        '2013-10-01-03-02-04-mozilla-central-firefox-27.0a1.en-US.win32.installer.exe'
+
+
+def test_download(httpd, tmpdir):
+    scraper = AsyncFactoryScraper('release', version='23.0.1', platform='win32',
+                                  destination=str(tmpdir), base_url=httpd.get_url())
+    with pytest.raises(RuntimeError):
+        scraper.url
+
+    filename = asyncio.run(scraper.download())
+    assert filename == scraper.filename
+    assert os.listdir(str(tmpdir)) == ['firefox-23.0.1.en-US.win32.exe']
+
+
+def test_build_not_found(httpd, tmpdir):
+    scraper = AsyncFactoryScraper('release', version='0.0', platform='win32',
+                                  destination=str(tmpdir), base_url=httpd.get_url())
+    with pytest.raises(errors.NotFoundError):
+        asyncio.run(scraper.resolve())
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import hashlib
+import os
+
+import pytest
+
+import mozdownload.errors as errors
+from mozdownload import FactoryScraper
+from mozdownload.utils import parse_checksums
+
+
+@pytest.mark.parametrize('scraper_type,args,checksums_path', [
+    ('release', {'version': '23.0.1'},
+     'firefox/releases/23.0.1/SHA512SUMS'),
+    ('candidate', {'version': '23.0.1'},
+     'firefox/candidates/23.0.1-candidates/build3/SHA512SUMS'),
+    ('daily', {'branch': 'mozilla-central'},
+     'firefox/nightly/2013/10/2013-10-01-03-02-04-mozilla-central/'
+     'firefox-27.0a1.en-US.win32.checksums'),
+])
+def test_verify_checksum(httpd, tmpdir, scraper_type, args, checksums_path):
+    scraper = FactoryScraper(scraper_type,
+                             destination=str(tmpdir),
+                             base_url=httpd.get_url(),
+                             platform='win32',
+                             verify_checksums=True,
+                             **args)
+    assert scraper.checksums_url == httpd.get_url() + checksums_path
+
+    with open(scraper.download(), 'rb') as f:
+        assert scraper.get_checksum() == hashlib.sha512(f.read()).hexdigest()
+
+
+def test_checksum_mismatch(httpd, tmpdir, mocker):
+    scraper = FactoryScraper('release',
+                             destination=str(tmpdir),
+                             base_url=httpd.get_url(),
+                             platform='win32',
+                             version='23.0.1',
+                             retry_attempts=1,
+                             retry_delay=0,
+                             verify_checksums=True)
+    get_checksum = mocker.patch.object(scraper, 'get_checksum', return_value='0' * 128)
+    get = mocker.spy(scraper.session, 'get')
+
+    with pytest.raises(errors.ChecksumError):
+        scraper.download()
+    assert get_checksum.call_count == 1
+    assert [call.args[0] for call in get.call_args_list].count(scraper.url) == 2
+    assert os.listdir(str(tmpdir)) == []
+
+
+def test_missing_checksums(httpd, tmpdir):
+    """Builds without published checksums are downloaded without verification"""
+    scraper = FactoryScraper('release',
+                             destination=str(tmpdir),
+                             base_url=httpd.get_url(),
+                             platform='win32',
+                             version='21.0',
+                             is_stub_installer=True,
+                             verify_checksums=True)
+    assert scraper.get_checksum() is None
+    assert os.path.isfile(scraper.download())
+
+
+def test_parse_checksums():
+    content = '\n'.join([
+        'ABC123  win32/en-US/Firefox Setup 23.0.1.exe',
+        'def456 sha512 4546 firefox-27.0a1.en-US.win32.installer.exe',
+        '789abc sha256 4546 firefox-27.0a1.en-US.win32.installer.exe',
+        '',
+    ])
+    assert parse_checksums(content) == {
+        'win32/en-US/Firefox Setup 23.0.1.exe': 'abc123',
+        'firefox-27.0a1.en-US.win32.installer.exe': 'def456',
+    }
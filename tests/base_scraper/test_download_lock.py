@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import logging
+import os
+import threading
+import time
+
+import pytest
+
+import mozdownload
+import mozdownload.errors as errors
+from mozdownload.lock import FileLock
+from mozdownload.utils import create_md5, urljoin
+
+
+def test_single_download_for_concurrent_scrapers(httpd, tmpdir, caplog):
+    """Only one of the scrapers downloading the same file transfers it"""
+    caplog.set_level(logging.INFO)
+    filename = 'download_test.txt'
+    test_url = urljoin(httpd.get_url(), filename)
+
+    scrapers = [mozdownload.DirectScraper(url=test_url, destination=str(tmpdir))
+                for _ in range(4)]
+
+    # Hold the lock until all scrapers are waiting for it
+    lock = FileLock(scrapers[0].filename + '.lock')
+    lock.acquire()
+    threads = [threading.Thread(target=scraper.download) for scraper in scrapers]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 10
+    while caplog.text.count('Waiting for another process') < len(scrapers) and \
+            time.monotonic() < deadline:
+        time.sleep(0.05)
+    lock.release()
+    for thread in threads:
+        thread.join()
+
+    assert caplog.text.count('Downloading from') == 1
+    assert caplog.text.count('downloaded by another process') == 3
+    assert os.listdir(str(tmpdir)) == [filename]
+    assert create_md5(os.path.join(str(tmpdir), filename)) == \
+        create_md5(os.path.join(httpd.router.doc_root, filename))
+
+
+def test_lock_timeout(httpd, tmpdir):
+    test_url = urljoin(httpd.get_url(), 'download_test.txt')
+    scraper = mozdownload.DirectScraper(url=test_url,
+                                        destination=str(tmpdir),
+                                        lock_timeout=0.2)
+
+    with FileLock(scraper.filename + '.lock'):
+        with pytest.raises(errors.LockTimeoutError):
+            scraper.download()
+
+    assert not os.path.isfile(scraper.filename)
+
+
+def test_stale_lock_file(httpd, tmpdir):
+    """A lock file left behind by a killed process does not block the download"""
+    test_url = urljoin(httpd.get_url(), 'download_test.txt')
+    scraper = mozdownload.DirectScraper(url=test_url,
+                                        destination=str(tmpdir),
+                                        lock_timeout=0.2)
+
+    with open(scraper.filename + '.lock', 'w') as f:
+        f.write('12345')
+
+    scraper.download()
+    assert os.listdir(str(tmpdir)) == ['download_test.txt']
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from mozdownload import DirectScraper, ReleaseScraper, errors
+from mozdownload.metrics import Metrics
+
+FILES = {'firefox/firefox': os.urandom(256 * 1024),
+         'firefox/application.ini': b'[App]\nName=Firefox\n'}
+
+
+def create_archive(path):
+    if path.endswith('.zip'):
+        with zipfile.ZipFile(path, 'w') as archive:
+            for name, content in FILES.items():
+                archive.writestr(name, content)
+        return
+
+    with tarfile.open(path, 'w:%s' % path.rsplit('.', 1)[-1]) as tar:
+        for name, content in FILES.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+
+
+@pytest.fixture
+def archive_server(tmpdir, static_server):
+    root = os.path.join(str(tmpdir), 'server')
+    os.makedirs(root)
+    for name in ('build.tar.xz', 'build.tar.bz2', 'build.zip'):
+        create_archive(os.path.join(root, name))
+    with open(os.path.join(root, 'broken.tar.xz'), 'wb') as f:
+        f.write(os.urandom(64 * 1024))
+
+    return static_server(root)
+
+
+def assert_extracted(path):
+    for name, content in FILES.items():
+        with open(os.path.join(path, name), 'rb') as f:
+            assert f.read() == content
+
+
+@pytest.mark.parametrize('name,streamed', [('build.tar.xz', True),
+                                           ('build.tar.bz2', True),
+                                           ('build.zip', False)])
+def test_extract(archive_server, tmpdir, name, streamed):
+    destination = os.path.join(str(tmpdir), 'downloads')
+    extract_dir = os.path.join(str(tmpdir), 'extracted')
+    metrics = Metrics()
+    scraper = DirectScraper(url=archive_server.url + name, destination=destination,
+                            extract_dir=extract_dir, metrics=metrics)
+
+    assert scraper.download() == extract_dir
+    assert_extracted(extract_dir)
+    assert scraper.bytes_received == os.path.getsize(os.path.join(str(tmpdir), 'server', name))
+
+    # The archive is not kept, and only zip archives get extracted afterwards
+    assert os.listdir(destination) == []
+    phases = [phase['name'] for phase in metrics.report()['phases']]
+    assert ('extract' not in phases) == streamed
+
+
+def test_keep_archive(archive_server, tmpdir):
+    destination = os.path.join(str(tmpdir), 'downloads')
+    extract_dir = os.path.join(str(tmpdir), 'extracted')
+    scraper = DirectScraper(url=archive_server.url + 'build.tar.xz', destination=destination,
+                            extract_dir=extract_dir, keep_archive=True)
+
+    scraper.download()
+    assert_extracted(extract_dir)
+    assert os.listdir(destination) == ['build.tar.xz']
+
+    # An already downloaded archive gets extracted again
+    other_dir = os.path.join(str(tmpdir), 'other')
+    scraper = DirectScraper(url=archive_server.url + 'build.tar.xz', destination=destination,
+                            extract_dir=other_dir)
+    assert scraper.download() == other_dir
+    assert_extracted(other_dir)
+
+
+def test_broken_archive(archive_server, tmpdir):
+    scraper = DirectScraper(url=archive_server.url + 'broken.tar.xz',
+                            destination=str(tmpdir),
+                            extract_dir=os.path.join(str(tmpdir), 'extracted'))
+    with pytest.raises(tarfile.TarError):
+        scraper.download()
+    assert not os.path.isfile(scraper.filename + '.part')
+
+
+def test_unsupported_archive(httpd, tmpdir):
+    scraper = DirectScraper(url=httpd.get_url() + 'download_test.txt',
+                            destination=str(tmpdir),
+                            extract_dir=os.path.join(str(tmpdir), 'extracted'))
+    with pytest.raises(errors.NotSupportedError):
+        scraper.download()
+
+
+def test_fallback_extension(httpd, tmpdir):
+    scraper = ReleaseScraper(version='24.0esr', platform='linux', destination=str(tmpdir),
+                             base_url=httpd.get_url(),
+                             extract_dir=os.path.join(str(tmpdir), 'extracted'))
+    assert scraper.filename.endswith('.tar.bz2')
+    assert scraper._archive_compression() == 'bz2'
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import os
+
+import mozdownload
+from mozdownload.utils import urljoin
+
+
+def test_read_chunks_into_buffer(httpd, tmpdir, mocker):
+    """Chunks are views into a reusable buffer which grows with the throughput"""
+    mocker.patch('mozdownload.scraper.CHUNK_SIZE', 512)
+
+    filename = 'download_test.txt'
+    test_url = urljoin(httpd.get_url(), filename)
+    scraper = mozdownload.DirectScraper(url=test_url, destination=str(tmpdir))
+
+    r = scraper.session.get(test_url, stream=True)
+    chunks = []
+    sizes = []
+    buffers = set()
+    for chunk in scraper._read_chunks(r):
+        assert isinstance(chunk, memoryview)
+        buffers.add(id(chunk.obj))
+        sizes.append(len(chunk))
+        chunks.append(bytes(chunk))
+    r.close()
+
+    with open(os.path.join(httpd.router.doc_root, filename), 'rb') as f:
+        assert b''.join(chunks) == f.read()
+    assert len(buffers) == 1
+    assert sizes == [512, 1024, 2048, 4546 - 3584]
+
+
+def test_read_chunks_with_content_encoding(httpd, tmpdir, mocker):
+    """Encoded content is decoded by requests"""
+    filename = 'download_test.txt'
+    test_url = urljoin(httpd.get_url(), filename)
+    scraper = mozdownload.DirectScraper(url=test_url, destination=str(tmpdir))
+
+    r = scraper.session.get(test_url, stream=True)
+    r.headers['Content-Encoding'] = 'gzip'
+    iter_content = mocker.patch.object(r, 'iter_content', return_value=iter([b'data']))
+    assert list(scraper._read_chunks(r)) == [b'data']
+    assert iter_content.called
+    r.close()
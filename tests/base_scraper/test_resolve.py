@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import os
+
+import pytest
+import requests
+
+from mozdownload import FactoryScraper
+from mozdownload.scraper import ReleaseScraper, ResolvedBuild
+
+
+@pytest.mark.parametrize('scraper_type,kwargs,resolve_requests,download_requests', [
+    ('release', {'version': '23.0.1'}, 1, 1),
+    ('release', {'version': 'latest'}, 2, 1),
+    ('candidate', {'version': '23.0.1'}, 2, 1),
+    ('daily', {}, 5, 1),
+    ('daily', {'date': '2013-07-02', 'branch': 'mozilla-central'}, 4, 1),
+    ('direct', {'url': 'download_test.txt'}, 0, 1),
+])
+def test_requests_per_scraper(httpd, tmpdir, mocker, scraper_type, kwargs,
+                              resolve_requests, download_requests):
+    """The build gets resolved once, and is downloaded with a single request"""
+    if scraper_type == 'direct':
+        kwargs = {'url': httpd.get_url() + kwargs['url']}
+
+    get = mocker.spy(requests.Session, 'get')
+    scraper = FactoryScraper(scraper_type, platform='win32', destination=str(tmpdir),
+                             base_url=httpd.get_url(), **kwargs)
+    for _ in range(2):
+        scraper.url
+        scraper.filename
+    assert get.call_count == resolve_requests
+
+    scraper.download()
+    assert get.call_count == resolve_requests + download_requests
+
+
+def test_resolve(httpd, tmpdir, mocker):
+    scraper = FactoryScraper('release', version='23.0.1', platform='win32',
+                             destination=str(tmpdir), base_url=httpd.get_url())
+    build = scraper.resolve()
+    path = httpd.get_url() + 'firefox/releases/23.0.1/win32/en-US/'
+    assert build == ResolvedBuild(url=path + 'Firefox%20Setup%2023.0.1.exe',
+                                  binary='Firefox Setup 23.0.1.exe',
+                                  path=path,
+                                  filename=os.path.join(str(tmpdir),
+                                                        'firefox-23.0.1.en-US.win32.exe'))
+    assert scraper.resolve() is build
+    with pytest.raises(AttributeError):
+        build.url = None
+
+    # The build gets resolved again after an invalidation
+    get = mocker.spy(requests.Session, 'get')
+    scraper.invalidate()
+    assert scraper.resolve() == build
+    assert get.call_count == 1
+
+
+def test_invalidate_newer_build(httpd, tmpdir, mocker):
+    """The build information is retrieved again after an invalidation"""
+    query_versions = mocker.patch.object(ReleaseScraper, 'query_versions',
+                                         side_effect=[['21.0'], ['23.0.1']])
+    scraper = FactoryScraper('release', version='latest', platform='win32',
+                             is_stub_installer=True, destination=str(tmpdir),
+                             base_url=httpd.get_url())
+    assert scraper.binary == 'Firefox Setup Stub 21.0.exe'
+
+    # A new release has been published in the meantime
+    scraper.invalidate()
+    assert scraper.binary == 'Firefox Installer.exe'
+    assert scraper.version == '23.0.1'
+    assert [call.args for call in query_versions.call_args_list] == [('latest',)] * 2
+
+
+@pytest.mark.parametrize('scraper_type,kwargs', [
+    ('release', {'version': 'latest'}),
+    ('candidate', {'version': '23.0.1'}),
+    ('daily', {}),
+    ('direct', {'url': 'download_test.txt'}),
+])
+def test_lazy(httpd, tmpdir, mocker, scraper_type, kwargs):
+    """A lazy scraper does not access the server before the build gets resolved"""
+    if scraper_type == 'direct':
+        kwargs = {'url': httpd.get_url() + kwargs['url']}
+
+    expected = FactoryScraper(scraper_type, platform='win32', destination=str(tmpdir),
+                              base_url=httpd.get_url(), **kwargs).resolve()
+
+    get = mocker.spy(requests.Session, 'get')
+    scraper = FactoryScraper(scraper_type, platform='win32', destination=str(tmpdir),
+                             base_url=httpd.get_url(), lazy=True, **kwargs)
+    assert get.call_count == 0
+
+    assert scraper.url == expected.url
+    assert scraper.resolve() == expected
+
+
+def test_lazy_invalid_arguments():
+    """Arguments of lazy scrapers are still validated on construction"""
+    with pytest.raises(ValueError):
+        FactoryScraper('daily', date='2013/07/02', platform='win32', lazy=True)
+    with pytest.raises(ValueError):
+        FactoryScraper('release', platform='win32', lazy=True)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import json
+import os
+import threading
+
+import pytest
+import requests
+
+import mozdownload
+from mozdownload.utils import create_md5, urljoin
+
+FILENAME = 'download_test.txt'
+
+
+def write_partial_download(httpd, tmpdir, url, etag, length):
+    """Create a partial file with the first bytes of the original file"""
+    with open(os.path.join(httpd.router.doc_root, FILENAME), 'rb') as f:
+        data = f.read()
+
+    tmp_file = os.path.join(str(tmpdir), FILENAME + '.part')
+    with open(tmp_file, 'wb') as f:
+        f.write(data[:length])
+    with open(tmp_file + '.json', 'w') as f:
+        json.dump({'url': url,
+                   'etag': etag,
+                   'last_modified': None,
+                   'total_size': len(data),
+                   'segments': [[length, len(data) - 1]]}, f)
+
+
+def assert_downloaded(httpd, tmpdir):
+    md5_original = create_md5(os.path.join(httpd.router.doc_root, FILENAME))
+    md5_downloaded = create_md5(os.path.join(str(tmpdir), FILENAME))
+    assert md5_original == md5_downloaded
+    assert os.listdir(str(tmpdir)) == [FILENAME]
+
+
+def test_resume_download(httpd, tmpdir, mocker):
+    """Only the missing tail of a partial file gets downloaded"""
+    test_url = urljoin(httpd.get_url(), FILENAME)
+    write_partial_download(httpd, tmpdir, test_url, '"download-test"', 1000)
+
+    scraper = mozdownload.DirectScraper(url=test_url, destination=str(tmpdir))
+    get = mocker.spy(scraper.session, 'get')
+    scraper.download()
+
+    assert get.call_count == 1
+    assert get.call_args.kwargs['headers'] == {'Range': 'bytes=1000-4545',
+                                               'If-Range': '"download-test"'}
+    assert_downloaded(httpd, tmpdir)
+
+
+def test_resume_modified_file(httpd, tmpdir, mocker):
+    """A partial file of a modified remote file gets discarded"""
+    test_url = urljoin(httpd.get_url(), FILENAME)
+    write_partial_download(httpd, tmpdir, test_url, '"outdated"', 1000)
+    with open(os.path.join(str(tmpdir), FILENAME + '.part'), 'wb') as f:
+        f.write(b'x' * 1000)
+
+    scraper = mozdownload.DirectScraper(url=test_url, destination=str(tmpdir))
+    get = mocker.spy(scraper.session, 'get')
+    scraper.download()
+
+    assert get.call_count == 2
+    assert get.call_args.kwargs['headers'] == {}
+    assert_downloaded(httpd, tmpdir)
+
+
+def test_resume_restarted_by_server(httpd, static_server, tmpdir, mocker):
+    """The whole file sent instead of the requested range is used right away"""
+    # The server doesn't support byte ranges, and always sends the whole file
+    test_url = static_server(httpd.router.doc_root).url + FILENAME
+    write_partial_download(httpd, tmpdir, test_url, '"outdated"', 1000)
+
+    scraper = mozdownload.DirectScraper(url=test_url, destination=str(tmpdir))
+    get = mocker.spy(scraper.session, 'get')
+    scraper.download()
+
+    assert get.call_count == 1
+    assert_downloaded(httpd, tmpdir)
+
+
+@pytest.mark.parametrize('connections', [1, 4])
+def test_retry_resumes_download(httpd, tmpdir, mocker, connections):
+    """A retry continues from the bytes already received"""
+    mocker.patch('mozdownload.scraper.CHUNK_SIZE', 1024)
+
+    read_chunks = mozdownload.Scraper._read_chunks
+    lock = threading.Lock()
+    failures = []
+
+    def flaky_read_chunks(self, r, *args):
+        chunks = read_chunks(self, r, *args)
+        with lock:
+            fail = not failures
+            failures.append(fail)
+        if fail:
+            yield next(chunks)
+            raise requests.exceptions.ChunkedEncodingError('Connection lost')
+        yield from chunks
+
+    mocker.patch.object(mozdownload.Scraper, '_read_chunks', flaky_read_chunks)
+
+    test_url = urljoin(httpd.get_url(), FILENAME)
+    scraper = mozdownload.DirectScraper(url=test_url,
+                                        destination=str(tmpdir),
+                                        connections=connections,
+                                        retry_attempts=1,
+                                        retry_delay=0)
+    get = mocker.spy(scraper.session, 'get')
+    scraper.download()
+
+    # Only the interrupted segment is requested again, starting after the
+    # first chunk which has already been written
+    segment_size = -(-4546 // connections)
+    assert get.call_count == (2 if connections == 1 else connections + 2)
+    first, last = get.call_args.kwargs['headers']['Range'][6:].split('-')
+    assert int(first) % segment_size == 1024
+    if connections > 1:
+        assert int(last) - int(first) == segment_size - 1025
+    assert_downloaded(httpd, tmpdir)
+
+
+def test_no_resume_without_validators(httpd, tmpdir):
+    """A partial file is removed if the server sends no validators"""
+    basic_auth_url = urljoin(httpd.get_url(), 'basic_auth')
+    scraper = mozdownload.DirectScraper(url=basic_auth_url, destination=str(tmpdir))
+    with pytest.raises(requests.exceptions.HTTPError):
+        scraper.download()
+
+    assert os.listdir(str(tmpdir)) == []
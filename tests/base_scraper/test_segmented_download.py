@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import os
+
+import pytest
+
+import mozdownload
+from mozdownload.session import DEFAULT_POOL_MAXSIZE, get_default_adapter
+from mozdownload.utils import create_md5, urljoin
+
+
+@pytest.mark.parametrize('connections', [2, 4, 16])
+def test_segmented_download(httpd, tmpdir, mocker, connections):
+    """Download a file via parallel byte ranges and compare its md5 hash"""
+    filename = 'download_test.txt'
+    test_url = urljoin(httpd.get_url(), filename)
+    scraper = mozdownload.DirectScraper(url=test_url,
+                                        destination=str(tmpdir),
+                                        connections=connections)
+    get = mocker.spy(scraper.session, 'get')
+    scraper.download()
+
+    # The initial request only detects the support for byte ranges
+    range_requests = [call for call in get.call_args_list
+                      if 'Range' in (call.kwargs.get('headers') or {})]
+    assert len(range_requests) == connections + 1
+
+    md5_original = create_md5(os.path.join(httpd.router.doc_root, filename))
+    md5_downloaded = create_md5(os.path.join(str(tmpdir), filename))
+    assert md5_original == md5_downloaded
+    assert not os.path.isfile(os.path.join(str(tmpdir), filename + '.part'))
+
+
+def test_fallback_without_range_support(httpd, tmpdir, mocker):
+    """Use a single stream if the server does not accept byte ranges"""
+    basic_auth_url = urljoin(httpd.get_url(), 'basic_auth')
+    scraper = mozdownload.DirectScraper(url=basic_auth_url,
+                                        destination=str(tmpdir),
+                                        username='mozilla',
+                                        password='mozilla',
+                                        connections=4)
+    get = mocker.spy(scraper.session, 'get')
+    scraper.download()
+
+    assert get.call_count == 1
+    assert os.path.isfile(scraper.filename)
+
+
+def test_connection_pool_size(tmpdir):
+    # The connection pool of the process is large enough
+    scraper = mozdownload.DirectScraper(url='http://localhost/file.txt',
+                                        destination=str(tmpdir),
+                                        connections=20)
+    assert scraper.session.get_adapter('http://localhost/') is get_default_adapter()
+    assert DEFAULT_POOL_MAXSIZE >= 20
+
+    scraper = mozdownload.DirectScraper(url='http://localhost/file.txt',
+                                        destination=str(tmpdir),
+                                        connections=64)
+    adapter = scraper.session.get_adapter('http://localhost/')
+    assert adapter._pool_maxsize == 64
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import os
+import time
+
+import pytest
+import requests
+
+from mozdownload import DirectScraper, ReleaseScraper, errors
+from mozdownload.utils import urljoin
+
+# Sends the file in pieces of 1000 bytes every 0.25 seconds
+SLOW_DOWNLOAD = 'download_test.txt?pipe=trickle(1000:d0.25:r2)'
+
+
+def test_read_timeout(httpd, tmpdir):
+    url = urljoin(httpd.get_url(), 'download_test.txt?pipe=trickle(d2)')
+    scraper = DirectScraper(url=url, destination=str(tmpdir), read_timeout=0.5)
+
+    start_time = time.monotonic()
+    with pytest.raises((requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+        scraper.download()
+    assert time.monotonic() - start_time < 2
+
+
+def test_stall_detection(httpd, tmpdir):
+    url = urljoin(httpd.get_url(), SLOW_DOWNLOAD)
+    scraper = DirectScraper(url=url, destination=str(tmpdir),
+                            stall_speed=1024 ** 2, stall_time=0.5)
+    with pytest.raises(errors.StallError):
+        scraper.download()
+    assert not os.path.isfile(scraper.filename)
+
+
+def test_stall_detection_disabled(httpd, tmpdir):
+    url = urljoin(httpd.get_url(), SLOW_DOWNLOAD)
+    scraper = DirectScraper(url=url, destination=str(tmpdir),
+                            stall_speed=0, stall_time=0.5)
+    scraper.download()
+    assert os.path.getsize(scraper.filename) == 4546
+
+
+def test_deadline_covers_download(httpd, tmpdir):
+    url = urljoin(httpd.get_url(), SLOW_DOWNLOAD)
+    scraper = DirectScraper(url=url, destination=str(tmpdir), timeout=0.5,
+                            retry_attempts=3, retry_delay=0)
+    start_time = time.monotonic()
+    with pytest.raises(errors.TimeoutError):
+        scraper.download()
+
+    # A timed out download is not retried
+    assert time.monotonic() - start_time < 3
+
+
+def test_deadline_covers_resolution(httpd, tmpdir, monkeypatch):
+    # Simulate a slow response for the listings
+    get = requests.Session.get
+
+    def slow_get(self, *args, **kwargs):
+        time.sleep(0.2)
+        return get(self, *args, **kwargs)
+
+    monkeypatch.setattr(requests.Session, 'get', slow_get)
+    with pytest.raises(errors.TimeoutError):
+        scraper = ReleaseScraper(version='latest', platform='win32', destination=str(tmpdir),
+                                 base_url=httpd.get_url(), timeout=0.1)
+        scraper.resolve()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import os
+import zipfile
+
+import requests
+
+import mozdownload.errors as errors
+from mozdownload.batch import BatchDownloader
+from mozdownload.session import get_default_adapter
+
+
+def test_download_builds(httpd, tmpdir):
+    builds = [{'type': 'release', 'version': '23.0.1', 'platform': platform,
+               'destination': str(tmpdir), 'base_url': httpd.get_url()}
+              for platform in ('linux', 'linux64', 'mac', 'win32', 'win64')]
+    builds.append({'type': 'release', 'version': '0.0', 'platform': 'win32',
+                   'destination': str(tmpdir), 'base_url': httpd.get_url()})
+
+    results = BatchDownloader(builds, jobs=3).run()
+
+    assert [result['build'] for result in results] == builds
+    for result in results[:-1]:
+        assert result['error'] is None
+        assert os.path.isfile(result['filename'])
+        assert result['size'] == os.path.getsize(result['filename'])
+    assert isinstance(results[-1]['error'], errors.NotFoundError)
+    assert results[-1]['filename'] is None
+    assert len(os.listdir(str(tmpdir))) == 5
+
+
+def test_size_of_extracted_build(static_server, tmpdir):
+    root = os.path.join(str(tmpdir), 'server')
+    os.makedirs(root)
+    archive = os.path.join(root, 'build.zip')
+    with zipfile.ZipFile(archive, 'w') as f:
+        f.writestr('firefox/firefox', os.urandom(64 * 1024))
+
+    extract_dir = os.path.join(str(tmpdir), 'extracted')
+    builds = [{'url': static_server(root).url + 'build.zip',
+               'destination': str(tmpdir), 'extract_dir': extract_dir}]
+    result = BatchDownloader(builds).run()[0]
+
+    assert result['error'] is None
+    assert result['filename'] == extract_dir
+    assert result['size'] == os.path.getsize(archive)
+
+
+def test_shared_listings(httpd, tmpdir, mocker):
+    get = mocker.spy(requests.Session, 'get')
+    builds = [{'type': 'release', 'version': '23.0.1', 'platform': 'win32', 'locale': locale,
+               'destination': str(tmpdir), 'base_url': httpd.get_url()}
+              for locale in ('en-US', 'de', 'en-US')]
+
+    downloader = BatchDownloader(builds, jobs=1)
+    downloader.run()
+
+    # Each listing is only fetched once, and all builds share the connection
+    # pool of the process
+    urls = [call[0][1] for call in get.call_args_list]
+    listings = [url for url in urls if url.endswith('/')]
+    assert len(listings) == len(set(listings))
+    assert all(call[0][0].get_adapter(call[0][1]) is get_default_adapter()
+               for call in get.call_args_list)
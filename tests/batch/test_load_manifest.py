@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import json
+import os
+
+import pytest
+
+from mozdownload.batch import load_manifest
+
+
+def write_manifest(tmpdir, name, content):
+    path = os.path.join(str(tmpdir), name)
+    with open(path, 'w') as f:
+        f.write(content)
+    return path
+
+
+def test_json_list(tmpdir):
+    builds = [{'type': 'release', 'version': '23.0.1', 'platform': 'win32'},
+              {'type': 'daily', 'platform': 'linux'}]
+    path = write_manifest(tmpdir, 'builds.json', json.dumps(builds))
+    assert load_manifest(path) == builds
+
+
+def test_json_defaults(tmpdir):
+    manifest = {'defaults': {'type': 'release', 'version': '23.0.1'},
+                'builds': [{'platform': 'win32'},
+                           {'platform': 'linux', 'version': '24.0'}]}
+    path = write_manifest(tmpdir, 'builds.json', json.dumps(manifest))
+    assert load_manifest(path) == [
+        {'type': 'release', 'version': '23.0.1', 'platform': 'win32'},
+        {'type': 'release', 'version': '24.0', 'platform': 'linux'},
+    ]
+
+
+def test_toml_defaults(tmpdir):
+    pytest.importorskip('tomllib')
+    path = write_manifest(tmpdir, 'builds.toml', '\n'.join([
+        '[defaults]',
+        'type = "release"',
+        'version = "23.0.1"',
+        '',
+        '[[builds]]',
+        'platform = "win32"',
+        '',
+        '[[builds]]',
+        'platform = "linux"',
+        'locale = "de"',
+    ]))
+    assert load_manifest(path) == [
+        {'type': 'release', 'version': '23.0.1', 'platform': 'win32'},
+        {'type': 'release', 'version': '23.0.1', 'platform': 'linux', 'locale': 'de'},
+    ]
+
+
+@pytest.mark.parametrize('content', [
+    '{"defaults": {}}',
+    '"release"',
+    '["release"]',
+])
+def test_invalid_manifest(tmpdir, content):
+    path = write_manifest(tmpdir, 'builds.json', content)
+    with pytest.raises(ValueError):
+        load_manifest(path)
@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import mozdownload.errors as errors
+from mozdownload import FactoryScraper
+from mozdownload.batch import resolve_scrapers
+from mozdownload.scraper import ResolvedBuild
+
+
+def test_resolve_scrapers(httpd, tmpdir):
+    scrapers = [FactoryScraper('release', version=version, platform=platform,
+                               destination=str(tmpdir), base_url=httpd.get_url(), lazy=True)
+                for version, platform in (('23.0.1', 'win32'), ('latest', 'linux'),
+                                          ('0.0', 'win32'), ('23.0.1', 'mac'))]
+
+    results = resolve_scrapers(scrapers, jobs=2)
+
+    assert len(results) == 4
+    assert isinstance(results[2], errors.NotFoundError)
+    for scraper, result in zip(scrapers, results):
+        if not isinstance(result, Exception):
+            assert isinstance(result, ResolvedBuild)
+            assert result is scraper.resolve()
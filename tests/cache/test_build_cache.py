@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import os
+
+import pytest
+
+from mozdownload.cache import BuildCache
+
+
+def create_file(tmpdir, name, size):
+    path = os.path.join(str(tmpdir), name)
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    return path
+
+
+def test_key():
+    url = 'https://archive.mozilla.org/pub/firefox/releases/23.0.1/linux/firefox.tar.xz'
+    assert BuildCache.key(url) is None
+    assert BuildCache.key(url, etag='"a"') != BuildCache.key(url, etag='"b"')
+    assert BuildCache.key(url, size=10) != BuildCache.key(url, size=11)
+    assert BuildCache.key(url, etag='"a"', size=10) == BuildCache.key(url, etag='"a"', size=11)
+
+
+def test_store_and_materialize(tmpdir):
+    cache = BuildCache(os.path.join(str(tmpdir), 'cache'))
+    source = create_file(tmpdir, 'build', 100)
+    key = BuildCache.key('http://localhost/build', size=100)
+
+    assert cache.lookup(key) is None
+    assert cache.materialize(key, os.path.join(str(tmpdir), 'copy')) is None
+
+    cache.store(key, source, url='http://localhost/build')
+    destination = os.path.join(str(tmpdir), 'copy')
+    assert cache.materialize(key, destination) == 'hardlink'
+    with open(destination, 'rb') as f:
+        assert f.read() == b'x' * 100
+
+    assert cache.stats()['entries'] == 1
+    assert cache.stats()['size'] == 100
+
+
+def test_lru_eviction(tmpdir):
+    cache = BuildCache(os.path.join(str(tmpdir), 'cache'), max_size=250)
+    keys = [BuildCache.key('http://localhost/%s' % i, size=100) for i in range(3)]
+
+    for index, key in enumerate(keys[:2]):
+        cache.store(key, create_file(tmpdir, str(index), 100))
+        os.utime(cache.lookup(key) + '.json', (index, index))
+
+    # The first build has been used more recently than the second one
+    os.utime(cache.lookup(keys[0]) + '.json', (10, 10))
+    os.utime(cache._entry_path(keys[1]) + '.json', (5, 5))
+
+    cache.store(keys[2], create_file(tmpdir, '2', 100))
+    assert cache.lookup(keys[0])
+    assert cache.lookup(keys[1]) is None
+    assert cache.lookup(keys[2])
+    assert cache.stats()['size'] == 200
+
+
+def test_prune_by_age(tmpdir):
+    cache = BuildCache(os.path.join(str(tmpdir), 'cache'))
+    old_key = BuildCache.key('http://localhost/old', size=100)
+    new_key = BuildCache.key('http://localhost/new', size=100)
+    cache.store(old_key, create_file(tmpdir, 'old', 100))
+    cache.store(new_key, create_file(tmpdir, 'new', 100))
+    os.utime(cache._entry_path(old_key) + '.json', (0, 0))
+
+    assert cache.prune(max_age=3600) == (1, 100)
+    assert cache.lookup(old_key) is None
+    assert cache.lookup(new_key)
+
+
+@pytest.mark.parametrize('entries', [0, 3])
+def test_clear(tmpdir, entries):
+    cache = BuildCache(os.path.join(str(tmpdir), 'cache'))
+    for index in range(entries):
+        cache.store(BuildCache.key('http://localhost/%s' % index, size=10),
+                    create_file(tmpdir, str(index), 10))
+
+    assert cache.clear() == (entries, entries * 10)
+    assert cache.stats()['entries'] == 0
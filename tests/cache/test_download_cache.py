@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import logging
+import os
+
+import mozdownload
+from mozdownload.utils import create_md5, urljoin
+
+
+def test_download_from_cache(httpd, tmpdir, caplog):
+    """A build downloaded to another destination is taken from the cache"""
+    filename = 'download_test.txt'
+    test_url = urljoin(httpd.get_url(), filename)
+    cache_dir = os.path.join(str(tmpdir), 'cache')
+    caplog.set_level(logging.INFO)
+
+    destinations = [os.path.join(str(tmpdir), name) for name in ('first', 'second')]
+    for destination in destinations:
+        scraper = mozdownload.DirectScraper(url=test_url,
+                                            destination=destination,
+                                            cache_dir=cache_dir)
+        scraper.download()
+
+    # The second download only requested the headers of the file
+    assert caplog.text.count('Retrieved build from cache') == 1
+    assert scraper.cache.stats()['entries'] == 1
+
+    md5_original = create_md5(os.path.join(httpd.router.doc_root, filename))
+    for destination in destinations:
+        assert os.listdir(destination) == [filename]
+        assert create_md5(os.path.join(destination, filename)) == md5_original
+
+
+def test_persistent_listings(httpd, tmpdir):
+    """Directory listings are persisted in the build cache"""
+    cache_dir = os.path.join(str(tmpdir), 'cache')
+    for _ in range(2):
+        scraper = mozdownload.ReleaseScraper(version='23.0.1', platform='win32',
+                                             destination=str(tmpdir),
+                                             base_url=httpd.get_url(),
+                                             cache_dir=cache_dir)
+        scraper.url
+
+    assert scraper.listing_cache.path == scraper.cache.listings_path
+    assert scraper.listing_cache.get(
+        urljoin(httpd.get_url(), 'firefox', 'releases', '23.0.1', 'win32', 'en-US/'))
+
+    scraper.cache.clear()
+    assert not os.path.exists(scraper.cache.listings_path)
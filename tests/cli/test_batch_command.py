@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import json
+import logging
+import os
+
+from mozdownload import cli
+
+
+def write_manifest(tmpdir, builds):
+    path = os.path.join(str(tmpdir), 'builds.json')
+    with open(path, 'w') as f:
+        json.dump(builds, f)
+    return path
+
+
+def test_batch(httpd, tmpdir, caplog):
+    caplog.set_level(logging.INFO)
+    destination = os.path.join(str(tmpdir), 'builds')
+    manifest = write_manifest(tmpdir, {
+        'defaults': {'type': 'release', 'version': '23.0.1', 'base_url': httpd.get_url()},
+        'builds': [{'platform': 'win32'}, {'platform': 'linux'}],
+    })
+
+    assert cli.cli(['batch', manifest, '--destination', destination]) is None
+    assert sorted(os.listdir(destination)) == ['firefox-23.0.1.en-US.linux.tar.xz',
+                                               'firefox-23.0.1.en-US.win32.exe']
+    assert 'firefox-23.0.1.en-US.win32.exe: ' in caplog.text
+    assert 'Downloaded 2 of 2 builds: ' in caplog.text
+
+
+def test_batch_failure(httpd, tmpdir, caplog):
+    caplog.set_level(logging.INFO)
+    manifest = write_manifest(tmpdir, [
+        {'type': 'release', 'version': '0.0', 'platform': 'win32', 'base_url': httpd.get_url()},
+        {'type': 'release', 'version': '23.0.1', 'platform': 'win32',
+         'base_url': httpd.get_url()},
+    ])
+
+    assert cli.cli(['batch', manifest, '--destination', str(tmpdir)]) == 1
+    assert 'Failed: ' in caplog.text
+    assert 'Downloaded 1 of 2 builds: ' in caplog.text
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import logging
+import os
+
+import pytest
+
+from mozdownload import cli
+from mozdownload.cache import BuildCache
+
+
+@pytest.fixture
+def cache(tmpdir):
+    cache = BuildCache(os.path.join(str(tmpdir), 'cache'))
+    for index in range(3):
+        path = os.path.join(str(tmpdir), str(index))
+        with open(path, 'wb') as f:
+            f.write(b'x' * 1024 * 1024)
+        cache.store(BuildCache.key('http://localhost/%s' % index, size=1024 * 1024), path)
+    return cache
+
+
+def test_cache_stats(cache, caplog):
+    caplog.set_level(logging.INFO)
+    cli.cli(['cache', 'stats', '--cache-dir', cache.path])
+    assert 'Builds: 3' in caplog.text
+    assert 'Size: 3.0 MB' in caplog.text
+
+
+def test_cache_prune(cache, caplog):
+    caplog.set_level(logging.INFO)
+    cli.cli(['cache', 'prune', '--cache-dir', cache.path, '--cache-size', '2M'])
+    assert 'Removed 1 builds (1.0 MB)' in caplog.text
+    assert cache.stats()['entries'] == 2
+
+    assert cli.cli(['cache', 'prune', '--cache-dir', cache.path]) == 1
+
+
+def test_cache_clear(cache, caplog):
+    caplog.set_level(logging.INFO)
+    cli.cli(['cache', 'clear', '--cache-dir', cache.path])
+    assert 'Removed 3 builds (3.0 MB)' in caplog.text
+    assert cache.stats()['entries'] == 0
@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import subprocess
+import sys
+
+import pytest
+
+# Modules which are only needed for revision lookups and progress bars
+LAZY_MODULES = ('mozdownload.treeherder', 'progressbar', 'thclient')
+
+
+def imported_modules(code):
+    output = subprocess.check_output([
+        sys.executable, '-c',
+        code + '\nimport sys\nprint(" ".join(sorted(sys.modules)))'])
+    return output.decode('utf-8').split()
+
+
+def test_import():
+    modules = imported_modules('import mozdownload.cli')
+    for module in LAZY_MODULES:
+        assert module not in modules
+
+
+@pytest.mark.parametrize('args', [
+    ['--type', 'release', '--version', '23.0.1', '--platform', 'win32', '--print-url'],
+    ['--url', 'download_test.txt', '--print-url'],
+])
+def test_print_url(httpd, args):
+    args = [arg.replace('download_test.txt', httpd.get_url() + 'download_test.txt')
+            for arg in args]
+    modules = imported_modules('from mozdownload import cli\ncli.cli(%r)' % (
+        args + ['--base_url', httpd.get_url()]))
+    for module in LAZY_MODULES:
+        assert module not in modules
@@ -0,0 +1,24 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import json
+import logging
+import os
+
+from mozdownload import cli
+
+
+def test_metrics(httpd, tmpdir, caplog):
+    caplog.set_level(logging.INFO)
+    path = os.path.join(str(tmpdir), 'metrics.json')
+    cli.cli(['--url', httpd.get_url() + 'download_test.txt', '--destination', str(tmpdir),
+             '--metrics-json', path, '--stats'])
+
+    with open(path) as f:
+        report = json.load(f)
+    assert report['totals']['requests'] == 1
+    assert 'Requests: 1 ' in caplog.text
+    assert 'Phase download: ' in caplog.text
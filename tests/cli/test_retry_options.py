@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import pytest
+
+from mozdownload import cli, errors
+from mozdownload.retry import get_circuit_breaker
+
+
+def test_retry_options(httpd, tmpdir, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr('mozdownload.retry.time.sleep', sleeps.append)
+
+    url = httpd.get_url() + 'download_test.txt?pipe=status(503)'
+    with pytest.raises(errors.CircuitOpenError):
+        cli.cli(['--url', url, '--destination', str(tmpdir), '--retry-attempts', '20',
+                 '--retry-delay', '1', '--retry-max-delay', '2'])
+    assert len(sleeps) == get_circuit_breaker(url).min_requests - 1
+    assert all(0 <= delay <= 2 for delay in sleeps)
+
+    del sleeps[:]
+    with pytest.raises(Exception) as excinfo:
+        cli.cli(['--url', url, '--destination', str(tmpdir), '--retry-attempts', '2',
+                 '--no-circuit-breaker'])
+    assert not isinstance(excinfo.value, errors.CircuitOpenError)
+    assert len(sleeps) == 2
@@ -1,4 +1,7 @@
+import functools
 import os
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
 
 import pytest
 
@@ -32,12 +35,30 @@ def basic_auth_handler(req, response):
         response.content = content.format("restricted")
 
 
+@handlers.handler
+def conditional_listing_handler(req, response):
+    # Directory listing which supports conditional requests
+    etag = b'"listing"'
+
+    response.headers.set("ETag", etag)
+    if req.headers.get("If-None-Match") == etag:
+        response.status = 304
+    else:
+        response.status = 200
+        response.content = """<!doctype html>
+            <ul>
+            <li><a href="/conditional_listing/1.0/">1.0/</a></li>
+            <li><a href="/conditional_listing/2.0/">2.0/</a></li>
+            </ul>"""
+
+
 @pytest.fixture(scope="session")
 def httpd():
     HERE = os.path.dirname(os.path.abspath(__file__))
 
     routes = [
         ("GET", "/basic_auth", basic_auth_handler),
+        ("GET", "/conditional_listing/", conditional_listing_handler),
     ]
     routes.extend(default_routes.routes)
 
@@ -53,6 +74,36 @@ def httpd():
     httpd.stop()
 
 
+@pytest.fixture
+def static_server():
+    # Serve the files of a given folder with a plain HTTP server, which
+    # doesn't support byte ranges, unlike httpd
+    servers = []
+
+    def serve(doc_root):
+        handler = functools.partial(SimpleHTTPRequestHandler, directory=doc_root)
+        handler.log_message = lambda *args: None
+        static = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        thread = threading.Thread(target=static.serve_forever, daemon=True)
+        thread.start()
+        static.url = 'http://127.0.0.1:%s/' % static.server_address[1]
+        servers.append(static)
+        return static
+
+    yield serve
+    for static in servers:
+        static.shutdown()
+        static.server_close()
+
+
+@pytest.fixture(autouse=True)
+def circuit_breakers():
+    # Failures of one test must not let requests of the next one fail fast
+    from mozdownload.retry import reset_circuit_breakers
+    yield
+    reset_circuit_breakers()
+
+
 def pytest_runtest_setup(item):
     ci_enabled = os.getenv('CI', False)
     for marker in item.iter_markers():
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import os
+
+import requests
+
+from mozdownload import DailyScraper
+
+
+def test_build_dirs_probed_once(httpd, tmpdir, mocker):
+    """Each build folder of the day is only listed once"""
+    get = mocker.spy(requests.Session, 'get')
+
+    scraper = DailyScraper(destination=str(tmpdir), base_url=httpd.get_url(),
+                           date='2013-07-02', platform='win32', branch='mozilla-central')
+    assert scraper.build_index == 1
+
+    urls = [call[0][1] for call in get.call_args_list]
+    for build in scraper.builds:
+        assert len([url for url in urls if url.endswith('/%s/' % build)]) == 1
+
+
+def test_probe_build_dirs(httpd, tmpdir, mocker):
+    scraper = DailyScraper(destination=str(tmpdir), base_url=httpd.get_url(),
+                           date='2013-07-02', platform='win32', branch='mozilla-central')
+    folders = ['2013-07-02-03-12-13-mozilla-central', '2013-07-02-04-12-13-mozilla-central',
+               '2013-07-02-05-12-13-mozilla-central']
+    scraper._build_dirs[folders[2]] = False
+
+    # Only folders which have not been probed yet are requested
+    get = mocker.spy(requests.Session, 'get')
+    assert scraper.probe_build_dirs(folders) == folders[:2]
+    assert get.call_count == 0
+
+
+def test_probe_again_after_invalidate(static_server, tmpdir):
+    """A folder without a build gets probed again once the build got invalidated"""
+    month = os.path.join(str(tmpdir), 'server', 'firefox', 'nightly', '2013', '10')
+    folders = ['2013-10-01-03-02-04-mozilla-central', '2013-10-01-09-02-04-mozilla-central']
+    for folder in folders:
+        os.makedirs(os.path.join(month, folder))
+    binary = 'firefox-27.0a1.en-US.win32.installer.exe'
+    open(os.path.join(month, folders[0], binary), 'w').close()
+
+    server = static_server(os.path.join(str(tmpdir), 'server'))
+    scraper = DailyScraper(destination=str(tmpdir), base_url=server.url,
+                           date='2013-10-01', platform='win32', branch='mozilla-central')
+    assert scraper.builds == folders[:1]
+
+    # The upload of the later build has been completed meanwhile
+    open(os.path.join(month, folders[1], binary), 'w').close()
+    scraper.invalidate()
+    assert scraper.url == server.url + 'firefox/nightly/2013/10/%s/%s' % (folders[1], binary)
@@ -6,7 +6,9 @@
 
 import os
 
-from mozdownload.parser import DirectoryParser
+import requests
+
+from mozdownload.parser import DirectoryParser, ListingCache
 from mozdownload.utils import urljoin
 
 
@@ -62,3 +64,35 @@ def test_names_with_spaces(httpd):
     contents = os.listdir(folder_path)
     contents.sort()
     assert parser.entries == contents
+
+
+def test_iter_entries(httpd, mocker):
+    get = mocker.spy(requests.Session, 'get')
+    url = urljoin(httpd.get_url(), 'directoryparser', 'filter/')
+
+    parser = DirectoryParser(url, lazy=True)
+    assert parser.entries == []
+    assert get.call_count == 0
+
+    dirs = sorted(parser.iter_entries(r'^\d+$'))
+    folder_path = urljoin(httpd.router.doc_root, 'directoryparser', 'filter')
+    assert dirs == sorted(os.walk(folder_path).__next__()[1])
+    assert sorted(parser.entries) == sorted(os.listdir(folder_path))
+
+
+def test_iter_entries_stops_early(httpd, mocker):
+    mocker.patch('mozdownload.parser.CHUNK_SIZE', 16)
+    url = urljoin(httpd.get_url(), 'directoryparser', 'filter/')
+    contents = os.listdir(urljoin(httpd.router.doc_root, 'directoryparser', 'filter'))
+
+    # Only the content up to the first entry gets parsed
+    parser = DirectoryParser(url, lazy=True)
+    entry = next(parser.iter_entries())
+    assert parser.entries == [entry]
+
+    # The listing gets parsed completely to be stored in the cache
+    cache = ListingCache()
+    parser = DirectoryParser(url, cache=cache, lazy=True)
+    for entry in parser.iter_entries():
+        break
+    assert sorted(cache.get(url)) == sorted(contents)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import os
+from datetime import datetime, timezone
+
+import requests
+
+from mozdownload.parser import DEFAULT_MAX_AGE, DirectoryParser, ListingCache
+from mozdownload.utils import urljoin
+
+
+def test_memory_cache(httpd, mocker):
+    get = mocker.spy(requests.Session, 'get')
+    url = urljoin(httpd.get_url(), 'directoryparser/')
+    cache = ListingCache()
+
+    entries = DirectoryParser(url, cache=cache).entries
+    assert DirectoryParser(url, cache=cache).entries == entries
+    assert get.call_count == 1
+
+
+def test_persistent_cache(httpd, tmpdir, mocker):
+    get = mocker.spy(requests.Session, 'get')
+    url = urljoin(httpd.get_url(), 'directoryparser/')
+
+    entries = DirectoryParser(url, cache=ListingCache(str(tmpdir))).entries
+    assert DirectoryParser(url, cache=ListingCache(str(tmpdir))).entries == entries
+    assert get.call_count == 1
+
+    ListingCache(str(tmpdir)).clear()
+    assert not os.path.exists(str(tmpdir))
+
+
+def test_revalidation(httpd, tmpdir, mocker):
+    get = mocker.spy(requests.Session, 'get')
+    url = urljoin(httpd.get_url(), 'conditional_listing/')
+
+    parser = DirectoryParser(url, cache=ListingCache(str(tmpdir), max_age=0))
+    assert parser.entries == ['1.0', '2.0']
+    assert get.spy_return.status_code == 200
+
+    parser = DirectoryParser(url, cache=ListingCache(str(tmpdir), max_age=0))
+    assert parser.entries == ['1.0', '2.0']
+    assert get.call_args[1]['headers']['If-None-Match'] == '"listing"'
+    assert get.spy_return.status_code == 304
+
+
+def test_revalidation_after_eviction(httpd, tmpdir, mocker):
+    url = urljoin(httpd.get_url(), 'conditional_listing/')
+    cache = ListingCache(str(tmpdir), max_age=0)
+    DirectoryParser(url, cache=cache)
+
+    # The cache gets cleared while the listing is revalidated
+    get = requests.Session.get
+
+    def get_and_clear(*args, **kwargs):
+        r = get(*args, **kwargs)
+        cache.clear()
+        return r
+
+    mocker.patch.object(requests.Session, 'get', get_and_clear)
+    parser = DirectoryParser(url, cache=cache)
+    assert parser.entries == ['1.0', '2.0']
+    assert cache.lookup(url)['entries'] == ['1.0', '2.0']
+
+
+def test_policies():
+    cache = ListingCache()
+    now = datetime.now(timezone.utc)
+    assert cache.max_age_for('https://localhost/firefox/nightly/2013/10/') == float('inf')
+    assert cache.max_age_for('https://localhost/firefox/nightly/%d/%02d/' %
+                             (now.year + 1, now.month)) == DEFAULT_MAX_AGE
+    assert cache.max_age_for('https://localhost/firefox/releases/') == DEFAULT_MAX_AGE
+
+    cache = ListingCache(policies=[(r'/releases/$', 3600)], max_age=10)
+    assert cache.max_age_for('https://localhost/firefox/releases/') == 3600
+    assert cache.max_age_for('https://localhost/firefox/nightly/2013/10/') == 10
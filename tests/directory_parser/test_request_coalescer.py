@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from mozdownload.parser import DirectoryParser, ListingCache, RequestCoalescer
+from mozdownload.utils import urljoin
+
+PARSERS = 5
+
+
+@pytest.fixture
+def coalescer():
+    return RequestCoalescer()
+
+
+@pytest.fixture
+def get(mocker, coalescer):
+    """Spy on requests, which only get sent once all other parsers are waiting."""
+    session_get = requests.Session.get
+
+    def delayed_get(self, url, *args, **kwargs):
+        deadline = time.monotonic() + 5
+        while coalescer.stats()['coalesced'] < PARSERS - 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return session_get(self, url, *args, **kwargs)
+
+    return mocker.patch.object(requests.Session, 'get', autospec=True, side_effect=delayed_get)
+
+
+def parse_concurrently(url, coalescer, **kwargs):
+    def _parse(_):
+        try:
+            return DirectoryParser(url, coalescer=coalescer, **kwargs).entries
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=PARSERS) as executor:
+        return list(executor.map(_parse, range(PARSERS)))
+
+
+def test_single_flight(httpd, coalescer, get):
+    url = urljoin(httpd.get_url(), 'directoryparser/')
+    results = parse_concurrently(url, coalescer)
+
+    assert get.call_count == 1
+    assert results[0] and all(entries == results[0] for entries in results)
+    assert coalescer.stats() == {'fetches': 1, 'coalesced': PARSERS - 1, 'hits': 0}
+
+    # Only concurrent requests get coalesced
+    DirectoryParser(url, coalescer=coalescer)
+    assert get.call_count == 2
+
+
+def test_shared_failure(httpd, coalescer, get):
+    url = urljoin(httpd.get_url(), 'does_not_exist/')
+    results = parse_concurrently(url, coalescer)
+
+    assert get.call_count == 1
+    assert all(isinstance(result, requests.exceptions.HTTPError) for result in results)
+
+    # A failed fetch is not kept
+    with pytest.raises(requests.exceptions.HTTPError):
+        DirectoryParser(url, coalescer=coalescer)
+    assert get.call_count == 2
+
+
+def test_cache_hits(httpd, coalescer):
+    url = urljoin(httpd.get_url(), 'directoryparser/')
+    cache = ListingCache()
+
+    entries = DirectoryParser(url, cache=cache, coalescer=coalescer).entries
+    assert DirectoryParser(url, cache=cache, coalescer=coalescer).entries == entries
+    assert coalescer.stats() == {'fetches': 1, 'coalesced': 0, 'hits': 1}
+
+    coalescer.reset_stats()
+    assert coalescer.stats() == {'fetches': 0, 'coalesced': 0, 'hits': 0}
+
+
+def test_stop_without_waiters(httpd, coalescer):
+    """A parser which stopped early does not leave a fetch behind"""
+    url = urljoin(httpd.get_url(), 'directoryparser/')
+
+    parser = DirectoryParser(url, coalescer=coalescer, lazy=True)
+    first = next(parser.iter_entries())
+    assert first
+
+    entries = DirectoryParser(url, coalescer=coalescer).entries
+    assert first in entries
+    assert coalescer.stats()['fetches'] == 2
+
+
+def test_stalled_leader(httpd, coalescer, mocker):
+    """Parsers don't wait longer for a stalled fetch than their timeout"""
+    url = urljoin(httpd.get_url(), 'directoryparser/')
+
+    # The leader stops consuming the entries without closing the parser
+    leader = DirectoryParser(url, coalescer=coalescer, lazy=True).iter_entries()
+    first = next(leader)
+
+    get = mocker.spy(requests.Session, 'get')
+    start_time = time.monotonic()
+    entries = DirectoryParser(url, coalescer=coalescer, timeout=(0.2, 0.3)).entries
+    assert time.monotonic() - start_time < 5
+    assert first in entries
+    assert get.call_count == 1
+    assert coalescer.stats()['coalesced'] == 1
+
+    # Without waiters the leader stops parsing once it gets closed
+    leader.close()
+    assert DirectoryParser(url, coalescer=coalescer).entries == entries
+    assert coalescer.stats()['fetches'] == 2
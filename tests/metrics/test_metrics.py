@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import json
+import os
+
+from mozdownload import DailyScraper, ReleaseScraper
+from mozdownload.metrics import Metrics
+
+
+def test_download_metrics(httpd, tmpdir):
+    metrics = Metrics()
+    scraper = ReleaseScraper(version='23.0.1', platform='win32', destination=str(tmpdir),
+                             base_url=httpd.get_url(), metrics=metrics)
+    scraper.download()
+
+    report = metrics.report()
+    assert [phase['name'] for phase in report['phases']] == \
+        ['get_build_info', 'resolve', 'download', 'rename']
+
+    listing, download = report['requests']
+    assert listing['url'] == scraper.resolve().path
+    assert download['url'] == scraper.url
+    assert download['status'] == 200
+    assert download['bytes'] == os.path.getsize(scraper.filename)
+    for request in report['requests']:
+        assert request['latency'] >= 0
+        assert request['start'] >= 0
+
+    assert report['totals']['requests'] == 2
+    assert report['totals']['bytes'] >= download['bytes']
+
+
+def test_probe_metrics(httpd, tmpdir):
+    metrics = Metrics()
+    DailyScraper(date='2013-07-02', platform='win32', branch='mozilla-central',
+                 destination=str(tmpdir), base_url=httpd.get_url(), metrics=metrics)
+
+    phases = metrics.report()['totals']['phases']
+    assert set(phases) == {'get_build_info', 'probe_build_dirs'}
+    assert phases['probe_build_dirs'] <= phases['get_build_info']
+
+
+def test_write_json(tmpdir):
+    metrics = Metrics()
+    with metrics.phase('test'):
+        pass
+
+    path = os.path.join(str(tmpdir), 'metrics.json')
+    metrics.write_json(path)
+    with open(path) as f:
+        report = json.load(f)
+    assert report['totals']['requests'] == 0
+    assert [phase['name'] for phase in report['phases']] == ['test']
+    assert metrics.summary()[-1].startswith('Phase test: ')
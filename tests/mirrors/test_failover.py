@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from mozdownload import DirectScraper, ReleaseScraper
+from mozdownload.mirrors import MirrorSet
+from mozdownload.utils import create_md5
+
+
+@pytest.fixture
+def broken_mirror(httpd):
+    """Mirror which drops the connection after sending half of download_test.txt."""
+    with open(os.path.join(httpd.router.doc_root, 'download_test.txt'), 'rb') as f:
+        content = f.read()
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            requests.append((self.path, self.headers.get('Range')))
+            if self.path != '/download_test.txt':
+                self.send_error(503)
+                return
+
+            self.send_response(200)
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('Content-Length', str(len(content)))
+            self.send_header('ETag', '"download-test"')
+            self.end_headers()
+            self.wfile.write(content[:2000])
+            self.wfile.flush()
+            self.close_connection = True
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = 'http://127.0.0.1:%s/' % server.server_address[1]
+    server.requests = requests
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def keep_ranking(monkeypatch):
+    # Keep the given order of the mirrors, independent of their latency
+    monkeypatch.setattr(MirrorSet, 'probe', lambda self, timeout=None: self.ranking)
+
+
+def test_failover_resumes_download(httpd, tmpdir, broken_mirror, keep_ranking):
+    url = broken_mirror.url + 'download_test.txt'
+    scraper = DirectScraper(url=url, destination=str(tmpdir),
+                            base_url=[broken_mirror.url, httpd.get_url()])
+    filename = scraper.download()
+
+    assert create_md5(filename) == \
+        create_md5(os.path.join(httpd.router.doc_root, 'download_test.txt'))
+    assert broken_mirror.requests == [('/download_test.txt', None)]
+    assert scraper.mirrors.ranking == [httpd.get_url(), broken_mirror.url]
+
+
+def test_failover_for_listings(httpd, tmpdir, broken_mirror, keep_ranking):
+    scraper = ReleaseScraper(version='23.0.1', platform='win32', destination=str(tmpdir),
+                             base_url=[broken_mirror.url, httpd.get_url()])
+    assert scraper.url.startswith(broken_mirror.url)
+    scraper.download()
+
+    assert os.path.isfile(scraper.filename)
+    assert len(broken_mirror.requests) == 1
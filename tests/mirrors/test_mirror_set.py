@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from mozdownload import ReleaseScraper
+from mozdownload.mirrors import MirrorSet
+from mozdownload.retry import get_circuit_breaker
+
+UNAVAILABLE = 'http://127.0.0.1:1/'
+
+
+def test_probe_ranks_healthy_mirrors_first(httpd):
+    mirrors = MirrorSet([UNAVAILABLE, httpd.get_url()])
+    assert mirrors.ranking == [UNAVAILABLE, httpd.get_url()]
+
+    assert mirrors.probe() == [httpd.get_url(), UNAVAILABLE]
+    assert mirrors.best == httpd.get_url()
+
+
+def test_translate():
+    mirrors = MirrorSet(['https://a.example.com/pub', 'https://b.example.com/mirror/'])
+    assert mirrors.translate('https://b.example.com/mirror/firefox/releases/') == \
+        'https://a.example.com/pub/firefox/releases/'
+    assert mirrors.translate('https://example.org/firefox/') == 'https://example.org/firefox/'
+
+
+def test_mark_failed():
+    mirrors = MirrorSet(['https://a.example.com/', 'https://b.example.com/',
+                         'https://c.example.com/'])
+    mirrors.mark_failed('https://a.example.com/firefox/')
+    assert mirrors.ranking == ['https://b.example.com/', 'https://c.example.com/',
+                               'https://a.example.com/']
+    assert mirrors.translate('https://a.example.com/firefox/') == \
+        'https://b.example.com/firefox/'
+
+    mirrors.mark_failed('https://example.org/firefox/')
+    assert mirrors.best == 'https://b.example.com/'
+
+
+def test_best_skips_open_circuit_breakers():
+    mirrors = MirrorSet(['https://a.example.com/', 'https://b.example.com/'])
+    breaker = get_circuit_breaker('https://a.example.com/')
+    for _ in range(breaker.min_requests):
+        breaker.record(False)
+
+    assert mirrors.best == 'https://b.example.com/'
+
+
+def test_scraper_uses_healthy_mirror(httpd, tmpdir):
+    scraper = ReleaseScraper(version='23.0.1', platform='win32', destination=str(tmpdir),
+                             base_url=[UNAVAILABLE, httpd.get_url()])
+    assert scraper.url.startswith(httpd.get_url())
+    scraper.download()
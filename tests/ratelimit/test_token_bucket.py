@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import os
+import time
+
+import pytest
+
+from mozdownload import DirectScraper
+from mozdownload.ratelimit import TokenBucket, get_rate_limiter, reset_rate_limiters
+from mozdownload.utils import urljoin
+
+
+@pytest.fixture(autouse=True)
+def rate_limiters():
+    reset_rate_limiters()
+    yield
+    reset_rate_limiters()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake clock which advances when sleeping."""
+    class Clock(object):
+        def __init__(self):
+            self.now = 1000.
+            self.sleeps = []
+
+        def sleep(self, seconds):
+            self.sleeps.append(seconds)
+            self.now += seconds
+
+    clock = Clock()
+    monkeypatch.setattr('mozdownload.ratelimit.time.monotonic', lambda: clock.now)
+    monkeypatch.setattr('mozdownload.ratelimit.time.time', lambda: clock.now)
+    monkeypatch.setattr('mozdownload.ratelimit.time.sleep', clock.sleep)
+    return clock
+
+
+def test_burst(clock):
+    bucket = TokenBucket(rate=1000, burst=3000)
+    assert bucket.reserve(3000) == 0.
+    assert bucket.reserve(500) == pytest.approx(0.5)
+    assert bucket.reserve(500) == pytest.approx(1.)
+
+    # Tokens get refilled while idle, but never beyond the burst size
+    clock.now += 60
+    assert bucket.reserve(3000) == 0.
+    assert bucket.reserve(1000) == pytest.approx(1.)
+
+
+def test_throughput(clock):
+    bucket = TokenBucket(rate=1024 ** 2)
+    start = clock.now
+    for _ in range(10 * 64):
+        bucket.consume(16 * 1024)
+
+    # After the burst of one second the remaining 9 MB take 9 seconds
+    assert clock.now - start == pytest.approx(9., abs=0.05)
+
+    # Short delays are carried over instead of sleeping for each chunk
+    assert len(clock.sleeps) < 10 * 64 / 2
+    assert min(clock.sleeps) >= 0.05
+
+
+def test_shared_file(clock, tmpdir):
+    path = os.path.join(str(tmpdir), 'limit')
+    first = TokenBucket(rate=1000, burst=1000, path=path)
+    second = TokenBucket(rate=1000, burst=1000, path=path)
+
+    # The budget gets reserved from the file once per 100 bytes
+    assert first.reserve(50) == 0.
+    assert first.reserve(950) == 0.
+    assert second.reserve(1000) == pytest.approx(1.)
+    assert first.reserve(1000) == pytest.approx(2.)
+
+
+def test_invalid_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+
+
+def test_shared_in_process():
+    assert get_rate_limiter(1000) is get_rate_limiter(1000)
+    assert get_rate_limiter(1000) is not get_rate_limiter(1000, burst=100)
+
+
+def test_download_limit_rate(httpd, tmpdir):
+    test_url = urljoin(httpd.get_url(), 'download_test.txt')
+    start_time = time.monotonic()
+    scraper = DirectScraper(url=test_url, destination=str(tmpdir),
+                            limit_rate=4096, limit_burst=1024)
+    scraper.download()
+
+    # 4546 bytes minus the burst of 1024 bytes at 4096 bytes per second
+    assert time.monotonic() - start_time >= 0.8
+    assert os.path.getsize(scraper.filename) == 4546
+    assert scraper.rate_limiter is get_rate_limiter(4096, burst=1024)
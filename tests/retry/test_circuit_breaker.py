@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import os
+
+import pytest
+
+from mozdownload import DirectScraper, errors
+from mozdownload.retry import CircuitBreaker, RetryPolicy, get_circuit_breaker
+from mozdownload.utils import urljoin
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = [1000.]
+    monkeypatch.setattr('mozdownload.retry.time.monotonic', lambda: clock[0])
+    return clock
+
+
+def test_opens_at_threshold():
+    breaker = CircuitBreaker(threshold=0.5, window=4, min_requests=4)
+    for success in (True, False, True):
+        breaker.record(success)
+    assert breaker.allow()
+
+    breaker.record(False)
+    assert breaker.is_open
+    assert not breaker.allow()
+
+
+def test_min_requests():
+    breaker = CircuitBreaker(min_requests=3)
+    breaker.record(False)
+    breaker.record(False)
+    assert breaker.allow()
+
+
+def test_probe_after_cooldown(clock):
+    breaker = CircuitBreaker(window=2, min_requests=2, cooldown=30.)
+    breaker.record(False)
+    breaker.record(False)
+    assert not breaker.allow()
+
+    # A single probe is let through after the cooldown
+    clock[0] += 30.
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    # A failed probe keeps the breaker open for another cooldown
+    breaker.record(False)
+    assert not breaker.allow()
+    clock[0] += 30.
+    assert breaker.allow()
+
+    breaker.record(True)
+    assert not breaker.is_open
+    assert breaker.allow()
+
+
+def test_shared_per_host():
+    assert get_circuit_breaker('https://example.com/a') is \
+        get_circuit_breaker('https://example.com/b/')
+    assert get_circuit_breaker('https://example.com/') is not \
+        get_circuit_breaker('https://example.org/')
+
+
+def test_fail_fast(httpd, tmpdir):
+    url = urljoin(httpd.get_url(), 'download_test.txt')
+    breaker = get_circuit_breaker(url)
+    for _ in range(breaker.min_requests):
+        breaker.record(False)
+
+    with pytest.raises(errors.CircuitOpenError):
+        DirectScraper(url=url, destination=str(tmpdir)).download()
+    assert os.listdir(str(tmpdir)) == []
+
+    policy = RetryPolicy(circuit_breaker=False)
+    scraper = DirectScraper(url=url, destination=str(tmpdir), retry_policy=policy)
+    scraper.download()
+    assert os.path.isfile(scraper.filename)
+
+
+def test_server_errors_stop_retries(httpd, tmpdir, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr('mozdownload.retry.time.sleep', sleeps.append)
+
+    url = urljoin(httpd.get_url(), 'download_test.txt?pipe=status(503)')
+    scraper = DirectScraper(url=url, destination=str(tmpdir), retry_attempts=50)
+    with pytest.raises(errors.CircuitOpenError):
+        scraper.download()
+
+    assert len(sleeps) == get_circuit_breaker(url).min_requests - 1
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from email.utils import formatdate
+
+import pytest
+import requests
+
+from mozdownload import DirectScraper
+from mozdownload.retry import RetryPolicy, parse_retry_after
+from mozdownload.utils import urljoin
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr('mozdownload.retry.time.sleep', sleeps.append)
+    return sleeps
+
+
+def test_exponential_backoff():
+    policy = RetryPolicy(attempts=6, delay=1., max_delay=10., jitter=False)
+    assert [policy.sleep_time(retry) for retry in range(1, 6)] == [1., 2., 4., 8., 10.]
+
+
+def test_full_jitter():
+    policy = RetryPolicy(attempts=4, delay=1., max_delay=10.)
+    for retry in range(1, 4):
+        delays = [policy.sleep_time(retry) for _ in range(100)]
+        assert all(0 <= delay <= 2 ** (retry - 1) for delay in delays)
+        assert len(set(delays)) > 1
+
+
+def test_retry_after_is_minimum_delay():
+    policy = RetryPolicy(attempts=2, delay=1., max_delay=60.)
+    assert all(5. <= policy.sleep_time(1, retry_after=5.) <= 6. for _ in range(100))
+
+    # The delay is limited even if the server asks for more
+    assert policy.sleep_time(1, retry_after=3600.) == 60.
+
+
+@pytest.mark.parametrize('value,expected', [
+    ('120', 120.),
+    ('-1', 0.),
+    (formatdate(0, usegmt=True), 0.),
+    ('soon', None),
+    (None, None),
+])
+def test_parse_retry_after(value, expected):
+    assert parse_retry_after(value) == expected
+
+
+def test_parse_retry_after_date():
+    import time
+    assert 50 < parse_retry_after(formatdate(time.time() + 60, usegmt=True)) <= 60
+
+
+def test_retry_until_success(sleeps):
+    calls = []
+
+    def func():
+        calls.append(None)
+        if len(calls) < 3:
+            raise requests.exceptions.ConnectionError()
+        return 'done'
+
+    policy = RetryPolicy(attempts=3, delay=1.)
+    assert policy.retry(func, retry_exceptions=(requests.exceptions.ConnectionError,)) == 'done'
+    assert len(calls) == 3
+    assert len(sleeps) == 2
+
+
+def test_no_retry_for_other_exceptions(sleeps):
+    calls = []
+
+    def func():
+        calls.append(None)
+        raise ValueError()
+
+    policy = RetryPolicy(attempts=3)
+    with pytest.raises(ValueError):
+        policy.retry(func, retry_exceptions=(requests.exceptions.ConnectionError,))
+    assert len(calls) == 1
+    assert sleeps == []
+
+
+@pytest.mark.parametrize('status', [429, 503])
+def test_download_honors_retry_after(httpd, tmpdir, sleeps, status):
+    url = urljoin(httpd.get_url(),
+                  'download_test.txt?pipe=status(%d)|header(Retry-After,7)' % status)
+    scraper = DirectScraper(url=url, destination=str(tmpdir),
+                            retry_attempts=2, retry_delay=1.)
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        scraper.download()
+    assert len(sleeps) == 2
+    assert all(7. <= delay <= 8. for delay in sleeps)
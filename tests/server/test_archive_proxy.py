@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from mozdownload import ReleaseScraper
+from mozdownload.server import ArchiveProxy, create_server
+from mozdownload.utils import create_md5
+
+
+SLOW_CONTENT = b'x' * 4096
+
+
+class SlowRequestHandler(BaseHTTPRequestHandler):
+    """Handler which sends its content in four parts, one per second."""
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(SLOW_CONTENT)))
+        self.end_headers()
+
+        part = len(SLOW_CONTENT) // 4
+        for offset in range(0, len(SLOW_CONTENT), part):
+            time.sleep(1)
+            self.wfile.write(SLOW_CONTENT[offset:offset + part])
+            self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(proxy):
+    proxy.upstream_requests = []
+    proxy.session.hooks['response'].append(
+        lambda r, *args, **kwargs: proxy.upstream_requests.append(r.url))
+
+    server = create_server(proxy, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    proxy.url = 'http://127.0.0.1:%s/' % server.server_address[1]
+    return server
+
+
+@pytest.fixture
+def proxy(httpd, tmpdir):
+    proxy = ArchiveProxy(os.path.join(str(tmpdir), 'proxy'), upstream=httpd.get_url())
+    server = serve(proxy)
+    yield proxy
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def slow_proxy(tmpdir):
+    upstream = ThreadingHTTPServer(('127.0.0.1', 0), SlowRequestHandler)
+    upstream.daemon_threads = True
+    thread = threading.Thread(target=upstream.serve_forever, daemon=True)
+    thread.start()
+
+    proxy = ArchiveProxy(os.path.join(str(tmpdir), 'proxy'),
+                         upstream='http://127.0.0.1:%s/' % upstream.server_address[1])
+    server = serve(proxy)
+    yield proxy
+    server.shutdown()
+    server.server_close()
+    upstream.shutdown()
+    upstream.server_close()
+
+
+def test_download_via_proxy(httpd, tmpdir, proxy):
+    for index in range(2):
+        scraper = ReleaseScraper(version='23.0.1', platform='win32',
+                                 destination=os.path.join(str(tmpdir), str(index)),
+                                 base_url=proxy.url)
+        scraper.download()
+        assert create_md5(scraper.filename) == create_md5(os.path.join(
+            httpd.router.doc_root, 'firefox', 'releases', '23.0.1', 'win32', 'en-US',
+            scraper.binary))
+
+    # The listing and the build have only been fetched once
+    assert len(proxy.upstream_requests) == 2
+
+
+def test_range_requests(httpd, proxy):
+    with open(os.path.join(httpd.router.doc_root, 'download_test.txt'), 'rb') as f:
+        content = f.read()
+
+    url = proxy.url + 'download_test.txt'
+    r = requests.get(url)
+    assert r.content == content
+    assert r.headers['Accept-Ranges'] == 'bytes'
+
+    r = requests.get(url, headers={'Range': 'bytes=100-199'})
+    assert r.status_code == 206
+    assert r.headers['Content-Range'] == 'bytes 100-199/%s' % len(content)
+    assert r.content == content[100:200]
+
+    r = requests.get(url, headers={'Range': 'bytes=-10'})
+    assert r.content == content[-10:]
+
+    r = requests.get(url, headers={'Range': 'bytes=%s-' % len(content)})
+    assert r.status_code == 416
+
+    # Ranges of another version of the file get the whole file
+    r = requests.get(url, headers={'Range': 'bytes=100-', 'If-Range': '"other"'})
+    assert r.status_code == 200
+    assert r.content == content
+
+    assert len(proxy.upstream_requests) == 1
+
+
+def test_not_found(proxy):
+    assert requests.get(proxy.url + 'does_not_exist.txt').status_code == 404
+
+
+def test_coalesce_concurrent_requests(proxy, monkeypatch):
+    get = proxy.session.get
+
+    def slow_get(*args, **kwargs):
+        time.sleep(0.2)
+        return get(*args, **kwargs)
+
+    monkeypatch.setattr(proxy.session, 'get', slow_get)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        records = list(executor.map(proxy.get, ['/download_test.txt'] * 8))
+
+    assert len(proxy.upstream_requests) == 1
+    assert all(record['file'] == records[0]['file'] for record in records)
+
+
+def test_revalidate_listings(proxy):
+    url = proxy.url + 'conditional_listing/'
+    content = requests.get(url).content
+    assert b'1.0/' in content
+
+    # Let the listing expire, once it has been stored completely
+    record = proxy.get('/conditional_listing/')
+    record['checked'] -= 3600
+    proxy._save('/conditional_listing/', record)
+
+    assert requests.get(url).content == content
+    assert [r.rstrip('/').rsplit('/', 1)[-1] for r in proxy.upstream_requests] == \
+        ['conditional_listing'] * 2
+    assert time.time() - proxy.get('/conditional_listing/')['checked'] < 60
+
+
+def test_disk_budget(httpd, proxy):
+    proxy.max_size = os.path.getsize(os.path.join(httpd.router.doc_root, 'download_test.txt'))
+
+    proxy.get('/download_test.txt')
+    proxy.get('/download_test.txt.headers')
+    assert proxy.lookup('/download_test.txt.headers')
+    assert proxy.lookup('/download_test.txt') is None
+
+
+def test_stream_slow_upstream(slow_proxy):
+    url = slow_proxy.url + 'slow.bin'
+
+    # Clients receive the content while it is fetched, and don't time out
+    # waiting for the complete transfer
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        responses = list(executor.map(lambda _: requests.get(url, timeout=(5, 1.5)),
+                                      range(2)))
+    assert all(r.content == SLOW_CONTENT for r in responses)
+    assert len(slow_proxy.upstream_requests) == 1
+
+    # Clients can receive the last part before the transfer got stored
+    record = slow_proxy.get('/slow.bin')
+    assert record['size'] == len(SLOW_CONTENT)
+    assert requests.get(url, headers={'Range': 'bytes=-10'}).content == SLOW_CONTENT[-10:]
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import requests
+import urllib3
+
+from mozdownload import FactoryScraper
+from mozdownload.parser import DirectoryParser
+from mozdownload.session import create_adapter, create_session, get_default_adapter
+from mozdownload.treeherder import TREEHERDER_URL, Treeherder
+
+
+def test_default_adapter(httpd, tmpdir, mocker):
+    """Scrapers have their own sessions, but share the connections of the process"""
+    new_conn = mocker.spy(urllib3.connectionpool.HTTPConnectionPool, '_new_conn')
+
+    scrapers = [FactoryScraper('release', version='23.0.1', platform='win32', locale=locale,
+                               destination=str(tmpdir), base_url=httpd.get_url(),
+                               username='user', password='pass')
+                for locale in ('en-US', 'de')]
+    for scraper in scrapers:
+        scraper.download()
+
+    assert scrapers[0].session is not scrapers[1].session
+    for scraper in scrapers:
+        assert scraper.session.auth == ('user', 'pass')
+        assert scraper.session.get_adapter(httpd.get_url()) is get_default_adapter()
+    # A connection might have been opened to the server by previous tests already
+    assert new_conn.call_count <= 1
+
+    parser = DirectoryParser(httpd.get_url())
+    assert parser.session.get_adapter(httpd.get_url()) is get_default_adapter()
+
+
+def test_given_session_and_adapter(httpd, tmpdir):
+    session = requests.Session()
+    session.headers['X-Test'] = 'test'
+    hooks = dict((event, list(hooks)) for event, hooks in session.hooks.items())
+    scraper = FactoryScraper('release', version='23.0.1', platform='win32',
+                             destination=str(tmpdir), base_url=httpd.get_url(),
+                             session=session, username='user', password='pass')
+
+    # The given session is not modified, but its settings and connections are used
+    assert scraper.session is not session
+    assert scraper.session.get_adapter(httpd.get_url()) is session.get_adapter(httpd.get_url())
+    assert scraper.session.headers['X-Test'] == 'test'
+    assert scraper.session.auth == ('user', 'pass')
+    assert session.auth is None
+    assert session.hooks == hooks
+
+    adapter = create_adapter(pool_maxsize=4)
+    scraper = FactoryScraper('release', version='23.0.1', platform='win32',
+                             destination=str(tmpdir), base_url=httpd.get_url(),
+                             adapter=adapter)
+    assert scraper.session.get_adapter(httpd.get_url()) is adapter
+
+
+def test_given_session_subclass(httpd, tmpdir):
+    """Requests are sent via the class of the given session"""
+    class CountingSession(requests.Session):
+        def __init__(self):
+            requests.Session.__init__(self)
+            self.sent = []
+
+        def send(self, request, **kwargs):
+            self.sent.append(request.url)
+            return requests.Session.send(self, request, **kwargs)
+
+    session = CountingSession()
+    scraper = FactoryScraper('release', version='23.0.1', platform='win32',
+                             destination=str(tmpdir), base_url=httpd.get_url(),
+                             session=session)
+    scraper.download()
+    assert isinstance(scraper.session, CountingSession)
+    assert scraper.url in scraper.session.sent
+
+
+def test_close_dedicated_adapter(httpd, tmpdir, mocker):
+    """A connection pool created for a single download gets closed afterwards"""
+    scraper = FactoryScraper('direct', url=httpd.get_url() + 'download_test.txt',
+                             destination=str(tmpdir), connections=64)
+    adapter = scraper.session.get_adapter(httpd.get_url())
+    assert adapter is not get_default_adapter()
+
+    close = mocker.spy(adapter, 'close')
+    scraper.download()
+    assert close.call_count == 1
+
+
+def test_treeherder_adapter():
+    adapter = create_adapter()
+    th = Treeherder('firefox', 'mozilla-central', 'linux64', adapter=adapter)
+    assert th.client.session.get_adapter(TREEHERDER_URL) is adapter
+
+    # The headers of the Treeherder API are not set on shared sessions
+    session = create_session(adapter)
+    assert 'Accept' not in session.headers or \
+        session.headers['Accept'] != th.client.session.headers['Accept']
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import pytest
+
+import mozdownload.treeherder as treeherder
+from mozdownload.treeherder import Treeherder
+
+BUILD_URL = 'https://archive.mozilla.org/pub/firefox/try-builds/{}/try-win32/'
+
+
+@pytest.fixture
+def client(mocker):
+    mocker.patch.dict(treeherder._option_collection_hashes, clear=True)
+    mocker.patch('mozdownload.treeherder.JOB_LOG_URL_BATCH_SIZE', 2)
+
+    client = mocker.patch('mozdownload.treeherder.TreeherderClient').return_value
+    client.server_url = treeherder.TREEHERDER_URL
+    client.get_option_collection_hash.return_value = {
+        'hash-debug': [{'name': 'debug'}],
+        'hash-opt': [{'name': 'opt'}],
+    }
+    client.get_pushes.return_value = [{'id': 1}, {'id': 2}]
+    client.get_jobs.side_effect = lambda branch, **kwargs: [
+        {'id': kwargs['result_set_id'] * 10 + index} for index in range(2)]
+    client.get_job_log_url.side_effect = lambda branch, job_id: [
+        {'url': BUILD_URL.format(id)} for id in job_id]
+
+    return client
+
+
+def test_query_builds_by_revision(client):
+    th = Treeherder('firefox', 'try', 'win32')
+    builds = th.query_builds_by_revision('29258f59e545')
+    assert sorted(builds) == [BUILD_URL.format(id) for id in (10, 11, 20, 21)]
+
+    # Log URLs are retrieved in batches of jobs
+    assert [call[1]['job_id'] for call in client.get_job_log_url.call_args_list] == \
+        [[10, 11], [20, 21]]
+    assert client.get_jobs.call_args[1]['option_collection_hash'] == 'hash-opt'
+
+    # The option collection hash is only retrieved once per server
+    th.query_builds_by_revision('29258f59e545', debug_build=True)
+    assert client.get_jobs.call_args[1]['option_collection_hash'] == 'hash-debug'
+    assert client.get_option_collection_hash.call_count == 1
+
+
+def test_cached_builds(client, tmpdir):
+    th = Treeherder('firefox', 'try', 'win32', cache_dir=str(tmpdir))
+    builds = th.query_builds_by_revision('29258f59e545')
+    assert len(builds) == 4
+
+    th = Treeherder('firefox', 'try', 'win32', cache_dir=str(tmpdir))
+    assert th.query_builds_by_revision('29258f59e545') == builds
+    assert client.get_pushes.call_count == 1
+
+    # Revisions without builds are not cached
+    client.get_pushes.return_value = []
+    assert th.query_builds_by_revision('ffffffffffff') == []
+    assert th.query_builds_by_revision('ffffffffffff') == []
+    assert client.get_pushes.call_count == 3